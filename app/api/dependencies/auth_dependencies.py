@@ -1,19 +1,96 @@
 from jwt import decode, ExpiredSignatureError, InvalidTokenError
-from fastapi import HTTPException
+from fastapi import Depends, HTTPException, Request
+from fastapi.security import HTTPBearer
+from collections import OrderedDict
+from hashlib import sha256
+import time
 
 from app.config import settings
 
 security = HTTPBearer()
 
-async def get_current_user(credentials = Depends(security)) -> dict:
-    try:
-        payload = decode(
-            credentials.credentials,
-            settings.SECRET_KEY,
-            algorithms=settings.ALGORITHM
-        )
+
+class CurrentUser(dict):
+    '''
+    decoded token payload, readable as user["user_id"] or user.user_id
+    the same instance is shared by every dependency/route in a request and by cached requests, dont mutate it
+    '''
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class VerifiedTokenCache:
+    '''
+    bounded lru of tokens whose signature was already verified, keyed by sha256 of the token
+    clients polling every few seconds with the same token skip the hmac verification
+    entries are dropped once the token's exp passes, so expiry is still enforced
+    '''
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # digest: payload
+
+    def get(self, digest: bytes):
+        payload = self._entries.get(digest)
+        if payload is None:
+            return None
+        exp = payload.get("exp")
+        if exp is not None and exp <= time.time():
+            del self._entries[digest]
+            return None
+        self._entries.move_to_end(digest)
         return payload
+
+    def put(self, digest: bytes, payload: dict):
+        self._entries[digest] = payload
+        self._entries.move_to_end(digest)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+token_cache = VerifiedTokenCache(settings.TOKEN_CACHE_SIZE)
+
+
+def token_digest(token: str) -> bytes:
+    return sha256(token.encode()).digest()
+
+
+def decode_token(token: str) -> dict:
+    # raw verification, raises jwt errors to the caller
+    return decode(
+        token,
+        settings.SECRET_KEY,
+        algorithms=settings.ALGORITHM
+    )
+
+
+def verify_token(token: str, digest: bytes = None) -> CurrentUser:
+    # shared by http dependencies and the websocket channel, raises jwt errors to the caller
+    digest = digest or token_digest(token)
+    payload = token_cache.get(digest)
+    if payload is None:
+        payload = CurrentUser(decode_token(token))
+        token_cache.put(digest, payload)
+    return payload
+
+
+async def get_current_user(request: Request, credentials = Depends(security)) -> CurrentUser:
+    # already resolved for this request (router level dependency, rate limiter etc.)
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return user
+
+    digest = token_digest(credentials.credentials)
+    try:
+        payload = verify_token(credentials.credentials, digest)
     except ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
     except InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+
+    request.state.user = payload
+    request.state.token_digest = digest
+    return payload
@@ -0,0 +1,187 @@
+'''
+rbac, roles as described in rbac.md - admin, editor, viewer
+
+role is resolved from db.users once per user and cached with a ttl, so authorized routes dont add a mongo read per request
+role changes go through set_user_role, which invalidates the cache entry on this process and publishes the user id
+on a redis channel (ROLE_INVALIDATION_URL, else SESSION_CACHE_URL), every api process subscribes and drops its entry,
+so a demoted admin loses the role everywhere within a message round trip instead of ROLE_CACHE_TTL_SECONDS
+a process whose subscription drops clears its whole cache when it resubscribes, changes sent meanwhile were lost
+without a shared store only this process is invalidated, the ttl bounds the rest
+'''
+
+from fastapi import Depends, HTTPException
+from bson import ObjectId
+from bson.errors import InvalidId
+import asyncio
+import logging
+import time
+
+from app.api.dependencies.auth_dependencies import get_current_user
+from app.db.database import get_db
+from app.config import settings
+
+ROLE_PERMISSIONS = {
+    "admin": frozenset({"create", "read", "update", "delete", "evaluate", "manage_roles"}),
+    "editor": frozenset({"create", "read", "update"}),
+    "viewer": frozenset({"read"}),
+}
+DEFAULT_ROLE = "viewer"
+ROLE_CHANNEL = "rbac:role_changes"
+
+logger = logging.getLogger(__name__)
+
+
+class RoleCache:
+    def __init__(self, ttl: int, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = {}  # user_id: (role, expires_at)
+
+    def get(self, user_id: str):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            del self._entries[user_id]
+            return None
+        return entry[0]
+
+    def put(self, user_id: str, role: str):
+        if len(self._entries) >= self.max_size:
+            # full, drop expired entries first and the oldest inserted ones if that wasnt enough
+            now = time.time()
+            for uid in [uid for uid, e in self._entries.items() if e[1] <= now]:
+                del self._entries[uid]
+            while len(self._entries) >= self.max_size:
+                del self._entries[next(iter(self._entries))]
+        self._entries[user_id] = (role, time.time() + self.ttl)
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class RoleInvalidations:
+    '''role changes fanned out to every api process over redis pub/sub, started and stopped by the app lifespan'''
+    RECONNECT_SECONDS = 1.0
+
+    def __init__(self, cache: RoleCache, url: str):
+        self.cache = cache
+        self.url = url
+        self._redis = None
+        self._task = None
+
+    def _client(self):
+        if self._redis is None:
+            # imported here so redis is only needed when a shared store is configured
+            from redis.asyncio import Redis
+
+            self._redis = Redis.from_url(self.url, decode_responses=True)
+        return self._redis
+
+    def start(self):
+        if self.url and self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def publish(self, user_id: str):
+        self.cache.invalidate(user_id)
+        if not self.url:
+            return
+        try:
+            await self._client().publish(ROLE_CHANNEL, user_id)
+        except Exception as e:
+            # the change is in mongo, other processes still drop the old role within the ttl
+            logger.warning(f"could not publish role change of {user_id}: {e}")
+
+    async def _listen(self):
+        while True:
+            pubsub = self._client().pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(ROLE_CHANNEL)
+                # whatever was published while not subscribed is lost, start over from mongo
+                self.cache.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.cache.invalidate(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"role change subscription lost, resubscribing: {e}")
+                await asyncio.sleep(self.RECONNECT_SECONDS)
+            finally:
+                await pubsub.aclose()
+
+
+role_cache = RoleCache(settings.ROLE_CACHE_TTL_SECONDS, settings.ROLE_CACHE_SIZE)
+role_invalidations = RoleInvalidations(role_cache, settings.ROLE_INVALIDATION_URL or settings.SESSION_CACHE_URL)
+
+
+async def resolve_role(user_id: str, db) -> str:
+    role = role_cache.get(user_id)
+    if role is not None:
+        return role
+
+    try:
+        user_doc = await db.users.find_one({"_id": ObjectId(user_id)}, projection={"role": 1})
+    except InvalidId:
+        user_doc = None
+    if not user_doc:
+        raise HTTPException(status_code=401, detail="User not found")
+
+    role = user_doc.get("role", DEFAULT_ROLE)
+    role_cache.put(user_id, role)
+    return role
+
+
+async def set_user_role(user_id: str, role: str, db) -> bool:
+    if role not in ROLE_PERMISSIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown role {role}")
+    try:
+        object_id = ObjectId(user_id)
+    except InvalidId:
+        # malformed id, same as an unknown user (404 from the route), not a 500
+        return False
+    result = await db.users.update_one({"_id": object_id}, {"$set": {"role": role}})
+    await role_invalidations.publish(user_id)
+    return result.matched_count == 1
+
+
+def require_permission(permission: str):
+    '''
+    per route dependency, eg. dependencies=[Depends(require_permission("delete"))]
+    returns the current user so it can also be used as a parameter dependency
+    '''
+    async def checker(user=Depends(get_current_user), db=Depends(get_db)):
+        role = await resolve_role(user["user_id"], db)
+        if permission not in ROLE_PERMISSIONS.get(role, ()):
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+        return user
+
+    return checker
+
+
+def require_role(required: str):
+    async def checker(user=Depends(get_current_user), db=Depends(get_db)):
+        role = await resolve_role(user["user_id"], db)
+        if role != required:
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+        return user
+
+    return checker
+
+
+get_admin_user = require_role("admin")
@@ -1,28 +1,46 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.config import settings
-from app.api.routes.app_routes import app_router
+from app.api.routes.app_routes import app_router, exam_ws_router
 from app.api.routes.auth_routes import auth_router
 from app.api.routes.admin_routes import admin_router
 from app.api.routes.result_routes import results_router
 from app.api.routes.predictions_routes import predictions_router
-from app.db.database import init_indexes, db
+from app.db.database import db, close_clients
+from app.db.migrations import check_version
+from app.api.utils.auth_utils import password_pool
+from app.api.middleware.rate_limit_middleware import RateLimitMiddleware
+from app.api.middleware.metrics_middleware import MetricsMiddleware
+from app.api.services.proctoring import event_buffer
+from app.api.dependencies.rbac_dependencies import role_invalidations
+from app.metrics import registry, LoopLagSampler
 
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-
-app = FastAPI(title=settings.APP_NAME, lifespan=lifespan, root_path=settings.ROOT_PATH)
+loop_lag = LoopLagSampler(registry, settings.LOOP_LAG_INTERVAL_SECONDS)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # startup
-    await init_indexes()
+    # startup, indexes are applied by the migration job, this is one find_one
+    await check_version(db, settings.MIGRATIONS_CHECK)
+    if settings.METRICS_ENABLED:
+        loop_lag.start()
+    event_buffer.start()
+    role_invalidations.start()
     # also load all required cache in prod
     yield
     # shutdown
-    db.client.close()
+    await event_buffer.stop()
+    await role_invalidations.stop()
+    loop_lag.stop()
+    password_pool.shutdown()
+    await close_clients()
+
+app = FastAPI(title=settings.APP_NAME, lifespan=lifespan, root_path=settings.ROOT_PATH)
+
+# added before cors so cors stays outermost and 429s still carry cors headers
+app.add_middleware(RateLimitMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,7 +50,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# outermost, latency includes cors and the rate limiter, 429s are counted
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 app.include_router(app_router)
+app.include_router(exam_ws_router)
 app.include_router(auth_router)
 app.include_router(admin_router)
 app.include_router(results_router)
@@ -43,3 +66,8 @@ app.include_router(predictions_router)
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # async so the render runs on the loop, same thread that records
+    return registry.render()
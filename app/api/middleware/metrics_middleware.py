@@ -0,0 +1,43 @@
+'''
+request metrics as plain asgi middleware, outermost so the rate limiter and cors are included in the latency
+
+the route label is the matched route's template (/app/exam/{test_id}/save), read from the scope after
+the router has run, so one series per route instead of one per test id
+requests that never reached a route (404s, early 429s from the rate limiter) are labelled "unmatched"
+'''
+import time
+
+from app.metrics import registry
+
+UNMATCHED = "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app, registry=registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        registry = self.registry
+        registry.in_flight += 1
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            registry.in_flight -= 1
+            route = scope.get("route")
+            series = registry.route(scope["method"], route.path_format if route is not None else UNMATCHED)
+            series.latency.observe(elapsed)
+            series.statuses[min(status // 100, 5) - 1] += 1
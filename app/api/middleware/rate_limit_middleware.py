@@ -0,0 +1,105 @@
+'''
+early reject rate limiting as plain asgi middleware
+
+runs before routing, body parsing and auth dependencies, so an over-limit request costs a table lookup,
+a token verification (one hmac, free for a token seen before) and one limiter backend call, then a 429 - nothing else.
+uses the same GCRA backends as the rate_limit decorator (rate_limiter.limiter_backend)
+
+caller identity
+- bearer token that verifies -> its user_id, the payload is handed to get_current_user through request.state
+  so the request still verifies it once (and repeats hit the verified token cache)
+- no token, or one that fails verification (forged, random, expired) -> client ip, so a flood of made up tokens
+  shares its ip's bucket instead of getting a fresh one per token and pushing real users' buckets out of the store
+'''
+
+from collections import namedtuple
+from jwt import InvalidTokenError
+from starlette.responses import JSONResponse
+import math
+import re
+
+from app.api.dependencies.auth_dependencies import token_digest, verify_token
+from app.api.middleware import rate_limiter
+from app.config import settings
+
+# path uses the route template, same as in the routers, scope names the bucket
+RatePolicy = namedtuple("RatePolicy", ["method", "path", "max_requests", "window", "scope"])
+
+DEFAULT_POLICIES = [
+    RatePolicy("POST", f"{settings.APP_PREFIX}/exam/{{test_id}}/save", 500, 6000, "save_draft_answer"),
+    RatePolicy("GET", "/results/{test_id}/user", 500, 6000, "get_user_result"),
+]
+
+_PARAM = re.compile(r"\{[^/}]+\}")
+
+
+def _compile(template: str):
+    # "/app/exam/{test_id}/save" -> ^/app/exam/[^/]+/save$
+    pattern = "[^/]+".join(re.escape(part) for part in _PARAM.split(template))
+    return re.compile(f"^{pattern}$")
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, policies=None, backend=None):
+        self.app = app
+        self.backend = backend
+        # static paths are a dict hit, templated ones a short regex scan per method
+        self._static = {}
+        self._templated = {}
+        for policy in policies if policies is not None else DEFAULT_POLICIES:
+            limits = (policy.window / policy.max_requests, policy.window, policy.scope)
+            if _PARAM.search(policy.path):
+                self._templated.setdefault(policy.method, []).append((_compile(policy.path), limits))
+            else:
+                self._static[(policy.method, policy.path)] = limits
+
+    def _match(self, method: str, path: str):
+        limits = self._static.get((method, path))
+        if limits is not None:
+            return limits
+        for pattern, limits in self._templated.get(method, ()):
+            if pattern.match(path):
+                return limits
+        return None
+
+    @staticmethod
+    def _caller(scope) -> str:
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                if value[:7].lower() == b"bearer ":
+                    token = value[7:].decode("latin-1")
+                    digest = token_digest(token)
+                    try:
+                        user = verify_token(token, digest)
+                    except InvalidTokenError:
+                        break
+                    # what get_current_user would resolve, it picks it up from request.state
+                    state = scope.setdefault("state", {})
+                    state["user"] = user
+                    state["token_digest"] = digest
+                    return f"user:{user.get('user_id')}"
+                break
+        client = scope.get("client")
+        return f"ip:{client[0]}" if client else "ip:unknown"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        limits = self._match(scope["method"], scope["path"])
+        if limits is None:
+            return await self.app(scope, receive, send)
+
+        emission_interval, window, policy_scope = limits
+        backend = self.backend or rate_limiter.limiter_backend
+        allowed, retry_after = await backend.hit(f"rl:{policy_scope}:{self._caller(scope)}", emission_interval, window)
+        if allowed:
+            return await self.app(scope, receive, send)
+
+        # body is never read, the connection is answered straight away
+        response = JSONResponse(
+            {"detail": "Rate limit exceeded"},
+            status_code=429,
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+        await response(scope, receive, send)
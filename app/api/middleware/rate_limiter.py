@@ -1,44 +1,169 @@
 '''
-uses leaky bucket algorithm
+uses GCRA (generic cell rate algorithm), equivalent to a leaky bucket but only one timestamp per key -
+the theoretical arrival time (tat) of the next request. no token count, no refill math, one read and one write per check
+
+max_requests per window means one request is "earned" every window / max_requests seconds,
+with bursts of up to max_requests allowed when the key has been quiet
+
+backends
+- RedisGCRABackend, shared by every worker and pod, check + update is one atomic lua script (one round trip)
+- InMemoryGCRABackend, per process, used when RATE_LIMIT_BACKEND_URL is empty, as fallback when redis is down,
+  and as the local stand-in in tests (clock can be injected), memory is bounded by RATE_LIMIT_MAX_KEYS
 '''
 
 from functools import wraps
+from collections import OrderedDict
 from fastapi import HTTPException
+from typing import Callable, Tuple
+import logging
+import math
 import time
 
-# store: {user_id: {tokens, last_refill}} use central db/cache to store this in actual production code
-token_buckets = {}
+from app.config import settings
 
-def rate_limit(max_requests: int = 100, window: int = 600):
-    refill_rate = max_requests / window
+logger = logging.getLogger(__name__)
+
+
+class _Tat:
+    __slots__ = ("tat",)
+
+    def __init__(self, tat: float):
+        self.tat = tat
+
+
+class BucketStore:
+    '''
+    fixed capacity key -> tat store, least recently used first
+    an entry whose tat has passed is equivalent to a missing key (full burst available), so it is safe to drop,
+    expired entries are evicted from the cold end on every insert and the lru entry goes when still at capacity
+    '''
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        return entry.tat if entry is not None else None
+
+    def set(self, key: str, tat: float, now: float):
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.tat = tat
+            self._entries.move_to_end(key)
+            return
+
+        # evict expired entries from the cold end, bounded so one insert never walks the whole store
+        entries = self._entries
+        for _ in range(8):
+            if not entries:
+                break
+            oldest = next(iter(entries.values()))
+            if oldest.tat > now:
+                break
+            entries.popitem(last=False)
+        if len(entries) >= self.capacity:
+            entries.popitem(last=False)
+        entries[key] = _Tat(tat)
+
+
+class InMemoryGCRABackend:
+    def __init__(self, capacity: int = None, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.tats = BucketStore(capacity or settings.RATE_LIMIT_MAX_KEYS)
+
+    async def hit(self, key: str, emission_interval: float, tolerance: float) -> Tuple[bool, float]:
+        # returns (allowed, retry_after seconds), no awaits so this is atomic on the event loop
+        now = self.clock()
+        tat = self.tats.get(key)
+        if tat is None or tat < now:
+            tat = now
+        new_tat = tat + emission_interval
+        allow_at = new_tat - tolerance
+        if allow_at > now:
+            return False, allow_at - now
+        self.tats.set(key, new_tat, now)
+        return True, 0.0
 
-    def decorator(func):
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
-            user = kwargs.get("user", {})
-            user_id = user.get("user_id", "anonymous")
 
-            now = time.time()
+# server side clock (TIME) so pods with skewed clocks still agree, key expires once it is back to a full burst
+GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local emission_interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
 
-            bucket = token_buckets.get(user_id, {
-                "tokens": max_requests,
-                "last": now
-            })
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then
+    tat = now
+end
 
-            # refill
-            elapsed = now - bucket["last"]
-            bucket["tokens"] = min(
-                max_requests,
-                bucket["tokens"] + elapsed * refill_rate
-            )
-            bucket["last"] = now
+local new_tat = tat + emission_interval
+local allow_at = new_tat - tolerance
+if allow_at > now then
+    return {0, tostring(allow_at - now)}
+end
 
-            if bucket["tokens"] < 1:
-                raise HTTPException(status_code=429, detail="Rate limit exceeded")
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, '0'}
+"""
 
-            bucket["tokens"] -= 1
 
-            token_buckets[user_id] = bucket
+class RedisGCRABackend:
+    def __init__(self, url: str, fallback: InMemoryGCRABackend = None):
+        # imported here so redis is only needed when a shared limiter is configured
+        from redis.asyncio import Redis
+
+        self._redis = Redis.from_url(url, socket_timeout=0.05, decode_responses=True)
+        self._script = self._redis.register_script(GCRA_SCRIPT)
+        self.fallback = fallback or InMemoryGCRABackend()
+
+    async def hit(self, key: str, emission_interval: float, tolerance: float) -> Tuple[bool, float]:
+        try:
+            allowed, retry_after = await self._script(keys=[key], args=[emission_interval, tolerance])
+            return bool(allowed), float(retry_after)
+        except Exception as e:
+            # dont fail every request when the cache is down, limit per process until it is back
+            logger.warning(f"rate limiter backend unavailable, using in-process fallback: {e}")
+            return await self.fallback.hit(key, emission_interval, tolerance)
+
+
+def build_backend():
+    if settings.RATE_LIMIT_BACKEND_URL:
+        return RedisGCRABackend(settings.RATE_LIMIT_BACKEND_URL)
+    return InMemoryGCRABackend()
+
+
+# looked up on every call, tests can swap it for an InMemoryGCRABackend with a fake clock
+limiter_backend = build_backend()
+
+
+def rate_limit(max_requests: int = 100, window: int = 600):
+    emission_interval = window / max_requests
+
+    def decorator(func):
+        # keyed per route, so routes with different limits dont share one bucket
+        scope = func.__name__
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            # payload decoded once by get_current_user, either passed to the route or stashed on request.state
+            user = kwargs.get("user")
+            if user is None and kwargs.get("request") is not None:
+                user = getattr(kwargs["request"].state, "user", None)
+            user_id = (user or {}).get("user_id", "anonymous")
+
+            allowed, retry_after = await limiter_backend.hit(f"rl:{scope}:{user_id}", emission_interval, window)
+            if not allowed:
+                raise HTTPException(
+                    status_code=429,
+                    detail="Rate limit exceeded",
+                    headers={"Retry-After": str(math.ceil(retry_after))}
+                )
+
             return await func(*args, **kwargs)
 
         return wrapper
@@ -47,6 +172,4 @@ def rate_limit(max_requests: int = 100, window: int = 600):
 '''
 we can also use some other libraries directly for rate limiting, slowapi - which is by default in memory, but also can use redis
 and fastapi-limiter which by default uses redis
-
-slowapi config in main.py
-'''
\ No newline at end of file
+'''
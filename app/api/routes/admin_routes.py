@@ -1,9 +1,16 @@
 # app/api/routes/admin_routes.py
+from datetime import datetime
+
 from fastapi import APIRouter, Depends, HTTPException
-from app.api.dependencies.auth_dependencies import get_admin_user # not created for skeleton
-from app.worker.tasks import evaluate_test_after_close
+from app.api.dependencies.rbac_dependencies import get_admin_user, set_user_role
+from app.api.schemas.admin_schemas import RoleUpdate
+from app.api.utils.task_producer import send_task
+from app.config import settings
+from app.worker.routing import EVALUATE_TEST
+from app.worker.evaluation_lease import (
+    ATTEMPTS_FIELD, FAILED_FIELD, LEASE_FIELD, claimable, claim_update, exhausted, new_owner
+)
 from app.db.database import get_db
-from celery.result import AsyncResult
 
 admin_router = APIRouter(
     prefix="/admin",
@@ -11,7 +18,7 @@ admin_router = APIRouter(
     dependencies=[Depends(get_admin_user)] # only works for auth + admin user
 )
 
-@admin_router.post("/tests/{test_id}/evaluate") # can be automated later, x amount of time after test or when admin confirms no changes to test
+@admin_router.post("/tests/{test_id}/evaluate") # beat also enqueues it EVALUATION_DELAY_SECONDS after ends_at
 async def trigger_evaluation(
     test_id: str,
     admin=Depends(get_admin_user),
@@ -19,7 +26,7 @@ async def trigger_evaluation(
 ):
     
     # validate test exists and is closed
-    test = await db.tests.find_one({"test_id": test_id})
+    test = await db.tests.find_one({"test_id": test_id}, projection={"evaluated": 1, FAILED_FIELD: 1, ATTEMPTS_FIELD: 1})
     if not test:
         raise HTTPException(404, "Test not found")
     
@@ -27,29 +34,141 @@ async def trigger_evaluation(
         return {
             "status": "already_evaluated"
         }
+
+    now = datetime.utcnow()
+    if test.get(FAILED_FIELD) or test.get(ATTEMPTS_FIELD, 0) >= settings.EVALUATION_MAX_ATTEMPTS:
+        # the scheduler gave up on it, an admin trigger is the explicit retry (after fixing the data), fresh attempts
+        # only while nothing runs, a live lease is left alone
+        await db.tests.update_one(
+            {"test_id": test_id, "$or": [{FAILED_FIELD: True}, exhausted(now, settings.EVALUATION_MAX_ATTEMPTS)]},
+            {"$set": {FAILED_FIELD: False, ATTEMPTS_FIELD: 0}, "$unset": {"evaluation_error": ""}}
+        )
     
-    # check if already processing
-    existing_task_id = test.get("evaluation_task_id")
-    if existing_task_id:
-        task = AsyncResult(existing_task_id)
-        if task.state in ['PENDING', 'STARTED']:
+    # claim the evaluation lease (compare and set on the test), same as the scheduler, see evaluation_lease.py
+    # two admins, a retry or the scheduler racing this can't enqueue a second evaluation
+    task_id = new_owner()
+    claimed = await db.tests.find_one_and_update(
+        {"test_id": test_id, **claimable(now, max_attempts=settings.EVALUATION_MAX_ATTEMPTS)},
+        claim_update(task_id, settings.EVALUATION_LEASE_SECONDS, now),
+        projection={LEASE_FIELD: 1}
+    )
+    if claimed is None:
+        current = await db.tests.find_one(
+            {"test_id": test_id}, projection={"evaluated": 1, FAILED_FIELD: 1, LEASE_FIELD: 1}
+        ) or {}
+        if current.get("evaluated"):
             return {
-                "status": "processing",
-                "task_id": existing_task_id,
-                "message": "evaluation in progress"
+                "status": "already_evaluated"
             }
+        lease = current.get(LEASE_FIELD) or {}
+        if current.get(FAILED_FIELD) or not lease or lease["expires_at"] < now:
+            # a concurrent run failed its last attempt between the reset and the claim, trigger again to retry
+            return {
+                "status": "failed",
+                "message": "evaluation failed after the maximum attempts"
+            }
+        return {
+            "status": "processing",
+            "task_id": lease.get("owner"),
+            "message": "evaluation in progress"
+        }
     
-    # Trigger async task
-    task = evaluate_test_after_close.delay(test_id)
-    
-    # Store task ID for tracking
-    await db.tests.update_one(
-        {"test_id": test_id},
-        {"$set": {"evaluation_task_id": task.id}}
-    )
+    # Trigger async task, under the id the lease was claimed for
+    try:
+        send_task(EVALUATE_TEST, args=[test_id], task_id=task_id)
+    except Exception:
+        # not queued, free the test again instead of blocking it until the lease expires
+        await db.tests.update_one(
+            {"test_id": test_id, f"{LEASE_FIELD}.owner": task_id},
+            {"$unset": {LEASE_FIELD: ""}}
+        )
+        raise
     
     return {
         "status": "queued",
-        "task_id": task.id,
+        "task_id": task_id,
         "message": "evaluation started"
     }
+
+
+@admin_router.get("/tests/{test_id}/evaluation")
+async def evaluation_status(
+    test_id: str,
+    db=Depends(get_db)
+):
+    '''
+    progress of a running evaluation and the stage timings of a finished one
+    one indexed find_one on the test, the task writes its progress there so polling never touches the result backend
+    '''
+    test = await db.tests.find_one(
+        {"test_id": test_id},
+        projection={"_id": 0, "evaluated": 1, "evaluation_task_id": 1, "evaluation_progress": 1, "evaluation_timings": 1,
+                    FAILED_FIELD: 1, ATTEMPTS_FIELD: 1, "evaluation_error": 1}
+    )
+    if not test:
+        raise HTTPException(404, "Test not found")
+
+    return {
+        "test_id": test_id,
+        "evaluated": test.get("evaluated", False),
+        "task_id": test.get("evaluation_task_id"),
+        # the scheduler stopped retrying it, POST .../evaluate retries with fresh attempts
+        "failed": test.get(FAILED_FIELD, False),
+        "attempts": test.get(ATTEMPTS_FIELD, 0),
+        "error": test.get("evaluation_error"),
+        "progress": test.get("evaluation_progress"),
+        "timings": test.get("evaluation_timings")
+    }
+
+
+@admin_router.get("/tests/{test_id}/questions/stats")
+async def question_stats(
+    test_id: str,
+    db=Depends(get_db)
+):
+    # item analytics of an evaluated test (difficulty, options, discrimination), written by the evaluation
+    stats = await db.question_stats.find(
+        {"test_id": test_id},
+        projection={"_id": 0}
+    ).sort("question_id", 1).to_list(None)
+
+    if not stats:
+        raise HTTPException(404, "No item analytics for this test, is it evaluated?")
+    return {
+        "test_id": test_id,
+        "questions": stats
+    }
+
+
+@admin_router.get("/tests/{test_id}/risk")
+async def candidate_risk(
+    test_id: str,
+    limit: int = 50,
+    db=Depends(get_db)
+):
+    # anti-cheat aggregates, most suspicious first (risk_ranking index), refreshed by aggregate_proctor_risk
+    candidates = await db.proctor_risk.find(
+        {"test_id": test_id},
+        projection={"_id": 0, "test_id": 0}
+    ).sort("risk_score", -1).limit(min(limit, 500)).to_list(None)
+
+    return {
+        "test_id": test_id,
+        "candidates": candidates
+    }
+
+
+@admin_router.put("/users/{user_id}/role")
+async def update_user_role(
+    user_id: str,
+    payload: RoleUpdate,
+    db=Depends(get_db)
+):
+    # also drops the cached role, so the change applies on this process immediately
+    if not await set_user_role(user_id, payload.role, db):
+        raise HTTPException(404, "User not found")
+
+    return {
+        "user_id": user_id,
+        "role": payload.role
+    }
@@ -1,18 +1,20 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
 from pymongo import AsyncMongoClient
-from datetime import datetime
+from pymongo.errors import BulkWriteError
+from pydantic import ValidationError
+from jwt import InvalidTokenError
+from datetime import datetime, timezone
 from uuid import uuid4
+import time
 
-from app.api.schemas.app_schemas import SaveDraftRequest
-from app.api.dependencies.auth_dependencies import get_current_user
+from app.api.schemas.app_schemas import SaveDraftRequest, SessionMessage, ProctorEventBatch
+from app.api.dependencies.auth_dependencies import get_current_user, verify_token
+from app.api.services.exam_service import save_draft, save_time_spent
+from app.api.services.exam_session import exam_sessions, NOT_STARTED, IN_PROGRESS, SUBMITTED
+from app.api.services.proctoring import event_buffer
 from app.db.database import get_db
 from app.config import settings
 
-from app.api.main import limiter # slowapi rate limiter
-
-from app.api.middleware.rate_limiter import rate_limit # custom rate limiter
-from app.worker.tasks import process_data_task
-
 
 app_router = APIRouter(
     prefix=settings.APP_PREFIX,
@@ -20,6 +22,12 @@ app_router = APIRouter(
     dependencies=[Depends(get_current_user)]  # all routes need auth
 )
 
+# websocket routes cant go through HTTPBearer, so they live on their own router and authenticate once per connection
+exam_ws_router = APIRouter(
+    prefix=settings.APP_PREFIX,
+    tags=["app"]
+)
+
 # exam start endpoint
 @app_router.post("/exam/{test_id}/start")
 async def start_exam(
@@ -28,24 +36,28 @@ async def start_exam(
     db = Depends(get_db)
 ):
 
-    # redis = get_redis()
-    # already_started = redis.exists(f"exam_started:{test_id}:{user.user_id}")
-    # if already_started:
-    #     return {"status": "already_started"}
+    # duplicate/retried starts are answered from the session cache, no mongo read
+    found, _ = await exam_sessions.get(db, test_id, user.user_id)
+    if found == NOT_STARTED:
+        test = await db.tests.find_one({"test_id": test_id}, projection={"duration_seconds": 1, "drafts_compacted": 1})
+        # evaluated and compacted, the drafts are gone, only then is the archive worth a read
+        if (test or {}).get("drafts_compacted") and await exam_sessions.archived(db, test_id, user.user_id):
+            return {"status": "already_submitted"}
+        duration = (test or {}).get("duration_seconds", settings.EXAM_DURATION_SECONDS)
+        # atomic claim, concurrent starts for the same session get the winner's state back
+        found = await exam_sessions.begin(db, test_id, user.user_id, duration, found=found)
 
-    # in prod, do above
-    exists = await db.draft_submissions.find_one(
-        {"user_id": user.user_id, "test_id": test_id},
-        projection={"_id": 1}
-    )
-    if exists:
+    if found == SUBMITTED:
+        return {"status": "already_submitted"}
+    if found != NOT_STARTED:
         return {"status": "already_started"}
     
     questions = await db.questions.find({"test_id": test_id}).to_list(None)
+    started_at = datetime.now(timezone.utc)
     
     # index already created in database.py for draft_submission collection
     drafts = [{
-        "user_id": user_id,
+        "user_id": user.user_id,
         "test_id": test_id,
         "question_id": q["question_id"],
         "selected_option": None,
@@ -55,7 +67,10 @@ async def start_exam(
         "marks_correct_snapshot": q["marks_correct"],
         "marks_wrong_snapshot": q["marks_wrong"],
         "subject_snapshot": q["subject"],
-        "final_submit": False
+        "final_submit": False,
+        # lets the session cache rebuild the deadline from mongo after a miss
+        "started_at": started_at,
+        "duration_seconds": duration
     } for q in questions]
     
     # indexes already exist, so this is fast
@@ -65,71 +80,208 @@ async def start_exam(
             ordered=False
         )
 
-        # in prod, cache exam started
-        # redis.setex(f"exam_started:{test_id}:{user.user_id}", 10800, "1")
-
         return {
             "status": "exam_started"
         }
         
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if errors and all(err.get("code") == 11000 for err in errors):
+            # unique_user_answer, a start on another worker / pod won the same race (the in process session store
+            # only claims per process), its rows and ours are the same questions, keep them all
+            return {
+                "status": "already_started"
+            }
+        await _rollback_drafts(db, drafts, test_id, user.user_id)
+        raise HTTPException(500, f"Failed to initialize exam")
+
     except Exception:
-        await db.draft_submissions.delete_many({
-            "user_id": user.user_id,
-            "test_id": test_id
-        })
+        await _rollback_drafts(db, drafts, test_id, user.user_id)
         raise HTTPException(500, f"Failed to initialize exam")
 
 
+async def _rollback_drafts(db, drafts: list, test_id: str, user_id: str):
+    # only the rows this request inserted (insert_many sets _id on each document), never a concurrent start's
+    await db.draft_submissions.delete_many({"_id": {"$in": [d["_id"] for d in drafts if "_id" in d]}})
+    await exam_sessions.forget(test_id, user_id)
+
+
 
 @app_router.post("/exam/{test_id}/save")
-@rate_limit(max_requests=500, window=6000)  # custom rate limiter
 async def save_draft_answer(
     test_id: str,
     payload: SaveDraftRequest,
     user = Depends(get_current_user),
     db = Depends(get_db)
 ):
-    await db.draft_submissions.update_one(
-        {
-            "user_id": user.user_id,
-            "test_id": test_id,
-            "question_id": payload.question_id
-        },
-        {"$set": {
-            "selected_option": payload.selected_option,
-            "marked_for_review": payload.marked_for_review,
-            "visited": True,
-            "time_spent_seconds": payload.time_spent_seconds,
-
-        }},
-        upsert=True
+    await save_draft(
+        db,
+        user.user_id,
+        test_id,
+        payload.question_id,
+        payload.selected_option,
+        payload.marked_for_review,
+        payload.time_spent_seconds
     )
     return {"status": "saved"}
 
 
+@exam_ws_router.websocket("/exam/{test_id}/session")
+async def exam_session_channel(
+    websocket: WebSocket,
+    test_id: str,
+    db = Depends(get_db)
+):
+    '''
+    persistent autosave channel, token verified once on connect instead of on every save
+
+    browsers cant set headers on websockets, so token comes from ?token= (or Authorization header for other clients)
+    client -> {"s": 12, "k": "a", "q": "q1", "o": 2, "r": false, "t": 40}   answer delta
+    client -> {"s": 13, "k": "h", "q": "q1", "t": 55}                       time_spent heartbeat
+    server -> {"a": 12}                                                     ack, client can drop frames <= seq
+    server -> {"e": 13, "d": "..."}                                         rejected frame
+    '''
+    token = websocket.query_params.get("token")
+    if not token:
+        auth_header = websocket.headers.get("authorization", "")
+        if auth_header.lower().startswith("bearer "):
+            token = auth_header[7:]
+
+    try:
+        user = verify_token(token or "")
+    except InvalidTokenError:
+        # 4401, app level close code mirroring http 401
+        await websocket.close(code=4401)
+        return
+
+    user_id = user["user_id"]
+    expires_at = user.get("exp")
+    last_seq = -1
+
+    await websocket.accept()
+    try:
+        while True:
+            frame = await websocket.receive_text()
+
+            if expires_at is not None and time.time() >= expires_at:
+                await websocket.close(code=4401, reason="Token has expired")
+                return
+
+            try:
+                msg = SessionMessage.model_validate_json(frame)
+            except ValidationError:
+                await websocket.send_json({"e": None, "d": "Invalid message"})
+                continue
+
+            # resend of an already acked frame (eg. client retry), ack again without writing
+            if msg.seq <= last_seq:
+                await websocket.send_json({"a": msg.seq})
+                continue
+
+            if msg.kind == "h":
+                await save_time_spent(db, user_id, test_id, msg.question_id, msg.time_spent_seconds)
+            else:
+                await save_draft(
+                    db,
+                    user_id,
+                    test_id,
+                    msg.question_id,
+                    msg.selected_option,
+                    msg.marked_for_review,
+                    msg.time_spent_seconds
+                )
+
+            last_seq = msg.seq
+            await websocket.send_json({"a": msg.seq})
+
+    except WebSocketDisconnect:
+        # client reconnects and resends everything after its last acked seq
+        pass
+
+
 @app_router.post("/exam/{test_id}/submit")
 async def final_submit(
     test_id: str, 
     user=Depends(get_current_user), 
     db=Depends(get_db)
 ):
+    # double submits and retries are rejected from the session cache, no mongo write
+    found = await exam_sessions.submit(db, test_id, user.user_id)
+    if found != IN_PROGRESS:
+        raise HTTPException(400, "Already submitted or no answers found")
+
     # just mark as submitted
-    result = await db.draft_submissions.update_many(
-        {
-            "user_id": user.user_id,
-            "test_id": test_id,
-            "final_submit": False # prevent double submit
-        },
-        {
-            "$set": {
-                "final_submit": True
+    try:
+        result = await db.draft_submissions.update_many(
+            {
+                "user_id": user.user_id,
+                "test_id": test_id,
+                "final_submit": False # prevent double submit
+            },
+            {
+                "$set": {
+                    "final_submit": True
+                }
             }
-        }
-    )
+        )
+    except Exception:
+        await exam_sessions.forget(test_id, user.user_id)
+        raise
     
     if result.modified_count == 0:
+        # cache was ahead of mongo, let the next request rebuild it
+        await exam_sessions.forget(test_id, user.user_id)
         raise HTTPException(400, "Already submitted or no answers found")
     
     return {
         "status": "submitted"
     }
+
+
+@app_router.post("/exam/{test_id}/events", status_code=202)
+async def ingest_events(
+    test_id: str,
+    payload: ProctorEventBatch,
+    request: Request,
+    user=Depends(get_current_user)
+):
+    '''
+    batched anti-cheat events, buffered and bulk inserted off the request, see services/proctoring.py
+    202 means buffered, on 429/503 the client keeps the batch and resends it after Retry-After
+    '''
+    if len(payload.events) > settings.PROCTOR_BATCH_MAX_EVENTS:
+        raise HTTPException(413, f"At most {settings.PROCTOR_BATCH_MAX_EVENTS} events per batch")
+    if not event_buffer.available():
+        raise HTTPException(503, "Event store unavailable, retry later", headers={"Retry-After": "5"})
+
+    # server receive time is the time series key, client clocks are kept but not trusted for ordering
+    # client ip as seen by uvicorn, behind a proxy run it with --proxy-headers so this is the real client
+    received_at = datetime.now(timezone.utc)
+    meta = {"test_id": test_id, "user_id": user.user_id}
+    ip = request.client.host if request.client else None
+    events = [{
+        "ts": received_at,
+        "meta": meta,
+        "kind": e.kind,
+        "client_ts": e.ts,
+        "question_id": e.question_id,
+        "ip": ip,
+        "data": e.data
+    } for e in payload.events]
+
+    if not event_buffer.offer(events):
+        raise HTTPException(429, "Too many events buffered, retry shortly", headers={"Retry-After": "1"})
+    return {"status": "accepted", "events": len(events)}
+
+
+@app_router.get("/exam/{test_id}/status")
+async def exam_status(
+    test_id: str,
+    user=Depends(get_current_user),
+    db=Depends(get_db)
+):
+    state, remaining = await exam_sessions.remaining_seconds(db, test_id, user.user_id)
+    return {
+        "status": state,
+        "remaining_seconds": remaining
+    }
@@ -2,7 +2,8 @@ from fastapi import APIRouter, HTTPException, Depends
 from pymongo import AsyncMongoClient
 
 from app.api.schemas.auth_schemas import UserCreate, UserLogin, Token
-from app.api.utils.auth_utils import hash_password, verify_password, create_token
+from app.api.utils.auth_utils import hash_password_async, verify_and_update_password, create_token
+from app.api.dependencies.rbac_dependencies import DEFAULT_ROLE
 from app.db.database import get_db
 
 from app.config import settings
@@ -18,7 +19,8 @@ async def signup(user: UserCreate, db: AsyncMongoClient = Depends(get_db)):
     user_doc = {
         "email": user.email,
         "username": user.username,
-        "password": hash_password(user.password)
+        "password": await hash_password_async(user.password),
+        "role": DEFAULT_ROLE
     }
     result = await db.users.insert_one(user_doc)
     return {"user_id": str(result.inserted_id)}
@@ -26,12 +28,21 @@ async def signup(user: UserCreate, db: AsyncMongoClient = Depends(get_db)):
 @auth_router.post("/login", response_model=Token)
 async def login(creds: UserLogin, db: AsyncMongoClient = Depends(get_db)):
     user = await db.users.find_one({"email": creds.email})
-    if not user or not verify_password(creds.password, user["password"]):
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    # bcrypt runs on the hashing pool, not the event loop
+    valid, new_hash = await verify_and_update_password(creds.password, user["password"])
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    if new_hash:
+        # stored hash used an old cost factor, upgrade it now that we have the plaintext
+        await db.users.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
     
     token = create_token(str(user["_id"]), user["email"])
     return {"access_token": token}
 
 '''
-for production code, we can add refresh tokens, rbac, etc
+for production code, we can add refresh tokens, etc
 '''
\ No newline at end of file
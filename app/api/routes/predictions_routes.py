@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from app.api.dependencies.auth_dependencies import get_current_user
-from app.db.database import get_db
+from app.db.database import get_analytics_db
 from typing import Optional
 
 # import json
@@ -13,7 +13,7 @@ predictions_router = APIRouter(prefix="/predictions", tags=["predictions"])
 async def predict_rank(
     mock_test_id: str,
     user=Depends(get_current_user),
-    db=Depends(get_db),
+    db=Depends(get_analytics_db), # full reference scan, kept off the exam time pools
     reference_test_id: str = "CAT2024"  # real exam to compare against
 ):
     '''
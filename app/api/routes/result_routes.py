@@ -1,19 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException
 from app.api.dependencies.auth_dependencies import get_current_user
-from app.db.database import get_db
+from app.db.database import get_read_db
 
-from app.api.schemas.result_schemas import Leaderboard, UserResult
-from app.api.middleware.rate_limiter import rate_limit # custom rate limiter
+from app.api.schemas.result_schemas import LeaderboardPage, PerformanceProgress, UserResult
+from app.api.services.performance_progress import summarize
 import json
 
 results_router = APIRouter(prefix="/results", tags=["results"], dependencies=[Depends(get_current_user)])
 
+@results_router.get("/me/progress", response_model=PerformanceProgress)
+async def get_my_progress(
+    user=Depends(get_current_user),
+    db=Depends(get_read_db) # only changes when an evaluation finishes
+):
+    '''
+    score, rank and percentile trend across every mock the candidate has taken
+    one find_one on _id, the evaluation keeps user_performance up to date (app/worker/performance_history.py),
+    derived figures in app/api/services/performance_progress.py
+    instead of a test_results scan by user_id, which has no index
+    '''
+    history = await db.user_performance.find_one({"_id": user.user_id}, projection={"counted_tests": 0})
+    # no evaluated mock yet is an empty history, not a 404
+    return summarize(history, user.user_id)
+
+
 @results_router.get("/{test_id}/user", response_model=UserResult)
-@rate_limit(max_requests=500, window=6000)  # custom rate limiter
 async def get_user_result(
     test_id: str,
     user=Depends(get_current_user),
-    db=Depends(get_db)
+    db=Depends(get_read_db) # secondaries, results don't change after evaluation
 ):
     '''
     in prod, check redis cache first - present for 7 days.
@@ -42,12 +57,12 @@ async def get_user_result(
     return UserResult(**result)
 
 
-@results_router.get("/{test_id}/leaderboard", response_model=list[Leaderboard])
+@results_router.get("/{test_id}/leaderboard", response_model=LeaderboardPage)
 async def get_leaderboard(
     test_id: str,
     limit: int = 100,
     offset: int = 0,
-    db=Depends(get_db)
+    db=Depends(get_read_db)
 ):
     '''
     paginated leaderboard, try redis first
@@ -99,5 +114,5 @@ async def get_leaderboard(
     ]
     
     return {
-        "leaderboard": leaderboard # TODO create pydantic schema for leaderboard
+        "leaderboard": leaderboard
     }
\ No newline at end of file
@@ -0,0 +1,5 @@
+from pydantic import BaseModel
+from typing import Literal
+
+class RoleUpdate(BaseModel):
+    role: Literal["admin", "editor", "viewer"]
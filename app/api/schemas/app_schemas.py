@@ -1,9 +1,35 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, List, Literal
 from datetime import datetime
 
 class SaveDraftRequest(BaseModel):
     question_id: str
     selected_option: Optional[int] = None
     marked_for_review: bool = False
-    time_spent_seconds: int
\ No newline at end of file
+    time_spent_seconds: int
+
+class SessionMessage(BaseModel):
+    '''
+    compact websocket frame, short keys to keep autosave frames small
+    k: "a" answer delta, "h" time_spent heartbeat
+    '''
+    model_config = ConfigDict(populate_by_name=True)
+
+    seq: int = Field(alias="s")
+    kind: Literal["a", "h"] = Field(default="a", alias="k")
+    question_id: str = Field(alias="q")
+    selected_option: Optional[int] = Field(default=None, alias="o")
+    marked_for_review: bool = Field(default=False, alias="r")
+    time_spent_seconds: int = Field(alias="t")
+
+
+class ProctorEvent(BaseModel):
+    '''one client side anti-cheat observation, ts is the client clock, the server stamps its own on receipt'''
+    kind: Literal["tab_switch", "focus_loss", "focus_gain", "fullscreen_exit", "copy", "paste",
+                  "devtools_open", "network_change"]
+    ts: datetime
+    question_id: Optional[str] = None
+    data: Optional[dict] = None
+
+class ProctorEventBatch(BaseModel):
+    events: List[ProctorEvent] = Field(min_length=1)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 class UserResult(BaseModel):
@@ -20,4 +20,53 @@ class Leaderboard(BaseModel):
     user_id: str
     score: int
     percentile: float
-    subject_scores: Dict[str, int]
\ No newline at end of file
+    subject_scores: Dict[str, int]
+
+class LeaderboardPage(BaseModel):
+    leaderboard: List[Leaderboard]
+
+class MockPerformance(BaseModel):
+    test_id: str
+    test_name: Optional[str] = None
+    evaluated_at: datetime
+    total_score: int
+    rank: int
+    candidates: int
+    percentile: float
+    attempted: int
+    correct: int
+    subject_scores: Dict[str, int]
+    subject_percentiles: Dict[str, float]
+
+
+class SubjectTrend(BaseModel):
+    tests: int
+    avg_score: float
+    avg_percentile: float
+    rolling_avg_percentile: Optional[float] = None
+
+
+class RollingTrend(BaseModel):
+    window: int
+    avg_score: Optional[float] = None
+    avg_percentile: Optional[float] = None
+    percentile_change: Optional[float] = None
+
+
+class BestPerformance(BaseModel):
+    score: int
+    percentile: float
+    rank: int
+
+
+class PerformanceProgress(BaseModel):
+    user_id: str
+    tests_taken: int
+    avg_score: Optional[float] = None
+    avg_percentile: Optional[float] = None
+    best: Optional[BestPerformance] = None
+    rolling: RollingTrend
+    subjects: Dict[str, SubjectTrend]
+    best_subjects: List[str]
+    mocks: List[MockPerformance] # oldest first, the last 50
+    updated_at: Optional[datetime] = None
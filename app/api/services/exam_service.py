@@ -0,0 +1,48 @@
+'''
+exam write path, shared by the http routes and the websocket session channel
+so both end up with the exact same draft_submissions document shape
+'''
+
+from typing import Optional
+
+
+async def save_draft(
+    db,
+    user_id: str,
+    test_id: str,
+    question_id: str,
+    selected_option: Optional[int],
+    marked_for_review: bool,
+    time_spent_seconds: int
+):
+    # uses unique_user_answer index
+    await db.draft_submissions.update_one(
+        {
+            "user_id": user_id,
+            "test_id": test_id,
+            "question_id": question_id
+        },
+        {"$set": {
+            "selected_option": selected_option,
+            "marked_for_review": marked_for_review,
+            "visited": True,
+            "time_spent_seconds": time_spent_seconds,
+        }},
+        upsert=True
+    )
+
+
+async def save_time_spent(db, user_id: str, test_id: str, question_id: str, time_spent_seconds: int):
+    # heartbeat only touches the timer, answer fields are left as they are
+    # no upsert, a heartbeat for a question that was never initialised is ignored
+    await db.draft_submissions.update_one(
+        {
+            "user_id": user_id,
+            "test_id": test_id,
+            "question_id": question_id
+        },
+        {"$set": {
+            "visited": True,
+            "time_spent_seconds": time_spent_seconds,
+        }}
+    )
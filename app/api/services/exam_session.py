@@ -0,0 +1,217 @@
+'''
+exam session state machine, not_started -> in_progress -> submitted
+
+answers "has this user started / submitted / how much time is left" from a cache
+so duplicate /start and /submit requests (double clicks, client retries) are rejected without touching mongo.
+mongo stays the source of truth, a cache miss is rebuilt from draft_submissions once and then served from cache.
+
+SESSION_CACHE_URL empty -> in process store, ok for local runs and single worker deployments
+SESSION_CACHE_URL=redis://... -> shared between workers and pods, transitions are atomic server side
+'''
+
+import time
+from datetime import timezone
+from typing import Optional, Tuple
+
+from app.config import settings
+
+NOT_STARTED = "not_started"
+IN_PROGRESS = "in_progress"
+SUBMITTED = "submitted"
+
+
+def session_key(test_id: str, user_id: str) -> str:
+    return f"exam_session:{test_id}:{user_id}"
+
+
+class InMemorySessionStore:
+    '''
+    local stand-in for the shared cache, per process only
+    transitions have no awaits inside them so they are atomic on the event loop
+    '''
+
+    SWEEP_EVERY = 10000  # writes between expired entry sweeps
+
+    def __init__(self):
+        self._entries = {}  # key: (state, deadline, expires_at)
+        self._writes = 0
+
+    async def get(self, key: str) -> Optional[Tuple[str, float]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] <= time.time():
+            del self._entries[key]
+            return None
+        return entry[0], entry[1]
+
+    async def set(self, key: str, state: str, deadline: float, ttl: int):
+        self._entries[key] = (state, deadline, time.time() + ttl)
+        self._writes += 1
+        if self._writes % self.SWEEP_EVERY == 0:
+            now = time.time()
+            for k in [k for k, e in self._entries.items() if e[2] <= now]:
+                del self._entries[k]
+
+    async def transition(self, key: str, expected: Optional[str], state: str, deadline: float, ttl: int) -> bool:
+        current = await self.get(key)
+        if (current[0] if current else None) != expected:
+            return False
+        await self.set(key, state, deadline, ttl)
+        return True
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+
+# compare and set in one round trip, ARGV[1] is "" when the key is expected to be missing
+TRANSITION_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'state') or ''
+if current ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'state', ARGV[2], 'deadline', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+
+class RedisSessionStore:
+    def __init__(self, url: str):
+        # imported here so redis is only needed when a shared cache is configured
+        from redis.asyncio import Redis
+
+        self._redis = Redis.from_url(url, decode_responses=True)
+        self._transition = self._redis.register_script(TRANSITION_SCRIPT)
+
+    async def get(self, key: str) -> Optional[Tuple[str, float]]:
+        entry = await self._redis.hgetall(key)
+        if not entry:
+            return None
+        return entry["state"], float(entry["deadline"])
+
+    async def set(self, key: str, state: str, deadline: float, ttl: int):
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.hset(key, mapping={"state": state, "deadline": deadline})
+        pipe.expire(key, ttl)
+        await pipe.execute()
+
+    async def transition(self, key: str, expected: Optional[str], state: str, deadline: float, ttl: int) -> bool:
+        done = await self._transition(keys=[key], args=[expected or "", state, deadline, ttl])
+        return bool(done)
+
+    async def delete(self, key: str):
+        await self._redis.delete(key)
+
+
+class ExamSessionState:
+    def __init__(self, store):
+        self.store = store
+
+    def _ttl(self, deadline: float) -> int:
+        # keep the entry a while after the deadline so late retries are still answered from cache
+        return max(1, int(deadline - time.time()) + settings.EXAM_SESSION_GRACE_SECONDS)
+
+    async def _load(self, db, test_id: str, user_id: str) -> Tuple[str, float]:
+        # cache miss, rebuild from mongo (user_test_lookup index)
+        draft = await db.draft_submissions.find_one(
+            {"user_id": user_id, "test_id": test_id},
+            projection={"final_submit": 1, "started_at": 1, "duration_seconds": 1}
+        )
+        if not draft:
+            # not cached, the first /start of every candidate lands here, no further read
+            # (compacted drafts are checked by start_exam through archived(), only for tests marked drafts_compacted)
+            return NOT_STARTED, 0.0
+
+        started_at = draft.get("started_at")
+        duration = draft.get("duration_seconds", settings.EXAM_DURATION_SECONDS)
+        if started_at is None:
+            deadline = time.time() + duration
+        else:
+            if started_at.tzinfo is None:
+                started_at = started_at.replace(tzinfo=timezone.utc)
+            deadline = started_at.timestamp() + duration
+
+        # any draft left unsubmitted means the session is still open, final_submit flips all of them together
+        unsubmitted = draft.get("final_submit") is False or await db.draft_submissions.find_one(
+            {"user_id": user_id, "test_id": test_id, "final_submit": False},
+            projection={"_id": 1}
+        )
+        state = IN_PROGRESS if unsubmitted else SUBMITTED
+
+        await self.store.set(session_key(test_id, user_id), state, deadline, self._ttl(deadline))
+        return state, deadline
+
+    async def get(self, db, test_id: str, user_id: str) -> Tuple[str, float]:
+        cached = await self.store.get(session_key(test_id, user_id))
+        if cached is not None:
+            return cached
+        return await self._load(db, test_id, user_id)
+
+    async def remaining_seconds(self, db, test_id: str, user_id: str) -> Tuple[str, int]:
+        state, deadline = await self.get(db, test_id, user_id)
+        if state != IN_PROGRESS:
+            return state, 0
+        return state, max(0, int(deadline - time.time()))
+
+    async def begin(self, db, test_id: str, user_id: str, duration_seconds: int, found: Optional[str] = None) -> str:
+        '''
+        claims not_started -> in_progress, returns the state the caller found
+        only the request that gets NOT_STARTED back should create the drafts
+        found is the state the caller just read with get(), a not started miss isn't cached so it saves a reread
+        '''
+        state = found if found is not None else (await self.get(db, test_id, user_id))[0]
+        if state != NOT_STARTED:
+            return state
+
+        deadline = time.time() + duration_seconds
+        claimed = await self.store.transition(
+            session_key(test_id, user_id), None, IN_PROGRESS, deadline, self._ttl(deadline)
+        )
+        if not claimed:
+            # another request for the same session won the race
+            state, _ = await self.get(db, test_id, user_id)
+            return state
+        return NOT_STARTED
+
+    async def submit(self, db, test_id: str, user_id: str) -> str:
+        '''
+        claims in_progress -> submitted, returns the state the caller found
+        only the request that gets IN_PROGRESS back should write final_submit
+        '''
+        state, deadline = await self.get(db, test_id, user_id)
+        if state != IN_PROGRESS:
+            return state
+
+        claimed = await self.store.transition(
+            session_key(test_id, user_id), IN_PROGRESS, SUBMITTED, deadline, self._ttl(deadline)
+        )
+        if not claimed:
+            state, _ = await self.get(db, test_id, user_id)
+            return state
+        return IN_PROGRESS
+
+    async def archived(self, db, test_id: str, user_id: str) -> bool:
+        '''
+        drafts of an evaluated test are compacted into draft_archives, a candidate with an archive has submitted
+        only asked for tests marked drafts_compacted, caches the session as submitted when found
+        '''
+        found = await db.draft_archives.find_one({"_id": f"{test_id}:{user_id}"}, projection={"_id": 1})
+        if found:
+            now = time.time()
+            await self.store.set(session_key(test_id, user_id), SUBMITTED, now, settings.EXAM_SESSION_GRACE_SECONDS)
+        return found is not None
+
+    async def forget(self, test_id: str, user_id: str):
+        # mongo write failed after a claim, or cache disagrees with mongo
+        # drop it so the next call rebuilds from mongo
+        await self.store.delete(session_key(test_id, user_id))
+
+
+def _build_store():
+    if settings.SESSION_CACHE_URL:
+        return RedisSessionStore(settings.SESSION_CACHE_URL)
+    return InMemorySessionStore()
+
+
+exam_sessions = ExamSessionState(_build_store())
@@ -0,0 +1,66 @@
+'''
+progress screen, derived on read from one user_performance document
+
+the evaluation maintains the document (app/worker/performance_history.py): lifetime sums, bests, the last 50 mocks,
+subjects keyed by a safe id and carrying their name. averages, the rolling window over the last ROLLING_WINDOW
+mocks and the subject ordering are computed here, a few dozen numbers, no worker module is imported
+'''
+from typing import List, Optional
+
+ROLLING_WINDOW = 5
+BEST_SUBJECTS = 3
+
+
+def _average(values: List[float]) -> Optional[float]:
+    return round(sum(values) / len(values), 2) if values else None
+
+
+def _mock(entry: dict) -> dict:
+    # subjects are stored as a list (names are free text), the response keys them by name
+    mock = {k: v for k, v in entry.items() if k != "subjects"}
+    subjects = entry.get("subjects", [])
+    mock["subject_scores"] = {s["subject"]: s["score"] for s in subjects}
+    mock["subject_percentiles"] = {s["subject"]: s["percentile"] for s in subjects}
+    return mock
+
+
+def summarize(doc: Optional[dict], user_id: str) -> dict:
+    '''the progress response from a user_performance document (None before the first evaluated mock)'''
+    doc = doc or {}
+    mocks = [_mock(m) for m in doc.get("mocks", [])]
+    taken = doc.get("tests_taken", 0)
+    totals = doc.get("totals", {})
+    recent = mocks[-ROLLING_WINDOW:]
+
+    subjects = {}
+    for sums in doc.get("subjects", {}).values():
+        subject = sums.get("subject")
+        if subject is None or not sums.get("tests"):
+            continue
+        recent_percentiles = [m["subject_percentiles"][subject] for m in recent if subject in m["subject_percentiles"]]
+        subjects[subject] = {
+            "tests": sums["tests"],
+            "avg_score": round(sums["score"] / sums["tests"], 2),
+            "avg_percentile": round(sums["percentile"] / sums["tests"], 2),
+            "rolling_avg_percentile": _average(recent_percentiles),
+        }
+    best_subjects = sorted(subjects, key=lambda s: subjects[s]["avg_percentile"], reverse=True)[:BEST_SUBJECTS]
+
+    return {
+        "user_id": user_id,
+        "tests_taken": taken,
+        "avg_score": round(totals["score"] / taken, 2) if taken else None,
+        "avg_percentile": round(totals["percentile"] / taken, 2) if taken else None,
+        "best": doc.get("best"),
+        "rolling": {
+            "window": len(recent),
+            "avg_score": _average([m["total_score"] for m in recent]),
+            "avg_percentile": _average([m["percentile"] for m in recent]),
+            # latest against the oldest mock in the window, positive is improving
+            "percentile_change": round(recent[-1]["percentile"] - recent[0]["percentile"], 2) if len(recent) > 1 else None,
+        },
+        "subjects": subjects,
+        "best_subjects": best_subjects,
+        "mocks": mocks,
+        "updated_at": doc.get("updated_at"),
+    }
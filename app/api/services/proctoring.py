@@ -0,0 +1,157 @@
+'''
+anti-cheat event ingestion, kept off the exam write path
+
+requests only append to a bounded in process buffer, a single flusher task per process bulk inserts
+the buffer into proctor_events (time series, see migration 4) through the ingest client, whose small pool
+can't take connections from autosaves. nothing about an event is computed here, risk aggregation runs
+in the worker (app/worker/proctoring.py)
+
+backpressure is explicit, the client keeps its unsent events and retries after Retry-After
+- buffer full -> 429, the flusher is behind
+- flushes failing for PROCTOR_STALL_SECONDS -> 503, mongo is the problem, accepting more only grows the loss
+
+events are in memory until flushed, a killed process loses at most one buffer (shutdown flushes what is left)
+every insert attempt stamps inserted_at, the risk aggregation reads by that, not by ts (receipt), so events that sat
+in the buffer through a stall or failover are still aggregated when they finally land
+'''
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from typing import List, Optional
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.config import settings
+from app.db.database import database, INGEST
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "proctor_events"
+
+
+class EventBuffer:
+    def __init__(self, max_events: int, flush_batch: int, flush_interval: float, stall_seconds: float,
+                 collection=None, clock=time.monotonic):
+        self.max_events = max_events
+        self.flush_batch = flush_batch
+        self.flush_interval = flush_interval
+        self.stall_seconds = stall_seconds
+        self.clock = clock
+        self._collection = collection
+        self._events = deque()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.failing_since: Optional[float] = None
+
+        # counters, exported on /metrics
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._events)
+
+    @property
+    def collection(self):
+        return self._collection if self._collection is not None else database(INGEST)[COLLECTION]
+
+    def available(self) -> bool:
+        return self.failing_since is None or self.clock() - self.failing_since < self.stall_seconds
+
+    def offer(self, events: List[dict]) -> bool:
+        '''all or nothing, a partially accepted batch would make the client's retry ambiguous'''
+        if len(self._events) + len(events) > self.max_events:
+            self.rejected += len(events)
+            return False
+        self._events.extend(events)
+        self.accepted += len(events)
+        if len(self._events) >= self.flush_batch and self._wake is not None:
+            self._wake.set()
+        return True
+
+    async def flush(self):
+        while self._events:
+            batch = [self._events.popleft() for _ in range(min(len(self._events), self.flush_batch))]
+            # restamped on a retry, the aggregation window is by insertion (app/worker/proctoring.py)
+            inserted_at = datetime.utcnow()
+            for event in batch:
+                event["inserted_at"] = inserted_at
+            try:
+                await self.collection.insert_many(batch, ordered=False)
+            except asyncio.CancelledError:
+                # shutdown mid flush, the final flush in stop() writes it
+                self._events.extendleft(reversed(batch))
+                raise
+            except BulkWriteError as e:
+                # per document failures (bad values), the rest of the batch is in, retrying won't help them
+                failed = len(e.details.get("writeErrors", ()))
+                self.written += len(batch) - failed
+                self.dropped += failed
+                logger.warning(f"dropped {failed} anti-cheat events: {e.details.get('writeErrors', [])[:1]}")
+            except PyMongoError as e:
+                # put the batch back in front, keep what fits, try again next tick
+                room = self.max_events - len(self._events)
+                keep = batch[:max(0, room)]
+                self._events.extendleft(reversed(keep))
+                self.dropped += len(batch) - len(keep)
+                if self.failing_since is None:
+                    self.failing_since = self.clock()
+                logger.warning(f"anti-cheat flush failed, {len(self._events)} events buffered: {e}")
+                return
+            else:
+                self.written += len(batch)
+            self.failing_since = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("anti-cheat flusher error")
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # last flush on shutdown, bounded so a dead mongo can't hold the pod
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except (asyncio.TimeoutError, PyMongoError) as e:
+            logger.warning(f"shutdown with {len(self._events)} anti-cheat events unflushed: {e!r}")
+
+
+event_buffer = EventBuffer(
+    settings.PROCTOR_BUFFER_MAX_EVENTS,
+    settings.PROCTOR_FLUSH_BATCH,
+    settings.PROCTOR_FLUSH_INTERVAL_MS / 1000,
+    settings.PROCTOR_STALL_SECONDS
+)
+
+registry.register("proctor_events_buffered", "gauge", "Anti-cheat events waiting for a flush",
+                  lambda: len(event_buffer))
+registry.register("proctor_events_accepted_total", "counter", "Anti-cheat events accepted",
+                  lambda: event_buffer.accepted)
+registry.register("proctor_events_rejected_total", "counter", "Anti-cheat events rejected with 429",
+                  lambda: event_buffer.rejected)
+registry.register("proctor_events_written_total", "counter", "Anti-cheat events inserted",
+                  lambda: event_buffer.written)
+registry.register("proctor_events_dropped_total", "counter", "Anti-cheat events lost to write errors",
+                  lambda: event_buffer.dropped)
@@ -1,11 +1,22 @@
 from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+import asyncio
 import jwt
 from passlib.context import CryptContext
+from fastapi import HTTPException
 from fastapi.security import HTTPBearer
 
 from app.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"])
+# min = max = default, so any stored hash with a different cost is flagged for rehash on next login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS
+)
 security = HTTPBearer()
 
 def hash_password(password: str) -> str:
@@ -20,3 +31,45 @@ def create_token(user_id: str, email: str) -> str:
     )
     data = {"sub": email, "user_id": user_id, "exp": expires}
     return jwt.encode(data, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+class PasswordHashPool:
+    '''
+    bcrypt is ~100-300ms of cpu per call, running it inside an async handler stalls every request on the worker
+    the bcrypt c extension releases the gil, so a small thread pool gives real parallelism without pickling to processes
+
+    max_pending caps calls queued + running, past that we shed load with 429 instead of letting
+    a login storm build an unbounded queue (and unbounded latency) in front of the pool
+    '''
+
+    def __init__(self, workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    async def run(self, fn, *args):
+        # only touched from the event loop thread, no lock needed
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many login attempts in progress, retry shortly",
+                headers={"Retry-After": "1"}
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_pool = PasswordHashPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING)
+
+async def hash_password_async(password: str) -> str:
+    return await password_pool.run(hash_password, password)
+
+async def verify_and_update_password(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    # returns (valid, new_hash), new_hash is set when the stored hash uses an outdated cost and should be replaced
+    return await password_pool.run(pwd_context.verify_and_update, plain, hashed)
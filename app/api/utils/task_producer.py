@@ -0,0 +1,38 @@
+'''
+enqueue worker tasks by name from the api
+
+the api used to import app.worker.tasks to call .delay(), which built the worker's celery app at import time
+and pulled in every task module with it. here the api only knows task names and routes (app.worker.routing),
+and a bare celery app, no task modules, is created on the first send, so importing the api never imports celery
+and pods that never enqueue (read only) never need the broker config to start
+'''
+from typing import Optional
+
+from app.config import settings
+from app.worker.routing import TASK_ROUTES
+
+_producer = None
+
+
+def producer():
+    global _producer
+    if _producer is None:
+        # imported here, celery is ~100ms of import most requests never need
+        from celery import Celery
+
+        _producer = Celery(
+            "exam_api_producer",
+            broker=settings.CELERY_BROKER_URL,
+            backend=settings.CELERY_RESULT_BACKEND,
+            task_routes=TASK_ROUTES
+        )
+    return _producer
+
+
+def send_task(name: str, args: Optional[list] = None, kwargs: Optional[dict] = None, **options):
+    '''same as task.apply_async, routed to the task's queue, returns the AsyncResult'''
+    return producer().send_task(name, args=args, kwargs=kwargs, **options)
+
+
+def task_result(task_id: str):
+    return producer().AsyncResult(task_id)
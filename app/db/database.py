@@ -1,55 +1,93 @@
-from pymongo import AsyncMongoClient
-from pymongo import ASCENDING, DESCENDING
-from app.config import settings
-
-client = AsyncMongoClient(settings.DATABASE_URL)
-db = client.exam_platform
-
-# create indexes once at startup
-async def init_indexes():
-    # users
-    # index 1, for auth
-    await db.users.create_index("user_id", unique=True)
-    
-    # questions
-    # index 1, read all questions for specific test
-    await db.questions.create_index([("test_id", ASCENDING)])
-    
-    # draft submissions
-    # index 1, for start_exam, check if already started
-    await db.draft_submissions.create_index(
-        [("user_id", ASCENDING), ("test_id", ASCENDING)],
-        name="user_test_lookup"
-    )
-
-    # index 2, for save_draft_answer, update single answer
-    await db.draft_submissions.create_index(
-        [("user_id", ASCENDING), ("test_id", ASCENDING), ("question_id", ASCENDING)],
-        unique=True,
-        name="unique_user_answer"
-    )
-
-    # index 3, for evaluation, read all submitted answers
-    await db.draft_submissions.create_index(
-        [("test_id", ASCENDING), ("final_submit", ASCENDING)],
-        name="eval_query_index"
-    )
-
-    # test results
-    # index 1, for get_user_result, ie single user result
-    await db.test_results.create_index(
-        [("test_id", ASCENDING), ("user_id", ASCENDING)],
-        unique=True,
-        name="user_result_lookup"
-    )
-    
-    # index 2, get_leaderboard, sorted by rank
-    # Query: {"test_id": X} SORT BY rank
-    await db.test_results.create_index(
-        [("test_id", ASCENDING), ("rank", ASCENDING)],
-        name="leaderboard_lookup"
-    )
+from pymongo import AsyncMongoClient, MongoClient
+from app.config import settings, default_mongo_workloads, MongoWorkload
+from app.metrics import mongo_listener
+
+# workloads, each has its own client so a result-day read spike can't take the connections exam writes need
+TRANSACTIONAL = "transactional"
+READ_HEAVY = "read_heavy"
+ANALYTICS = "analytics"
+INGEST = "ingest"
+
+
+def _client_options(name: str, workload: MongoWorkload) -> dict:
+    options = {
+        "maxPoolSize": workload.max_pool_size,
+        "minPoolSize": workload.min_pool_size,
+        "connectTimeoutMS": workload.connect_timeout_ms,
+        "serverSelectionTimeoutMS": workload.server_selection_timeout_ms,
+        "readPreference": workload.read_preference,
+        "w": int(workload.write_concern) if workload.write_concern.isdigit() else workload.write_concern,
+        "appname": f"exam-api-{name}",
+    }
+    if workload.socket_timeout_ms is not None:
+        options["socketTimeoutMS"] = workload.socket_timeout_ms
+    if workload.wait_queue_timeout_ms is not None:
+        options["waitQueueTimeoutMS"] = workload.wait_queue_timeout_ms
+    if workload.max_staleness_seconds is not None and workload.read_preference != "primary":
+        options["maxStalenessSeconds"] = workload.max_staleness_seconds
+    return options
+
+
+def _build_client(name: str, workload: MongoWorkload) -> AsyncMongoClient:
+    # clients connect lazily, an unused workload costs no connections
+    options = _client_options(name, workload)
+    if settings.METRICS_ENABLED:
+        # command timings per collection, served on the api's /metrics
+        options["event_listeners"] = [mongo_listener]
+    return AsyncMongoClient(workload.url or settings.DATABASE_URL, **options)
+
+
+_workloads = {**default_mongo_workloads(), **settings.MONGO_WORKLOADS}
+clients = {name: _build_client(name, workload) for name, workload in _workloads.items()}
+
+client = clients[TRANSACTIONAL]
+db = client[settings.DATABASE_NAME]
+_databases = {name: c[settings.DATABASE_NAME] for name, c in clients.items()}
+
+
+def database(workload: str = TRANSACTIONAL):
+    """Database handle routed through the workload's client"""
+    return _databases[workload]
+
+
+async def get_db():
+    """Default dependency, transactional client (primary, majority writes)"""
+    return db
+
+
+def db_for(workload: str):
+    """Dependency factory for another workload, eg. db=Depends(db_for(READ_HEAVY))"""
+    if workload not in _databases:
+        raise ValueError(f"Unknown mongo workload '{workload}'")
+
+    async def dependency():
+        return _databases[workload]
+    return dependency
+
+
+get_read_db = db_for(READ_HEAVY)
+get_analytics_db = db_for(ANALYTICS)
+
+
+_worker_clients = {}
+
+
+def worker_db(workload: str = TRANSACTIONAL):
+    """
+    Blocking database handle for celery tasks, prefork workers have no event loop.
+    Created on first use so each forked worker process gets its own client (pymongo clients aren't fork safe).
+    """
+    if workload not in _worker_clients:
+        config = _workloads[workload]
+        options = _client_options(f"worker-{workload}", config)
+        _worker_clients[workload] = MongoClient(config.url or settings.DATABASE_URL, **options)
+    return _worker_clients[workload][settings.DATABASE_NAME]
+
+
+async def close_clients():
+    for c in clients.values():
+        await c.close()
 
 # from our latest projects we are using pymongo instead of motor, since pymongo now has native async support, and motor is depreciated
 
-# migration tools can be added here if required
\ No newline at end of file
+# indexes and schema changes are versioned in app.db.migrations, applied by `python -m app.db.migrations apply`
\ No newline at end of file
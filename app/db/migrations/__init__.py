@@ -0,0 +1,2 @@
+from app.db.migrations.manifest import MIGRATIONS, LATEST_VERSION, Migration
+from app.db.migrations.runner import apply_migrations, check_version, current_version
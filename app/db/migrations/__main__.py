@@ -0,0 +1,61 @@
+'''
+migration job, run once per release (k8s Job / pre-deploy hook), not from the api processes
+
+    python -m app.db.migrations apply [--target N] [--wait 600]
+    python -m app.db.migrations status
+    python -m app.db.migrations unused [collection ...]
+'''
+import argparse
+import asyncio
+import logging
+import sys
+
+from app.config import settings
+from app.db.database import database, close_clients, TRANSACTIONAL
+from app.db.migrations.manifest import LATEST_VERSION
+from app.db.migrations.runner import apply_migrations, current_version, pending, unused_indexes
+
+
+async def run(args) -> int:
+    db = database(TRANSACTIONAL)
+    try:
+        if args.command == "apply":
+            version = await apply_migrations(
+                db, target=args.target, lease_seconds=settings.MIGRATION_LEASE_SECONDS, wait_seconds=args.wait
+            )
+            print(f"schema version {version} (latest {LATEST_VERSION})")
+            return 0 if version >= (args.target or LATEST_VERSION) else 1
+
+        if args.command == "status":
+            version = await current_version(db)
+            print(f"schema version {version}, latest {LATEST_VERSION}")
+            for migration in pending(version):
+                print(f"  pending {migration.version}: {migration.description}")
+            return 0
+
+        if args.command == "unused":
+            for entry in await unused_indexes(db, args.collections or None):
+                print(f"{entry['collection']}.{entry['index']} unused since {entry['since']}")
+            return 0
+    finally:
+        await close_clients()
+    return 1
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m app.db.migrations")
+    sub = parser.add_subparsers(dest="command", required=True)
+    apply = sub.add_parser("apply", help="apply pending migrations under the lease")
+    apply.add_argument("--target", type=int, default=None, help="stop at this version")
+    apply.add_argument("--wait", type=float, default=0, help="seconds to wait for another runner's lease")
+    sub.add_parser("status", help="stored version and pending migrations")
+    unused = sub.add_parser("unused", help="indexes with no recorded use on this node")
+    unused.add_argument("collections", nargs="*")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL, format="%(asctime)s %(levelname)s %(message)s")
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
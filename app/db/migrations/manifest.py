@@ -0,0 +1,94 @@
+'''
+versioned index and schema manifest, append only
+
+add a new Migration with the next version for every change, never edit one that has shipped
+(the version doc records what was applied, edits to an applied migration never run)
+'''
+from dataclasses import dataclass
+from typing import List
+
+from pymongo import ASCENDING, DESCENDING
+
+from app.db.migrations.operations import Operation, CreateIndex, CreateCollection
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    operations: List[Operation]
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "initial indexes, previously created by init_indexes on every boot", [
+        # users, keyed by _id (the token's user_id), signup never writes a user_id field
+        # index 1, for signup/login lookup by email
+        CreateIndex("users", [("email", ASCENDING)], name="email_lookup", unique=True),
+
+        # questions
+        # index 1, read all questions for specific test
+        CreateIndex("questions", [("test_id", ASCENDING)], name="test_id_1"),
+
+        # draft submissions
+        # index 1, for start_exam, check if already started
+        CreateIndex("draft_submissions", [("user_id", ASCENDING), ("test_id", ASCENDING)], name="user_test_lookup"),
+        # index 2, for save_draft_answer, update single answer
+        CreateIndex(
+            "draft_submissions",
+            [("user_id", ASCENDING), ("test_id", ASCENDING), ("question_id", ASCENDING)],
+            name="unique_user_answer",
+            unique=True
+        ),
+        # index 3, for evaluation, read all submitted answers
+        CreateIndex("draft_submissions", [("test_id", ASCENDING), ("final_submit", ASCENDING)], name="eval_query_index"),
+
+        # test results
+        # index 1, for get_user_result, ie single user result
+        CreateIndex(
+            "test_results",
+            [("test_id", ASCENDING), ("user_id", ASCENDING)],
+            name="user_result_lookup",
+            unique=True
+        ),
+        # index 2, get_leaderboard, sorted by rank
+        CreateIndex("test_results", [("test_id", ASCENDING), ("rank", ASCENDING)], name="leaderboard_lookup"),
+    ]),
+
+    Migration(2, "tests lookups by test_id and by close time", [
+        # start_exam, evaluation trigger, every read of a test
+        CreateIndex("tests", [("test_id", ASCENDING)], name="test_lookup", background=True),
+        # autoscaler schedule, tests closing within a window that are not evaluated yet
+        CreateIndex("tests", [("ends_at", ASCENDING), ("evaluated", ASCENDING)], name="close_schedule", background=True),
+    ]),
+
+    Migration(3, "draft archive lookup, compaction itself reads drafts through user_test_lookup", [
+        # archives are keyed test_id:user_id, this serves a candidate's history across tests
+        CreateIndex("draft_archives", [("user_id", ASCENDING), ("test_id", ASCENDING)], name="archive_user_lookup"),
+    ]),
+
+    Migration(4, "anti-cheat events as a time series collection, per candidate risk aggregates", [
+        # buckets per (test_id, user_id) and time, raw events expire after 90 days, the aggregates stay
+        CreateCollection(
+            "proctor_events",
+            timeseries={"timeField": "ts", "metaField": "meta", "granularity": "seconds"},
+            expireAfterSeconds=90 * 24 * 3600
+        ),
+        # one candidate's event trail during review
+        CreateIndex("proctor_events", [("meta.test_id", ASCENDING), ("meta.user_id", ASCENDING), ("ts", ASCENDING)],
+                    name="event_lookup"),
+        # most suspicious candidates of a test first
+        CreateIndex("proctor_risk", [("test_id", ASCENDING), ("risk_score", DESCENDING)], name="risk_ranking"),
+    ]),
+
+    Migration(5, "per question item analytics written by the evaluation", [
+        # every question of a test, _id is test_id:question_id
+        CreateIndex("question_stats", [("test_id", ASCENDING), ("question_id", ASCENDING)], name="question_stats_lookup"),
+    ]),
+
+    Migration(6, "anti-cheat events by insertion time, the risk aggregation window", [
+        # secondary index on a time series measurement field, late (buffered) events are found by when they landed
+        CreateIndex("proctor_events", [("inserted_at", ASCENDING)], name="event_inserted"),
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version if MIGRATIONS else 0
@@ -0,0 +1,89 @@
+'''
+operations a migration is made of, every operation is idempotent
+so a migration interrupted halfway (lease lost, pod killed) is simply applied again on the next run
+'''
+import logging
+from typing import Awaitable, Callable, Optional, Sequence, Tuple
+
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+INDEX_NOT_FOUND = 27
+NAMESPACE_EXISTS = 48
+
+
+class Operation:
+    description = ""
+
+    async def apply(self, db) -> None:
+        raise NotImplementedError
+
+
+class CreateIndex(Operation):
+    '''
+    index builds on 4.2+ only lock the collection at the start and end of the build, reads and writes
+    continue in between, background=True is still passed for older servers
+    creating an index that already exists with the same spec is a no-op on the server
+    '''
+    def __init__(self, collection: str, keys: Sequence[Tuple[str, int]], name: str, unique: bool = False,
+                 background: bool = False, **options):
+        self.collection = collection
+        self.keys = list(keys)
+        self.name = name
+        self.unique = unique
+        self.background = background
+        self.options = options
+        self.description = f"create index {collection}.{name}"
+
+    async def apply(self, db) -> None:
+        options = dict(self.options)
+        if self.unique:
+            options["unique"] = True
+        if self.background:
+            options["background"] = True
+        await db[self.collection].create_index(self.keys, name=self.name, **options)
+
+
+class DropIndex(Operation):
+    def __init__(self, collection: str, name: str):
+        self.collection = collection
+        self.name = name
+        self.description = f"drop index {collection}.{name}"
+
+    async def apply(self, db) -> None:
+        try:
+            await db[self.collection].drop_index(self.name)
+        except OperationFailure as e:
+            if e.code != INDEX_NOT_FOUND:
+                raise
+            logger.info(f"index {self.collection}.{self.name} already dropped")
+
+
+class CreateCollection(Operation):
+    '''for collections that need options at creation, eg. time series or capped'''
+    def __init__(self, name: str, **options):
+        self.name = name
+        self.options = options
+        self.description = f"create collection {name}"
+
+    async def apply(self, db) -> None:
+        try:
+            await db.create_collection(self.name, **self.options)
+        except CollectionInvalid:
+            # the driver checks for the collection first and raises this instead of sending the create
+            logger.info(f"collection {self.name} already exists")
+        except OperationFailure as e:
+            if e.code != NAMESPACE_EXISTS:
+                raise
+            logger.info(f"collection {self.name} already exists")
+
+
+class RunPython(Operation):
+    '''schema changes / backfills, the function must be safe to run more than once'''
+    def __init__(self, fn: Callable[..., Awaitable[None]], description: Optional[str] = None):
+        self.fn = fn
+        self.description = description or fn.__name__
+
+    async def apply(self, db) -> None:
+        await self.fn(db)
@@ -0,0 +1,182 @@
+'''
+applies the manifest once per deployment instead of on every process start
+
+state lives in the schema_migrations collection
+    {_id: "version", version: N, history: [...]}   what has been applied
+    {_id: "lock", owner, expires_at}               lease, only one runner applies at a time
+
+the lease is renewed while migrations run (index builds on big collections take minutes),
+a runner that dies stops renewing and the next one takes over after LEASE_SECONDS
+'''
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.db.migrations.manifest import MIGRATIONS, LATEST_VERSION, Migration
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "schema_migrations"
+VERSION_ID = "version"
+LOCK_ID = "lock"
+
+
+class LeaseLost(Exception):
+    pass
+
+
+class MigrationLease:
+    '''distributed lock on the lock document, expires unless renewed'''
+    def __init__(self, collection, lease_seconds: int):
+        self.collection = collection
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lost = False
+        self._renewer: Optional[asyncio.Task] = None
+
+    async def acquire(self) -> bool:
+        now = datetime.utcnow()
+        try:
+            # matches only a free/expired lock or our own, otherwise the upsert hits the _id and fails
+            await self.collection.find_one_and_update(
+                {"_id": LOCK_ID, "$or": [{"expires_at": {"$lt": now}}, {"owner": self.owner}]},
+                {"$set": {
+                    "owner": self.owner,
+                    "acquired_at": now,
+                    "expires_at": now + timedelta(seconds=self.lease_seconds)
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            return False
+        self._renewer = asyncio.create_task(self._renew())
+        return True
+
+    async def _renew(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                result = await self.collection.update_one(
+                    {"_id": LOCK_ID, "owner": self.owner},
+                    {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+                )
+            except Exception as e:
+                # transient, the lease is still ours until it expires
+                logger.warning(f"could not renew migration lease: {e}")
+                continue
+            if result.matched_count == 0:
+                self.lost = True
+                logger.error("migration lease taken over by another runner")
+                return
+
+    def check(self):
+        if self.lost:
+            raise LeaseLost("migration lease lost, stopping before the next operation")
+
+    async def release(self):
+        if self._renewer is not None:
+            self._renewer.cancel()
+        await self.collection.delete_one({"_id": LOCK_ID, "owner": self.owner})
+
+
+async def current_version(db) -> int:
+    doc = await db[COLLECTION].find_one({"_id": VERSION_ID}, projection={"version": 1})
+    return doc["version"] if doc else 0
+
+
+def pending(version: int, target: Optional[int] = None) -> List[Migration]:
+    target = LATEST_VERSION if target is None else target
+    return [m for m in MIGRATIONS if version < m.version <= target]
+
+
+async def apply_migrations(db, target: Optional[int] = None, lease_seconds: int = 300,
+                           wait_seconds: float = 0) -> int:
+    '''
+    apply everything after the stored version up to target (default latest), returns the version reached
+    waits up to wait_seconds for another runner's lease, then gives up with the version unchanged
+    '''
+    collection = db[COLLECTION]
+    lease = MigrationLease(collection, lease_seconds)
+    deadline = time.monotonic() + wait_seconds
+    while not await lease.acquire():
+        if time.monotonic() >= deadline:
+            logger.warning("another runner holds the migration lease, not applying")
+            return await current_version(db)
+        await asyncio.sleep(5)
+
+    try:
+        # read under the lease, another runner may have finished while we waited
+        version = await current_version(db)
+        for migration in pending(version, target):
+            logger.info(f"applying migration {migration.version}: {migration.description}")
+            started = time.monotonic()
+            for operation in migration.operations:
+                lease.check()
+                logger.info(f"  {operation.description}")
+                await operation.apply(db)
+
+            lease.check()
+            await collection.update_one(
+                {"_id": VERSION_ID},
+                {
+                    "$set": {"version": migration.version, "updated_at": datetime.utcnow()},
+                    "$push": {"history": {
+                        "version": migration.version,
+                        "description": migration.description,
+                        "applied_at": datetime.utcnow(),
+                        "duration_seconds": round(time.monotonic() - started, 3),
+                        "applied_by": lease.owner
+                    }}
+                },
+                upsert=True
+            )
+            version = migration.version
+        return version
+    finally:
+        await lease.release()
+
+
+async def check_version(db, mode: str = "warn") -> int:
+    '''
+    startup check, a single find_one, never applies anything
+    warn logs when the database is behind the code, strict refuses to start, off skips the read
+    '''
+    if mode == "off":
+        return LATEST_VERSION
+    version = await current_version(db)
+    if version < LATEST_VERSION:
+        message = (f"database schema version {version} is behind {LATEST_VERSION}, "
+                   f"run `python -m app.db.migrations apply`")
+        if mode == "strict":
+            raise RuntimeError(message)
+        logger.warning(message)
+    return version
+
+
+async def unused_indexes(db, collections: Optional[List[str]] = None) -> List[dict]:
+    '''
+    indexes with no recorded use since the server (or the index) started, candidates for a DropIndex migration
+    $indexStats is per node, run it against the nodes that serve the reads before trusting it
+    '''
+    names = collections or [
+        name for name in await db.list_collection_names()
+        if name != COLLECTION and not name.startswith("system.")
+    ]
+    unused = []
+    for name in names:
+        cursor = await db[name].aggregate([{"$indexStats": {}}])
+        async for stat in cursor:
+            if stat["name"] == "_id_":
+                continue
+            if stat["accesses"]["ops"] == 0:
+                unused.append({"collection": name, "index": stat["name"], "since": stat["accesses"]["since"]})
+    return unused
@@ -0,0 +1,224 @@
+'''
+in process metrics for the api, rendered in prometheus text format on /metrics
+
+- request latency / status class / in flight, recorded by MetricsMiddleware
+- mongo command latency and documents per collection + command, recorded by MongoCommandMetrics (a pymongo CommandListener)
+- event loop lag, sampled by LoopLagSampler
+- values other modules own (buffer depths, counters), registered as callbacks with Registry.register
+
+histograms keep a pre-allocated list of bucket counts, recording is a bisect and two additions,
+a series is created the first time a route / collection is seen and reused for every request after
+everything runs on the event loop thread (the async mongo client calls its listeners there too), so no locks
+per process, with several uvicorn workers each one is its own scrape target (or sum them in the query)
+'''
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Optional, Tuple
+
+from pymongo import monitoring
+
+# seconds, request and mongo latencies, sub ms for cache hits up to the 10s socket timeout
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# seconds, event loop lag, anything past 100ms is visible to every request on the worker
+LAG_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self, name: str, labels: str, lines: list):
+        cumulative = 0
+        sep = "," if labels else ""
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.total}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+
+
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+
+
+class RouteSeries:
+    __slots__ = ("latency", "statuses")
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.statuses = [0] * len(STATUS_CLASSES)
+
+
+class CommandSeries:
+    __slots__ = ("latency", "documents", "failures")
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.documents = 0
+        self.failures = 0
+
+
+class Registry:
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteSeries] = {}
+        self.commands: Dict[Tuple[str, str], CommandSeries] = {}
+        self.in_flight = 0
+        self.loop_lag = Histogram(LAG_BUCKETS)
+        self.loop_lag_max = 0.0
+        self.callbacks: Dict[str, Tuple[str, str, Callable[[], float]]] = {}
+
+    def register(self, name: str, kind: str, help: str, fn: Callable[[], float]):
+        '''gauge / counter read at scrape time, the owner keeps the value, nothing is recorded here'''
+        self.callbacks[name] = (kind, help, fn)
+
+    def route(self, method: str, path: str) -> RouteSeries:
+        key = (method, path)
+        series = self.routes.get(key)
+        if series is None:
+            series = self.routes[key] = RouteSeries()
+        return series
+
+    def command(self, collection: str, command: str) -> CommandSeries:
+        key = (collection, command)
+        series = self.commands.get(key)
+        if series is None:
+            series = self.commands[key] = CommandSeries()
+        return series
+
+    def render(self) -> str:
+        lines = [
+            "# HELP api_requests_in_flight Requests being handled by this process",
+            "# TYPE api_requests_in_flight gauge",
+            f"api_requests_in_flight {self.in_flight}",
+            "# HELP api_request_duration_seconds Request latency by route template",
+            "# TYPE api_request_duration_seconds histogram",
+        ]
+        for (method, path), series in self.routes.items():
+            series.latency.render("api_request_duration_seconds", f'method="{method}",route="{path}"', lines)
+
+        lines += ["# HELP api_requests_total Responses by route and status class", "# TYPE api_requests_total counter"]
+        for (method, path), series in self.routes.items():
+            for status, count in zip(STATUS_CLASSES, series.statuses):
+                if count:
+                    lines.append(f'api_requests_total{{method="{method}",route="{path}",status="{status}"}} {count}')
+
+        lines += ["# HELP mongo_command_duration_seconds Mongo command latency", "# TYPE mongo_command_duration_seconds histogram"]
+        for (collection, command), series in self.commands.items():
+            series.latency.render("mongo_command_duration_seconds", f'collection="{collection}",command="{command}"', lines)
+
+        lines += ["# HELP mongo_command_documents_total Documents returned or written", "# TYPE mongo_command_documents_total counter"]
+        for (collection, command), series in self.commands.items():
+            lines.append(f'mongo_command_documents_total{{collection="{collection}",command="{command}"}} {series.documents}')
+
+        lines += ["# HELP mongo_command_failures_total Failed mongo commands", "# TYPE mongo_command_failures_total counter"]
+        for (collection, command), series in self.commands.items():
+            if series.failures:
+                lines.append(f'mongo_command_failures_total{{collection="{collection}",command="{command}"}} {series.failures}')
+
+        lines += ["# HELP event_loop_lag_seconds How late the sampler woke up", "# TYPE event_loop_lag_seconds histogram"]
+        self.loop_lag.render("event_loop_lag_seconds", "", lines)
+        lines += [
+            "# HELP event_loop_lag_max_seconds Worst lag since start",
+            "# TYPE event_loop_lag_max_seconds gauge",
+            f"event_loop_lag_max_seconds {self.loop_lag_max}",
+        ]
+        for name, (kind, help, fn) in self.callbacks.items():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {fn()}"]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    '''
+    per collection + command latency and documents
+    the collection is only in the started event, kept by request id until the reply arrives
+    '''
+    # commands whose first argument is not a collection, or that are driver noise
+    IGNORED = frozenset(("hello", "isMaster", "ismaster", "ping", "endSessions", "saslStart", "saslContinue",
+                         "buildInfo", "getLastError", "killCursors"))
+
+    def __init__(self, registry: Registry):
+        self.registry = registry
+        self._pending: Dict[Tuple[int, int], str] = {}
+
+    def started(self, event):
+        if event.command_name in self.IGNORED:
+            return
+        # getMore's first argument is the cursor id, the collection is a separate field
+        if event.command_name == "getMore":
+            collection = event.command.get("collection", "")
+        else:
+            collection = event.command.get(event.command_name)
+            if not isinstance(collection, str):
+                collection = ""
+        self._pending[(event.request_id, event.operation_id)] = collection
+
+    def succeeded(self, event):
+        collection = self._pending.pop((event.request_id, event.operation_id), None)
+        if collection is None:
+            return
+        series = self.registry.command(collection, event.command_name)
+        series.latency.observe(event.duration_micros / 1e6)
+        series.documents += self._documents(event.reply)
+
+    def failed(self, event):
+        collection = self._pending.pop((event.request_id, event.operation_id), None)
+        if collection is None:
+            return
+        series = self.registry.command(collection, event.command_name)
+        series.latency.observe(event.duration_micros / 1e6)
+        series.failures += 1
+
+    @staticmethod
+    def _documents(reply) -> int:
+        cursor = reply.get("cursor")
+        if cursor is not None:
+            batch = cursor.get("firstBatch")
+            if batch is None:
+                batch = cursor.get("nextBatch", ())
+            return len(batch)
+        n = reply.get("n")
+        return n if isinstance(n, int) else 0
+
+
+mongo_listener = MongoCommandMetrics(registry)
+
+
+class LoopLagSampler:
+    '''sleeps interval seconds in a loop, lag is how much later than asked it woke up'''
+    def __init__(self, registry: Registry, interval: float = 0.5):
+        self.registry = registry
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            self.registry.loop_lag.observe(lag)
+            if lag > self.registry.loop_lag_max:
+                self.registry.loop_lag_max = lag
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
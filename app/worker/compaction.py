@@ -0,0 +1,117 @@
+'''
+post evaluation compaction of draft_submissions
+
+drafts are one document per candidate per question and are only read once, by the evaluation,
+after that they just keep the collection and its indexes in the working set
+once a test is evaluated, each candidate's drafts are packed into one draft_archives document
+(answers bson encoded + zlib, ~10x smaller than the rows + their index entries) and the rows are
+deleted in throttled batches, so draft_submissions only holds live exams
+
+safe to rerun, an archive is only ever inserted (never replaced) so a run interrupted between
+archive and delete doesn't overwrite a full archive with the rows left behind
+'''
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterator, List
+
+import bson
+from pymongo import ASCENDING, UpdateOne, WriteConcern
+
+# per question fields kept in the archive, user/test ids live on the archive itself
+ARCHIVED_FIELDS = (
+    "question_id", "selected_option", "marked_for_review", "visited", "time_spent_seconds",
+    "marks_correct_snapshot", "marks_wrong_snapshot", "subject_snapshot",
+)
+
+
+def archive_id(test_id: str, user_id: str) -> str:
+    return f"{test_id}:{user_id}"
+
+
+def pack_answers(rows: List[dict]) -> bytes:
+    answers = [{k: row[k] for k in ARCHIVED_FIELDS if k in row} for row in rows]
+    return zlib.compress(bson.encode({"answers": answers}), 6)
+
+
+def unpack_answers(blob: bytes) -> List[dict]:
+    """per question answers of an archive, same fields as the draft rows"""
+    return bson.decode(zlib.decompress(blob))["answers"]
+
+
+def _archive(test_id: str, user_id: str, rows: List[dict]) -> UpdateOne:
+    first = rows[0]
+    doc = {
+        "_id": archive_id(test_id, user_id),
+        "test_id": test_id,
+        "user_id": user_id,
+        "question_count": len(rows),
+        "attempted": sum(1 for r in rows if r.get("selected_option") is not None),
+        "final_submit": all(r.get("final_submit") for r in rows),
+        "started_at": first.get("started_at"),
+        "duration_seconds": first.get("duration_seconds"),
+        "answers": pack_answers(rows),
+        "archived_at": datetime.utcnow(),
+    }
+    return UpdateOne({"_id": doc["_id"]}, {"$setOnInsert": doc}, upsert=True)
+
+
+def _candidates(db, test_id: str) -> Iterator[str]:
+    '''
+    every candidate of the test that has drafts, off indexes the exam already maintains
+    those with a result (user_result_lookup, in user_id order), then those who never submitted (eval_query_index)
+    '''
+    results = db.test_results.find(
+        {"test_id": test_id}, projection={"_id": 0, "user_id": 1}, sort=[("user_id", ASCENDING)], batch_size=5000
+    )
+    for row in results:
+        yield row["user_id"]
+    # rows are in index order, not grouped by candidate, and a batch may be deleted while this cursor is open
+    seen = set()
+    for row in db.draft_submissions.find({"test_id": test_id, "final_submit": False},
+                                         projection={"_id": 0, "user_id": 1}, batch_size=5000):
+        if row["user_id"] not in seen:
+            seen.add(row["user_id"])
+            yield row["user_id"]
+
+
+def compact_drafts(db, test_id: str, batch_users: int = 200, pause_seconds: float = 0.2) -> Dict[str, int]:
+    '''
+    archive and delete every draft of an evaluated test, batch_users candidates at a time
+    each batch's rows are read with user_id $in + test_id, the user_test_lookup prefix, no index just for this job
+    '''
+    stats = {"candidates": 0, "deleted": 0}
+
+    def compact(user_ids: List[str]):
+        pending: Dict[str, List[dict]] = defaultdict(list)
+        rows = db.draft_submissions.find(
+            {"user_id": {"$in": user_ids}, "test_id": test_id},
+            projection={"_id": 0, "user_id": 1, "final_submit": 1, "started_at": 1, "duration_seconds": 1,
+                        **{k: 1 for k in ARCHIVED_FIELDS}},
+            batch_size=5000
+        )
+        for row in rows:
+            pending[row["user_id"]].append(row)
+        if not pending:
+            # a rerun, these candidates were compacted already
+            return
+        # majority so the rows are never deleted before their archive is durable
+        db.draft_archives.with_options(write_concern=WriteConcern(w="majority")).bulk_write(
+            [_archive(test_id, uid, user_rows) for uid, user_rows in pending.items()], ordered=False
+        )
+        result = db.draft_submissions.delete_many({"user_id": {"$in": list(pending)}, "test_id": test_id})
+        stats["candidates"] += len(pending)
+        stats["deleted"] += result.deleted_count
+        # throttle, keeps replication lag and the delete's write load bounded while exams may be running
+        time.sleep(pause_seconds)
+
+    batch = []
+    for user_id in _candidates(db, test_id):
+        batch.append(user_id)
+        if len(batch) >= batch_users:
+            compact(batch)
+            batch = []
+    if batch:
+        compact(batch)
+    return stats
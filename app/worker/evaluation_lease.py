@@ -0,0 +1,153 @@
+'''
+exactly one evaluation per test, a lease on the test document
+
+tests.evaluation_lease {owner, acquired_at, expires_at}, owner is the celery task id of the evaluation
+
+- whoever enqueues (beat scheduler or the admin endpoint) claims the lease with a compare and set
+  (find_one_and_update matching only a free or expired lease) and only then sends the task with that id,
+  so two admins, or an admin and the scheduler, can never both enqueue
+- the task takes the lease over by matching its own id, renews it while running and drops it together
+  with setting evaluated, a redelivered message (worker lost, acks_late) has the same id and gets it back
+- a worker that dies stops renewing, the lease expires and the scheduler claims the test again,
+  a stale duplicate message that starts later finds someone else's live lease and skips
+- every enqueue claim counts in tests.evaluation_attempts, past the limit the test is no longer claimable and is
+  flagged evaluation_failed (a deterministic failure, eg. bad draft rows, would otherwise rerun the full scan
+  every lease period forever), an admin trigger resets it after the data is fixed
+'''
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+LEASE_FIELD = "evaluation_lease"
+ATTEMPTS_FIELD = "evaluation_attempts"
+FAILED_FIELD = "evaluation_failed"
+
+
+class LeaseLost(Exception):
+    pass
+
+
+def new_owner() -> str:
+    # doubles as the celery task id
+    return str(uuid.uuid4())
+
+
+def _lease_free(now: datetime) -> list:
+    return [{LEASE_FIELD: None}, {f"{LEASE_FIELD}.expires_at": {"$lt": now}}]
+
+
+def claimable(now: datetime, owner: Optional[str] = None, max_attempts: Optional[int] = None) -> dict:
+    '''
+    not evaluated or failed and the lease is free, expired or already ours, added to a filter on test_id
+    max_attempts for enqueuers, the task taking over its own claim is never blocked by the count
+    '''
+    free = _lease_free(now)
+    if owner is not None:
+        free.append({f"{LEASE_FIELD}.owner": owner})
+    query = {"evaluated": {"$ne": True}, FAILED_FIELD: {"$ne": True}, "$or": free}
+    if max_attempts is not None:
+        query["$and"] = [{"$or": [{ATTEMPTS_FIELD: None}, {ATTEMPTS_FIELD: {"$lt": max_attempts}}]}]
+    return query
+
+
+def exhausted(now: datetime, max_attempts: int) -> dict:
+    '''out of attempts and nothing running (lease free or expired), not flagged yet'''
+    return {
+        "evaluated": {"$ne": True},
+        FAILED_FIELD: {"$ne": True},
+        ATTEMPTS_FIELD: {"$gte": max_attempts},
+        "$or": _lease_free(now)
+    }
+
+
+def lease_fields(owner: str, lease_seconds: int, now: datetime) -> dict:
+    return {
+        LEASE_FIELD: {
+            "owner": owner,
+            "acquired_at": now,
+            "expires_at": now + timedelta(seconds=lease_seconds)
+        },
+        "evaluation_task_id": owner
+    }
+
+
+def claim_update(owner: str, lease_seconds: int, now: datetime) -> dict:
+    # an enqueue, counts as an attempt
+    return {"$set": lease_fields(owner, lease_seconds, now), "$inc": {ATTEMPTS_FIELD: 1}}
+
+
+def claim(collection, test_id: str, owner: str, lease_seconds: int, max_attempts: Optional[int] = None) -> bool:
+    '''enqueuers pass max_attempts (counted), the task taking over its own claim does not (not counted)'''
+    now = datetime.utcnow()
+    if max_attempts is None:
+        update = {"$set": lease_fields(owner, lease_seconds, now)}
+    else:
+        update = claim_update(owner, lease_seconds, now)
+    return collection.find_one_and_update(
+        {"test_id": test_id, **claimable(now, owner, max_attempts)},
+        update,
+        projection={"_id": 1}
+    ) is not None
+
+
+def release(collection, test_id: str, owner: str, **fields):
+    '''drops the lease if still ours, fields are set in the same write (evaluated with the results)'''
+    update = {"$unset": {LEASE_FIELD: ""}}
+    if fields:
+        update["$set"] = fields
+    return collection.update_one({"test_id": test_id, f"{LEASE_FIELD}.owner": owner}, update)
+
+
+class EvaluationLease:
+    '''held by the running evaluation (sync, worker side), renewed from a thread until released'''
+    def __init__(self, collection, test_id: str, owner: str, lease_seconds: int):
+        self.collection = collection
+        self.test_id = test_id
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop = threading.Event()
+        self._renewer: Optional[threading.Thread] = None
+
+    def acquire(self) -> bool:
+        if not claim(self.collection, self.test_id, self.owner, self.lease_seconds):
+            return False
+        self._renewer = threading.Thread(target=self._renew, name=f"lease-{self.test_id}", daemon=True)
+        self._renewer.start()
+        return True
+
+    def _renew(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                result = self.extend()
+            except Exception as e:
+                # transient, the lease is still ours until it expires
+                logger.warning(f"could not renew evaluation lease of {self.test_id}: {e}")
+                continue
+            if result.matched_count == 0:
+                self.lost = True
+                logger.error(f"evaluation lease of {self.test_id} taken over, stopping")
+                return
+
+    def extend(self, extra_seconds: int = 0):
+        # also used before a retry so the lease covers the countdown
+        return self.collection.update_one(
+            {"test_id": self.test_id, f"{LEASE_FIELD}.owner": self.owner},
+            {"$set": {f"{LEASE_FIELD}.expires_at":
+                      datetime.utcnow() + timedelta(seconds=self.lease_seconds + extra_seconds)}}
+        )
+
+    def check(self):
+        if self.lost:
+            raise LeaseLost(f"evaluation lease of {self.test_id} lost, not writing results")
+
+    def stop(self):
+        self._stop.set()
+
+    def release(self, **fields) -> bool:
+        self.stop()
+        return release(self.collection, self.test_id, self.owner, **fields).matched_count > 0
@@ -0,0 +1,113 @@
+'''
+per question item analytics, tallied from the rows the evaluation already streams, no extra scan
+
+during scoring every draft row is passed to observe(): attempts, correct / wrong, option distribution,
+time spent and review marks per question, plus one bit per correctly answered question in the candidate's mask
+(a python int, ~1 bit per question per candidate instead of a row)
+
+the discrimination index needs the score cohorts, so finalize() runs after ranking:
+D = correct rate in the top 27% - correct rate in the bottom 27% (Kelley's groups)
+D >= 0.4 discriminates well, < 0.2 weakly, negative usually means a wrong answer key
+
+documents go to question_stats, _id test_id:question_id, replaced on a rerun
+'''
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import ReplaceOne
+
+COHORT_FRACTION = 0.27
+
+
+class _Tally:
+    __slots__ = ("rows", "attempted", "correct", "options", "visited", "time_spent", "marked")
+
+    def __init__(self):
+        self.rows = 0
+        self.attempted = 0
+        self.correct = 0
+        self.options = defaultdict(int)
+        self.visited = 0
+        self.time_spent = 0
+        self.marked = 0
+
+
+class ItemAnalytics:
+    def __init__(self, test_id: str, questions: List[dict]):
+        self.test_id = test_id
+        self.subjects = {q["question_id"]: q.get("subject") for q in questions}
+        self.bits = {q["question_id"]: i for i, q in enumerate(questions)}
+        self.tallies: Dict[str, _Tally] = defaultdict(_Tally)
+        self.masks: Dict[str, int] = defaultdict(int)
+
+    def observe(self, row: dict, correct: bool):
+        tally = self.tallies[row["question_id"]]
+        tally.rows += 1
+        selected = row.get("selected_option")
+        if selected is not None:
+            tally.attempted += 1
+            tally.options[str(selected)] += 1
+        if correct:
+            tally.correct += 1
+            bit = self.bits.get(row["question_id"])
+            if bit is not None:
+                self.masks[row["user_id"]] |= 1 << bit
+        if row.get("visited"):
+            tally.visited += 1
+            tally.time_spent += row.get("time_spent_seconds") or 0
+        if row.get("marked_for_review"):
+            tally.marked += 1
+
+    def _cohort_correct(self, user_ids: List[str]) -> List[int]:
+        # correct answers per question bit across a cohort
+        counts = [0] * len(self.bits)
+        for user_id in user_ids:
+            mask = self.masks.get(user_id, 0)
+            while mask:
+                low = mask & -mask
+                counts[low.bit_length() - 1] += 1
+                mask ^= low
+        return counts
+
+    def finalize(self, ranked_user_ids: List[str], computed_at: Optional[datetime] = None) -> List[dict]:
+        '''ranked_user_ids best first, as ranked by the evaluation'''
+        computed_at = computed_at or datetime.utcnow()
+        cohort = int(len(ranked_user_ids) * COHORT_FRACTION)
+        top = self._cohort_correct(ranked_user_ids[:cohort]) if cohort else None
+        bottom = self._cohort_correct(ranked_user_ids[-cohort:]) if cohort else None
+
+        docs = []
+        for question_id, bit in self.bits.items():
+            tally = self.tallies.get(question_id) or _Tally()
+            rows = tally.rows
+            doc = {
+                "_id": f"{self.test_id}:{question_id}",
+                "test_id": self.test_id,
+                "question_id": question_id,
+                "subject": self.subjects.get(question_id),
+                "candidates": rows,
+                "attempted": tally.attempted,
+                "correct": tally.correct,
+                "wrong": tally.attempted - tally.correct,
+                "skipped": rows - tally.attempted,
+                "attempt_rate": round(tally.attempted / rows, 4) if rows else None,
+                # classical difficulty (p value), share of all candidates who got it right
+                "difficulty": round(tally.correct / rows, 4) if rows else None,
+                "accuracy": round(tally.correct / tally.attempted, 4) if tally.attempted else None,
+                "option_distribution": dict(tally.options),
+                "avg_time_spent_seconds": round(tally.time_spent / tally.visited, 1) if tally.visited else None,
+                "marked_for_review": tally.marked,
+                "cohort_size": cohort,
+                "top_correct_rate": round(top[bit] / cohort, 4) if cohort else None,
+                "bottom_correct_rate": round(bottom[bit] / cohort, 4) if cohort else None,
+                "discrimination_index": round((top[bit] - bottom[bit]) / cohort, 4) if cohort else None,
+                "computed_at": computed_at,
+            }
+            docs.append(doc)
+        return docs
+
+
+def write_question_stats(db, docs: List[dict]):
+    if docs:
+        db.question_stats.bulk_write([ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in docs], ordered=False)
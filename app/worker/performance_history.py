@@ -0,0 +1,103 @@
+'''
+per candidate performance across mocks, one user_performance document per user, _id user_id
+
+maintained by the evaluation, one upsert per candidate, batched, with atomic operators only so evaluations of
+two tests a candidate sat can finish concurrently without losing either
+- mocks, the last HISTORY_LIMIT results ($push $each $slice), what the progress screen charts
+- lifetime sums and counts per test and per subject ($inc), bests ($max / $min)
+  subjects are free text (eg. "Gen. Science"), a dot or leading $ in an update path would nest fields or fail the
+  write, so they are keyed by _subject_key and carry their name, subjects.<key> {subject, tests, score, percentile},
+  and a mock lists its subjects as [{subject, score, percentile}]
+- counted_tests, the ids of every test already in the sums, capped far above any real mock count (COUNTED_LIMIT)
+the filter skips users whose counted_tests already hold the test, so a reclaimed / rerun evaluation can't count it
+twice, even once the test has dropped out of the mocks window (the upsert of an existing user then hits _id, E11000,
+and is skipped). documents from before counted_tests existed are still guarded by mocks.test_id
+
+averages, the rolling window and the subject ordering are derived from that on read, by the api
+(app/api/services/performance_progress.py), the progress endpoint is one find_one on _id
+'''
+import hashlib
+from datetime import datetime
+from typing import List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+HISTORY_LIMIT = 50
+COUNTED_LIMIT = 1000 # test ids kept for the duplicate guard, ~40KB per document at the cap
+DUPLICATE_KEY = 11000
+
+
+def _subject_key(subject: str) -> str:
+    # a safe field name, the same subject always maps to the same key
+    return hashlib.sha1(subject.encode()).hexdigest()[:16]
+
+
+def _update(result: dict, test_name: Optional[str], candidates: int, now: datetime) -> UpdateOne:
+    user_id, test_id = result["user_id"], result["test_id"]
+    entry = {
+        "test_id": test_id,
+        "test_name": test_name,
+        "evaluated_at": result["evaluated_at"],
+        "total_score": result["total_score"],
+        "rank": result["rank"],
+        "candidates": candidates,
+        "percentile": result["percentile"],
+        "attempted": result["attempted"],
+        "correct": result["correct"],
+        "subjects": [
+            {"subject": subject, "score": score, "percentile": result["subject_percentiles"].get(subject, 0)}
+            for subject, score in result["subject_scores"].items()
+        ],
+    }
+    inc = {"tests_taken": 1, "totals.score": result["total_score"], "totals.percentile": result["percentile"]}
+    names = {}
+    for subject in entry["subjects"]:
+        key = _subject_key(subject["subject"])
+        names[f"subjects.{key}.subject"] = subject["subject"]
+        inc[f"subjects.{key}.tests"] = 1
+        inc[f"subjects.{key}.score"] = subject["score"]
+        inc[f"subjects.{key}.percentile"] = subject["percentile"]
+
+    return UpdateOne(
+        {"_id": user_id, "counted_tests": {"$ne": test_id}, "mocks.test_id": {"$ne": test_id}},
+        {
+            "$push": {
+                "mocks": {"$each": [entry], "$slice": -HISTORY_LIMIT},
+                "counted_tests": {"$each": [test_id], "$slice": -COUNTED_LIMIT},
+            },
+            "$inc": inc,
+            "$max": {"best.score": result["total_score"], "best.percentile": result["percentile"]},
+            "$min": {"best.rank": result["rank"]},
+            "$set": {"user_id": user_id, "last_test_id": test_id, "updated_at": now, **names},
+        },
+        upsert=True
+    )
+
+
+def _write(collection, ops: List[UpdateOne]):
+    '''returns (documents written, ops that hit E11000)'''
+    try:
+        result = collection.bulk_write(ops, ordered=False)
+        return result.upserted_count + result.modified_count, []
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != DUPLICATE_KEY for err in errors):
+            raise
+        written = e.details.get("nUpserted", 0) + e.details.get("nModified", 0)
+        return written, [ops[err["index"]] for err in errors]
+
+
+def record_results(db, results: List[dict], test_name: Optional[str] = None, candidates: Optional[int] = None) -> int:
+    '''adds one evaluated test's results (a batch of test_results docs) to the histories, returns how many were new'''
+    if not results:
+        return 0
+    now = datetime.utcnow()
+    candidates = candidates if candidates is not None else len(results)
+    written, duplicates = _write(db.user_performance, [_update(r, test_name, candidates, now) for r in results])
+    if duplicates:
+        # E11000 is either the guard (test already recorded) or a first upsert racing another evaluation's
+        # for a new user, once the document exists the retry matches it, a second E11000 is the guard
+        retried, _ = _write(db.user_performance, duplicates)
+        written += retried
+    return written
@@ -0,0 +1,114 @@
+'''
+incremental anti-cheat risk aggregates, proctor_events -> proctor_risk
+
+every run folds the events inserted in (checkpoint, now - settle] into one proctor_risk document per candidate
+(_id test_id:user_id): counts per kind, distinct ips, last event, and a weighted risk_score.
+the window is on inserted_at (stamped by the api's flusher on each insert attempt), not ts (receipt), an event
+buffered through a flush stall lands after the checkpoint passed its ts and would be skipped for good.
+the settle time covers inserts in flight and clock skew between api pods and the worker
+
+a run stores its window in the checkpoint (pending) before writing anything, and a run that finds a pending window
+redoes exactly that one instead of taking a new until. each candidate document records aggregated_until and the
+update only adds when that is older than the window's until, so a run that dies after writing some candidates but
+before committing the checkpoint is finished by the next one without counting those candidates twice
+runs must not overlap (beat interval > run time, the beat entry expires queued runs)
+'''
+from datetime import datetime, timedelta
+from typing import Dict
+
+from pymongo import UpdateOne
+
+CHECKPOINT_COLLECTION = "task_checkpoints"
+CHECKPOINT_ID = "proctor_risk"
+
+# points per event, focus_gain is counted but only its loss is suspicious
+RISK_WEIGHTS = {
+    "tab_switch": 1.0,
+    "focus_loss": 0.5,
+    "focus_gain": 0.0,
+    "fullscreen_exit": 1.0,
+    "copy": 2.0,
+    "paste": 3.0,
+    "devtools_open": 5.0,
+    "network_change": 1.0,
+}
+# points per ip beyond the first
+DISTINCT_IP_WEIGHT = 5.0
+EPOCH = datetime(1970, 1, 1)
+WRITE_BATCH = 1000
+
+
+def _risk_update(group: dict, until: datetime) -> UpdateOne:
+    test_id, user_id = group["_id"]["test_id"], group["_id"]["user_id"]
+    # every field of the $set below sees the document as it was before it, so this is the old aggregated_until
+    fresh = {"$lt": [{"$ifNull": ["$aggregated_until", EPOCH]}, until]}
+
+    def add(field: str, n):
+        current = {"$ifNull": [f"${field}", 0]}
+        return {"$cond": [fresh, {"$add": [current, n]}, current]}
+
+    ips = [ip for ip in group["ips"] if ip]
+    fold = {
+        "test_id": test_id,
+        "user_id": user_id,
+        "events": add("events", group["events"]),
+        **{f"counts.{kind}": add(f"counts.{kind}", group[kind]) for kind in RISK_WEIGHTS if group[kind]},
+        "ips": {"$cond": [fresh, {"$setUnion": [{"$ifNull": ["$ips", []]}, ips]}, {"$ifNull": ["$ips", []]}]},
+        "last_event_at": {"$max": ["$last_event_at", group["last_event_at"]]},
+        "aggregated_until": {"$max": [{"$ifNull": ["$aggregated_until", EPOCH]}, until]},
+        "updated_at": "$$NOW",
+    }
+    score = {"risk_score": {"$add": [
+        *({"$multiply": [{"$ifNull": [f"$counts.{kind}", 0]}, weight]} for kind, weight in RISK_WEIGHTS.items() if weight),
+        {"$multiply": [{"$max": [0, {"$subtract": [{"$size": "$ips"}, 1]}]}, DISTINCT_IP_WEIGHT]},
+    ]}}
+    return UpdateOne({"_id": f"{test_id}:{user_id}"}, [{"$set": fold}, {"$set": score}], upsert=True)
+
+
+def aggregate_risk(db, until: datetime, lookback_seconds: int = 86400) -> Dict[str, int]:
+    '''until is where a new window ends, an unfinished (pending) window is redone with its own bounds instead'''
+    checkpoints = db[CHECKPOINT_COLLECTION]
+    checkpoint = checkpoints.find_one({"_id": CHECKPOINT_ID}) or {}
+    stats = {"candidates": 0, "events": 0}
+    pending = checkpoint.get("pending")
+    if pending:
+        since, until = pending["since"], pending["until"]
+    else:
+        since = checkpoint["until"] if "until" in checkpoint else until - timedelta(seconds=lookback_seconds)
+        if until <= since:
+            return stats
+        checkpoints.update_one(
+            {"_id": CHECKPOINT_ID},
+            {"$set": {"pending": {"since": since, "until": until}, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    # one range on the event_inserted index (migration 6)
+    cursor = db.proctor_events.aggregate([
+        {"$match": {"inserted_at": {"$gt": since, "$lte": until}}},
+        {"$group": {
+            "_id": {"test_id": "$meta.test_id", "user_id": "$meta.user_id"},
+            "events": {"$sum": 1},
+            **{kind: {"$sum": {"$cond": [{"$eq": ["$kind", kind]}, 1, 0]}} for kind in RISK_WEIGHTS},
+            "ips": {"$addToSet": "$ip"},
+            "last_event_at": {"$max": "$ts"},
+        }},
+    ], allowDiskUse=True)
+
+    ops = []
+    for group in cursor:
+        ops.append(_risk_update(group, until))
+        stats["candidates"] += 1
+        stats["events"] += group["events"]
+        if len(ops) >= WRITE_BATCH:
+            db.proctor_risk.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        db.proctor_risk.bulk_write(ops, ordered=False)
+
+    checkpoints.update_one(
+        {"_id": CHECKPOINT_ID},
+        {"$set": {"until": until, "updated_at": datetime.utcnow(), "last_run": stats}, "$unset": {"pending": ""}},
+        upsert=True
+    )
+    return stats
@@ -0,0 +1,101 @@
+'''
+progress and per stage timings of a long running task, evaluation for now
+
+published two ways, both throttled to one write per interval
+- celery custom state PROGRESS with the snapshot as meta, for anything already holding an AsyncResult
+- a field on the test document (tests.evaluation_progress), so the admin endpoint answers a poll with
+  the find_one it does anyway instead of a result backend round trip per poll
+
+snapshot
+{"stage": "scoring", "processed": 120000, "total": 400000, "throughput": 85000.0, "eta_seconds": 3.3,
+ "elapsed_seconds": 1.4, "task_id": "...", "updated_at": datetime}
+'''
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+PROGRESS = "PROGRESS"
+
+
+class TaskProgress:
+    def __init__(self, task, collection, doc_filter: dict, field: str, interval: float = 1.0, clock=time.monotonic):
+        self.task = task
+        self.collection = collection
+        self.doc_filter = doc_filter
+        self.field = field
+        self.interval = interval
+        self.clock = clock
+
+        self.timings: Dict[str, float] = {}
+        self.stage_name: Optional[str] = None
+        self.processed = 0
+        self.total: Optional[int] = None
+        self._stage_started = self._published = clock()
+
+    @property
+    def task_id(self) -> Optional[str]:
+        return self.task.request.id if self.task is not None else None
+
+    def _close_stage(self, now: float):
+        if self.stage_name is not None:
+            self.timings[self.stage_name] = round(self.timings.get(self.stage_name, 0) + now - self._stage_started, 3)
+
+    def stage(self, name: str, total: Optional[int] = None):
+        '''ends the current stage (its time goes into timings) and starts the next one'''
+        now = self.clock()
+        self._close_stage(now)
+        self.stage_name, self.processed, self.total = name, 0, total
+        self._stage_started = now
+        self.publish(force=True)
+
+    def advance(self, n: int = 1):
+        # called per document, only the time check runs on most calls
+        self.processed += n
+        if self.clock() - self._published >= self.interval:
+            self.publish()
+
+    def snapshot(self) -> dict:
+        elapsed = self.clock() - self._stage_started
+        throughput = self.processed / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.total is not None and throughput > 0:
+            eta = round(max(0, self.total - self.processed) / throughput, 1)
+        return {
+            "stage": self.stage_name,
+            "processed": self.processed,
+            "total": self.total,
+            "throughput": round(throughput, 1),
+            "eta_seconds": eta,
+            "elapsed_seconds": round(elapsed, 3),
+            "task_id": self.task_id,
+            "updated_at": datetime.utcnow(),
+        }
+
+    def publish(self, force: bool = False, extra: Optional[dict] = None):
+        now = self.clock()
+        if not force and now - self._published < self.interval:
+            return
+        self._published = now
+        snapshot = self.snapshot()
+        if extra:
+            snapshot.update(extra)
+        if self.task_id:
+            # custom state, AsyncResult(...).info carries the snapshot
+            self.task.update_state(state=PROGRESS, meta={**snapshot, "updated_at": snapshot["updated_at"].isoformat()})
+        self.collection.update_one(self.doc_filter, {"$set": {self.field: snapshot}})
+
+    def finish(self) -> Dict[str, float]:
+        '''closes the last stage, returns {stage: seconds} with a total'''
+        now = self.clock()
+        self._close_stage(now)
+        self.stage_name = None
+        timings = dict(self.timings)
+        timings["total"] = round(sum(self.timings.values()), 3)
+        return timings
+
+    def fail(self, error: Exception):
+        # best effort, the task is already failing
+        try:
+            self.publish(force=True, extra={"failed": True, "error": f"{type(error).__name__}: {error}"[:500]})
+        except Exception:
+            pass
@@ -0,0 +1,19 @@
+'''
+task names and queues, shared by the worker and the api's producer (app/api/utils/task_producer.py)
+
+kept free of imports so the api can route a task without importing celery's app or any task module
+the autoscaler scales one deployment per queue, see SCALER_POOLS in custom_autoscalar/scaling_config.py
+'''
+
+EVALUATE_TEST = "evaluate_test_after_close"
+COMPACT_TEST_DRAFTS = "compact_test_drafts"
+AGGREGATE_PROCTOR_RISK = "aggregate_proctor_risk"
+SCHEDULE_DUE_EVALUATIONS = "schedule_due_evaluations"
+
+EVALUATION_QUEUE = "evaluation"
+DEFAULT_QUEUE = "celery"
+
+# everything not listed goes to the default queue (io workers)
+TASK_ROUTES = {
+    EVALUATE_TEST: {"queue": EVALUATION_QUEUE},
+}
@@ -1,19 +1,48 @@
 # app/worker/tasks.py
 from app.worker.worker import celery_app
 from collections import defaultdict
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 
-from app.db.database import db 
+from app.config import settings
+from app.db.database import worker_db
+from app.worker.compaction import compact_drafts
+from app.worker.progress import TaskProgress
+from app.worker.item_analytics import ItemAnalytics, write_question_stats
+from app.worker.performance_history import record_results
+from app.worker.routing import EVALUATE_TEST, COMPACT_TEST_DRAFTS, AGGREGATE_PROCTOR_RISK, SCHEDULE_DUE_EVALUATIONS
+from app.worker.evaluation_lease import (
+    ATTEMPTS_FIELD, FAILED_FIELD, LEASE_FIELD, EvaluationLease, LeaseLost, claim, claimable, exhausted, new_owner, release
+)
+from app.worker.proctoring import aggregate_risk
 # from app.core.redis import get_redis
 
-@celery_app.task(name="evaluate_test_after_close", bind=True)
+RESULT_BATCH_SIZE = 5000 # test_results written per insert_many, one progress update each
+RETRY_COUNTDOWN_SECONDS = 60
+MAX_RETRIES = 3 # per attempt, see EVALUATION_MAX_ATTEMPTS for claims by the scheduler
+
+@celery_app.task(name=EVALUATE_TEST, bind=True)
 def evaluate_test_after_close(self, test_id: str):
 
+    db = worker_db()
+    # one evaluation per test, see evaluation_lease.py, the enqueuer claimed it under this task id
+    lease = EvaluationLease(db.tests, test_id, self.request.id, settings.EVALUATION_LEASE_SECONDS)
+    if not lease.acquire():
+        return {"status": "skipped", "test_id": test_id, "reason": "evaluated or another evaluation holds the lease"}
+
+    # stage, documents processed, throughput and eta on tests.evaluation_progress + celery PROGRESS state
+    progress = TaskProgress(
+        self, db.tests, {"test_id": test_id}, "evaluation_progress",
+        interval=settings.EVALUATION_PROGRESS_INTERVAL_SECONDS
+    )
     try:
 
+        progress.stage("loading")
+        test = db.tests.find_one({"test_id": test_id}, projection={"name": 1}) or {}
         questions = list(db.questions.find({"test_id": test_id}))
         correct_answers = {q["question_id"]: q["correct_option"] for q in questions}
+        # per question stats tallied from the same stream, see item_analytics.py
+        analytics = ItemAnalytics(test_id, questions)
         
         # calculate scores for all users
         user_scores = defaultdict(lambda: {
@@ -23,6 +52,10 @@ def evaluate_test_after_close(self, test_id: str):
             "correct": 0
         })
         
+        # counted on eval_query_index, only used for the eta
+        submitted = db.draft_submissions.count_documents({"test_id": test_id, "final_submit": True})
+
+        progress.stage("scoring", total=submitted)
         # streaming, does not load all into memory
         submissions = db.draft_submissions.find({
             "test_id": test_id,
@@ -50,7 +83,10 @@ def evaluate_test_after_close(self, test_id: str):
 
             # subject also snapshotted so changing subjects is tracked
             user_scores[user_id]["subjects"][sub["subject_snapshot"]] += score
+            analytics.observe(sub, selected is not None and selected == correct)
+            progress.advance()
         
+        progress.stage("ranking", total=len(user_scores))
         # calculate ranks (in memory, fast)
         sorted_users = sorted(
             user_scores.items(),
@@ -95,9 +131,29 @@ def evaluate_test_after_close(self, test_id: str):
                 "subject_percentiles": subject_percentiles,
                 "evaluated_at": datetime.utcnow()
             })
+            progress.advance()
+
+        # discrimination needs the score cohorts, so item analytics are finalized once ranks exist
+        progress.stage("analytics")
+        question_stats = analytics.finalize([user_id for user_id, _ in sorted_users])
         
-        if results:
-            db.test_results.insert_many(results, ordered=False)
+        progress.stage("writing", total=len(results))
+        lease.check()
+        # rows of a run that died mid write (lease reclaimed), insert_many would hit user_result_lookup
+        db.test_results.delete_many({"test_id": test_id})
+        for start in range(0, len(results), RESULT_BATCH_SIZE):
+            batch = results[start:start + RESULT_BATCH_SIZE]
+            db.test_results.insert_many(batch, ordered=False)
+            progress.advance(len(batch))
+        # before the evaluated flag, analytics are visible exactly when results are
+        write_question_stats(db, question_stats)
+
+        # each candidate's history across mocks, see performance_history.py, safe to repeat after a reclaim
+        progress.stage("history", total=len(results))
+        for start in range(0, len(results), RESULT_BATCH_SIZE):
+            batch = results[start:start + RESULT_BATCH_SIZE]
+            record_results(db, batch, test_name=test.get("name"), candidates=total_users)
+            progress.advance(len(batch))
 
         # prod: cache results in Redis for fast reads
         # redis = get_redis()
@@ -122,19 +178,140 @@ def evaluate_test_after_close(self, test_id: str):
         # pipe.set(f"leaderboard_ready:{test_id}", 1)
         # pipe.execute()
         
-        # Mark test as evaluated
-        db.tests.update_one(
-            {"test_id": test_id},
-            {"$set": {"evaluated": True, "evaluated_at": datetime.utcnow()}}
+        # Mark test as evaluated, with the per stage breakdown, in the same write that drops the lease
+        timings = progress.finish()
+        lease.check()
+        lease.release(
+            evaluated=True,
+            evaluated_at=datetime.utcnow(),
+            evaluation_timings=timings,
+            evaluation_progress={
+                "stage": "completed",
+                "processed": len(results),
+                "total": len(results),
+                "task_id": self.request.id,
+                "updated_at": datetime.utcnow()
+            }
         )
+
+        # drafts are not needed past this point, archived after a delay in case results need a look first
+        compact_test_drafts.apply_async(args=[test_id], countdown=settings.DRAFT_COMPACTION_DELAY_SECONDS)
         
         return {
             "status": "completed",
-            "test_id": test_id
+            "test_id": test_id,
+            "timings": timings
         }
         
+    except LeaseLost as e:
+        # another evaluation took over (this one stalled past the lease), it writes the results
+        return {"status": "skipped", "test_id": test_id, "reason": str(e)}
+
     except Exception as e:
         # log to database
-        raise self.retry(exc=e, countdown=60, max_retries=3)
+        progress.fail(e)
+        if self.request.retries >= MAX_RETRIES:
+            # this attempt is over, free the test for the next one, or flag it when it was the last
+            _end_attempt(db, test_id, self.request.id, e)
+            raise
+        # the retry keeps this task id, holding the lease over the countdown keeps the scheduler off it
+        try:
+            lease.extend(RETRY_COUNTDOWN_SECONDS)
+        except Exception:
+            pass
+        raise self.retry(exc=e, countdown=RETRY_COUNTDOWN_SECONDS, max_retries=MAX_RETRIES)
+
+    finally:
+        lease.stop()
+
+def _end_attempt(db, test_id: str, owner: str, error: Exception):
+    # best effort, the lease expires anyway and the scheduler flags exhausted tests itself
+    try:
+        test = db.tests.find_one({"test_id": test_id}, projection={ATTEMPTS_FIELD: 1}) or {}
+        fields = {}
+        if test.get(ATTEMPTS_FIELD, 0) >= settings.EVALUATION_MAX_ATTEMPTS:
+            fields = {FAILED_FIELD: True, "evaluation_error": f"{type(error).__name__}: {error}"[:500]}
+        release(db.tests, test_id, owner, **fields)
+    except Exception:
+        pass
+
+@celery_app.task(name=COMPACT_TEST_DRAFTS, bind=True)
+def compact_test_drafts(self, test_id: str):
+    '''
+    archive an evaluated test's drafts into draft_archives and delete the rows, see app/worker/compaction.py
+    '''
+    db = worker_db()
+    try:
+        test = db.tests.find_one({"test_id": test_id}, projection={"evaluated": 1, "drafts_compacted": 1})
+        # never touch a test that is still open or being evaluated
+        if not test or not test.get("evaluated"):
+            return {"status": "skipped", "test_id": test_id}
+        if test.get("drafts_compacted"):
+            return {"status": "already_compacted", "test_id": test_id}
+
+        stats = compact_drafts(
+            db,
+            test_id,
+            batch_users=settings.DRAFT_COMPACTION_BATCH_USERS,
+            pause_seconds=settings.DRAFT_COMPACTION_PAUSE_MS / 1000
+        )
+
+        db.tests.update_one(
+            {"test_id": test_id},
+            {"$set": {"drafts_compacted": True, "drafts_compacted_at": datetime.utcnow(), "draft_compaction": stats}}
+        )
+        return {"status": "completed", "test_id": test_id, **stats}
+
+    except Exception as e:
+        # rerunning is safe, archives are insert only and deletes only cover archived candidates
+        raise self.retry(exc=e, countdown=300, max_retries=3)
+
+@celery_app.task(name=AGGREGATE_PROCTOR_RISK)
+def aggregate_proctor_risk():
+    '''
+    periodic (beat), folds newly received anti-cheat events into proctor_risk, see app/worker/proctoring.py
+    no retry, the next run picks up from the same checkpoint
+    '''
+    db = worker_db()
+    until = datetime.utcnow() - timedelta(seconds=settings.PROCTOR_RISK_SETTLE_SECONDS)
+    stats = aggregate_risk(db, until, lookback_seconds=settings.PROCTOR_RISK_LOOKBACK_SECONDS)
+    return {"status": "completed", **stats}
+
+@celery_app.task(name=SCHEDULE_DUE_EVALUATIONS)
+def schedule_due_evaluations():
+    '''
+    periodic (beat), enqueues the evaluation of tests closed EVALUATION_DELAY_SECONDS ago
+    a range on close_schedule (ends_at, evaluated), tests with a live lease are queued or running and skipped,
+    an expired lease means the worker was lost and the test is claimed again, up to EVALUATION_MAX_ATTEMPTS claims
+    '''
+    db = worker_db()
+    now = datetime.utcnow()
+    closed_before = now - timedelta(seconds=settings.EVALUATION_DELAY_SECONDS)
+
+    # out of attempts with no worker left on it (the last one was lost, so it never flagged the test itself)
+    failed = db.tests.update_many(
+        {"ends_at": {"$lte": closed_before}, **exhausted(now, settings.EVALUATION_MAX_ATTEMPTS)},
+        {"$set": {FAILED_FIELD: True}, "$unset": {LEASE_FIELD: ""}}
+    )
+
+    due = db.tests.find(
+        {"ends_at": {"$lte": closed_before}, **claimable(now, max_attempts=settings.EVALUATION_MAX_ATTEMPTS)},
+        projection={"_id": 0, "test_id": 1}
+    ).sort("ends_at", 1).limit(settings.EVALUATION_SCHEDULE_BATCH)
+
+    queued = []
+    for test in due:
+        test_id = test["test_id"]
+        owner = new_owner()
+        # lost the race to an admin trigger or another scheduler run, fine
+        if not claim(db.tests, test_id, owner, settings.EVALUATION_LEASE_SECONDS, settings.EVALUATION_MAX_ATTEMPTS):
+            continue
+        try:
+            evaluate_test_after_close.apply_async(args=[test_id], task_id=owner)
+        except Exception:
+            # broker down, free the test for the next run instead of waiting out the lease
+            release(db.tests, test_id, owner)
+            raise
+        queued.append(test_id)
 
-celery_app.send_task(task_name, args)
\ No newline at end of file
+    return {"status": "completed", "queued": queued, "failed": failed.modified_count}
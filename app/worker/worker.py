@@ -1,29 +1,35 @@
 from celery import Celery
 
 from app.config import settings
+from app.worker.routing import TASK_ROUTES, AGGREGATE_PROCTOR_RISK, SCHEDULE_DUE_EVALUATIONS
 
 celery_app = Celery(
-    "worker",
-    broker=settings.CELERY_BROKER_URL,      
+    "exam_worker",
+    broker=settings.CELERY_BROKER_URL,
     backend=settings.CELERY_RESULT_BACKEND,
+    include=["app.worker.tasks"],
     worker_prefetch_multiplier=1,
     task_acks_late=True,
     task_reject_on_worker_lost=True,
-    task_routes={
-        'evaluate_test_after_close': {'queue': 'evaluation'}
-    }
+    task_routes=TASK_ROUTES
 )
 
 '''
 for chaining tasks, we would specify imports and task_routes when creating celery app
+the api never imports this module, it enqueues by name through app/api/utils/task_producer.py
 '''
 
-# app/worker/worker.py
-from celery import Celery
-from app.config import settings
-
-celery_app = Celery(
-    "exam_worker",
-    broker=settings.CELERY_BROKER_URL,
-    backend=settings.CELERY_RESULT_BACKEND,
-)
\ No newline at end of file
+celery_app.conf.beat_schedule = {
+    # evaluation a set delay after each test closes, the lease on the test makes overlapping runs harmless
+    "schedule-due-evaluations": {
+        "task": SCHEDULE_DUE_EVALUATIONS,
+        "schedule": settings.EVALUATION_SCHEDULE_INTERVAL_SECONDS,
+        "options": {"expires": settings.EVALUATION_SCHEDULE_INTERVAL_SECONDS},
+    },
+    # anti-cheat risk aggregates, expires so runs queued behind a stalled worker are dropped instead of overlapping
+    "aggregate-proctor-risk": {
+        "task": AGGREGATE_PROCTOR_RISK,
+        "schedule": settings.PROCTOR_RISK_INTERVAL_SECONDS,
+        "options": {"expires": settings.PROCTOR_RISK_INTERVAL_SECONDS},
+    },
+}
@@ -0,0 +1,330 @@
+'''
+end to end exam day load test, the whole lifecycle of one mock against the real app in process
+
+phases
+1. signup / login storm, candidates arrive uniformly over --login-window seconds,
+   429s from the hashing pool are retried after Retry-After like a client would
+2. synchronized /start, every candidate at the same instant (the 10:00:00 problem)
+3. autosaves, each candidate saves --saves times with exponential think time over --exam-seconds
+   (a compressed exam, 3 hours of saves squeezed into a minute is the point)
+4. staggered /submit, most candidates near the end (beta distributed)
+5. admin triggers evaluation, an in-process celery worker runs it off the memory:// broker
+6. result, leaderboard, progress history and rank prediction reads, arriving over --read-window seconds
+
+requests go through httpx's asgi transport, no sockets, so latency is the app + mongo, not the network
+mongo is the in memory stand-in (benchmarks.memory_mongo) unless --mongo-url points at a mongod,
+migrations are applied to either before the run
+
+reports requests, non 2xx, throughput and p50/p99/p999 per endpoint, plus event loop lag from app.metrics
+
+usage:
+    python -m benchmarks.exam_day --candidates 2000 --concurrency 200 --exam-seconds 60
+    python -m benchmarks.exam_day --mongo-url mongodb://localhost:27017 --candidates 10000
+'''
+
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+
+os.environ.setdefault("SECRET_KEY", "benchmark-only-secret-key-not-for-prod")
+
+SUBJECTS = ("quant", "verbal", "logic")
+REFERENCE_TEST_ID = "loadtest-reference"
+EXAM_DURATION_SECONDS = 10800  # the real exam the compressed run stands for
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class Recorder:
+    '''latency and status per endpoint label, plus the window each endpoint was active in for throughput'''
+    def __init__(self, concurrency: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.first = {}
+        self.last = {}
+
+    async def call(self, client, label: str, method: str, url: str, **kwargs):
+        async with self.semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                status = response.status_code
+            except Exception as e:
+                response, status = None, type(e).__name__
+            end = time.perf_counter()
+        self.latencies[label].append(end - start)
+        self.statuses[label][status] += 1
+        self.first.setdefault(label, start)
+        self.last[label] = end
+        return response
+
+    def report(self):
+        print(f"\n{'endpoint':<40} {'requests':>8} {'non 2xx':>8} {'req/s':>9} "
+              f"{'p50 ms':>8} {'p99 ms':>8} {'p999 ms':>8} {'max ms':>8}")
+        for label, latencies in self.latencies.items():
+            statuses = self.statuses[label]
+            failed = sum(n for status, n in statuses.items() if not (isinstance(status, int) and status < 300))
+            window = max(self.last[label] - self.first[label], 1e-9)
+            print(f"{label:<40} {len(latencies):>8} {failed:>8} {len(latencies) / window:>9.1f} "
+                  f"{percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f} "
+                  f"{percentile(latencies, 0.999) * 1000:>8.1f} {max(latencies) * 1000:>8.1f}")
+            if failed:
+                print(f"{'':<40} statuses {dict(statuses)}")
+
+
+async def with_retries(recorder, client, label, method, url, attempts: int = 5, **kwargs):
+    # 429s from the hashing pool / rate limiter carry Retry-After, clients back off and try again
+    response = None
+    for attempt in range(attempts):
+        response = await recorder.call(client, label, method, url, **kwargs)
+        if response is None or response.status_code != 429:
+            return response
+        await asyncio.sleep(float(response.headers.get("Retry-After", 1)) * (1 + random.random()))
+    return response
+
+
+async def seed(db, test_id: str, questions: int, duration: int, reference_results: int):
+    await db.tests.insert_one({
+        "test_id": test_id,
+        "name": f"load test {test_id}",
+        "duration_seconds": duration,
+        "evaluated": False,
+    })
+    await db.questions.insert_many([{
+        "test_id": test_id,
+        "question_id": f"q{i}",
+        "subject": SUBJECTS[i % len(SUBJECTS)],
+        "correct_option": random.randrange(4),
+        "marks_correct": 3,
+        "marks_wrong": -1,
+    } for i in range(questions)])
+
+    # reference distribution the rank prediction compares against, once per database
+    if reference_results and not await db.test_results.find_one({"test_id": REFERENCE_TEST_ID}):
+        per_subject = questions // len(SUBJECTS)
+        docs = []
+        for i in range(reference_results):
+            subject_scores = {s: int(random.gauss(per_subject, per_subject / 2)) for s in SUBJECTS}
+            docs.append({
+                "test_id": REFERENCE_TEST_ID,
+                "user_id": f"reference-{i}",
+                "total_score": sum(subject_scores.values()),
+                "subject_scores": subject_scores,
+            })
+        await db.test_results.insert_many(docs, ordered=False)
+
+
+async def register(recorder, client, email: str, password: str, login_delay: float):
+    await asyncio.sleep(login_delay)
+    await with_retries(recorder, client, "POST /auth/signup", "POST", "/auth/signup",
+                       json={"email": email, "username": email.split("@")[0], "password": password})
+    response = await with_retries(recorder, client, "POST /auth/login", "POST", "/auth/login",
+                                  json={"email": email, "password": password})
+    if response is None or response.status_code != 200:
+        return None
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def sit_exam(recorder, client, headers: dict, test_id: str, questions: int, saves: int,
+                   exam_seconds: float, start_at: float):
+    # everyone is released at the same instant
+    await asyncio.sleep(max(0.0, start_at - time.perf_counter()))
+    response = await recorder.call(client, "POST /app/exam/{test_id}/start", "POST",
+                                   f"/app/exam/{test_id}/start", headers=headers)
+    if response is None or response.status_code != 200:
+        return
+
+    # most candidates use the whole exam, a tail leaves early
+    submit_after = exam_seconds * random.betavariate(5, 1.2)
+    deadline = start_at + submit_after
+    mean_gap = exam_seconds / max(saves, 1)
+    spent = defaultdict(int)
+    while True:
+        gap = random.expovariate(1 / mean_gap)
+        if time.perf_counter() + gap >= deadline:
+            break
+        await asyncio.sleep(gap)
+        question = f"q{random.randrange(questions)}"
+        # time spent is reported on the exam's clock, not the compressed one
+        spent[question] += max(1, int(gap * EXAM_DURATION_SECONDS / exam_seconds))
+        await recorder.call(client, "POST /app/exam/{test_id}/save", "POST", f"/app/exam/{test_id}/save",
+                            headers=headers, json={
+                                "question_id": question,
+                                "selected_option": random.choice((None, 0, 1, 2, 3, 3)),
+                                "marked_for_review": random.random() < 0.1,
+                                "time_spent_seconds": spent[question],
+                            })
+
+    await asyncio.sleep(max(0.0, deadline - time.perf_counter()))
+    await recorder.call(client, "POST /app/exam/{test_id}/submit", "POST", f"/app/exam/{test_id}/submit",
+                        headers=headers)
+
+
+async def read_results(recorder, client, headers: dict, test_id: str, candidates: int, arrive_after: float,
+                       predict_fraction: float):
+    await asyncio.sleep(arrive_after)
+    await recorder.call(client, "GET /results/{test_id}/user", "GET", f"/results/{test_id}/user", headers=headers)
+    # most look at the first page, some page down
+    offset = 0 if random.random() < 0.7 else random.randrange(0, max(candidates, 1), 100)
+    await recorder.call(client, "GET /results/{test_id}/leaderboard", "GET", f"/results/{test_id}/leaderboard",
+                        headers=headers, params={"limit": 100, "offset": offset})
+    await recorder.call(client, "GET /results/me/progress", "GET", "/results/me/progress", headers=headers)
+    if random.random() < predict_fraction:
+        await recorder.call(client, "POST /predictions/predict-rank", "POST", "/predictions/predict-rank",
+                            headers=headers, params={"mock_test_id": test_id, "reference_test_id": REFERENCE_TEST_ID})
+
+
+async def evaluate(recorder, client, admin_headers: dict, test_id: str, timeout: float):
+    '''triggers evaluation and polls its progress like the admin ui would, returns (seconds, stage timings)'''
+    start = time.perf_counter()
+    await recorder.call(client, "POST /admin/tests/{test_id}/evaluate", "POST",
+                        f"/admin/tests/{test_id}/evaluate", headers=admin_headers)
+    while time.perf_counter() - start < timeout:
+        response = await recorder.call(client, "GET /admin/tests/{test_id}/evaluation", "GET",
+                                       f"/admin/tests/{test_id}/evaluation", headers=admin_headers)
+        if response is not None and response.status_code == 200 and response.json()["evaluated"]:
+            return time.perf_counter() - start, response.json()["timings"] or {}
+        await asyncio.sleep(0.2)
+    raise TimeoutError(f"evaluation of {test_id} did not finish within {timeout}s")
+
+
+async def run(args, app, db):
+    import httpx
+
+    run_id = uuid.uuid4().hex[:8]
+    test_id = f"loadtest-{run_id}"
+    password = "correct horse battery"
+    recorder = Recorder(args.concurrency)
+    phases = []
+
+    def phase(name: str, started: float):
+        phases.append((name, time.perf_counter() - started))
+
+    # unhandled exceptions come back as 500s instead of raising here, like behind a server
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=120) as client:
+        started = time.perf_counter()
+        await seed(db, test_id, args.questions, EXAM_DURATION_SECONDS, args.reference_results)
+        phase("seed", started)
+
+        # admin goes through signup + login like everyone else, the role is granted directly
+        admin_email = f"admin-{run_id}@loadtest.example.com"
+        admin_headers = await register(recorder, client, admin_email, password, 0)
+        await db.users.update_one({"email": admin_email}, {"$set": {"role": "admin"}})
+
+        started = time.perf_counter()
+        headers = await asyncio.gather(*(
+            register(recorder, client, f"c{i}-{run_id}@loadtest.example.com", password,
+                     random.uniform(0, args.login_window))
+            for i in range(args.candidates)
+        ))
+        headers = [h for h in headers if h is not None]
+        phase(f"signup + login ({len(headers)}/{args.candidates} signed in)", started)
+
+        started = time.perf_counter()
+        start_at = time.perf_counter() + 0.5
+        await asyncio.gather(*(
+            sit_exam(recorder, client, h, test_id, args.questions, args.saves, args.exam_seconds, start_at)
+            for h in headers
+        ))
+        phase("start + autosave + submit", started)
+
+        started = time.perf_counter()
+        evaluation_seconds, timings = await evaluate(recorder, client, admin_headers, test_id, args.evaluation_timeout)
+        phase("evaluation (trigger to evaluated)", started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            read_results(recorder, client, h, test_id, len(headers), random.uniform(0, args.read_window),
+                         args.predict_fraction)
+            for h in headers
+        ))
+        phase("result / leaderboard / prediction reads", started)
+
+    print(f"\ntest {test_id}, {args.candidates} candidates, {args.questions} questions, "
+          f"concurrency {args.concurrency}, evaluation took {evaluation_seconds:.2f}s")
+    for name, seconds in phases:
+        print(f"  {name:<48} {seconds:>8.2f}s")
+    print("evaluation stages " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
+    recorder.report()
+
+
+def use_memory_mongo():
+    '''points every workload of app.db.database, api and worker side, at one in memory store'''
+    from app.config import settings
+    from app.db import database
+    from benchmarks.memory_mongo import AsyncMemoryDatabase, MemoryDatabase, MemoryStore
+
+    store = MemoryStore()
+    async_db = AsyncMemoryDatabase(store, settings.DATABASE_NAME)
+    database.db = async_db
+    for name in database._databases:
+        database._databases[name] = async_db
+    for name in database._workloads:
+        database._worker_clients[name] = {settings.DATABASE_NAME: MemoryDatabase(store, settings.DATABASE_NAME)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100, help="requests in flight at once")
+    parser.add_argument("--questions", type=int, default=60)
+    parser.add_argument("--saves", type=int, default=40, help="autosaves per candidate")
+    parser.add_argument("--exam-seconds", type=float, default=30, help="wall clock length of the compressed exam")
+    parser.add_argument("--login-window", type=float, default=10)
+    parser.add_argument("--read-window", type=float, default=10)
+    parser.add_argument("--predict-fraction", type=float, default=0.3)
+    parser.add_argument("--reference-results", type=int, default=5000)
+    parser.add_argument("--evaluation-timeout", type=float, default=600)
+    parser.add_argument("--rounds", type=int, default=4, help="bcrypt rounds, production uses 12")
+    parser.add_argument("--mongo-url", default="", help="local mongod, in memory stand-in when empty")
+    parser.add_argument("--db-name", default="exam_loadtest")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    # settings are read at import, so set them before touching app modules
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ["DATABASE_NAME"] = args.db_name
+    os.environ["DATABASE_URL"] = args.mongo_url or "mongodb://localhost:27017"
+    os.environ["CELERY_BROKER_URL"] = "memory://"
+    os.environ["CELERY_RESULT_BACKEND"] = "cache+memory://"
+    os.environ.setdefault("PASSWORD_HASH_MAX_PENDING", str(max(64, args.concurrency)))
+
+    if not args.mongo_url:
+        use_memory_mongo()
+
+    from celery.contrib.testing.worker import start_worker
+
+    from app.api.main import app
+    from app.db import database
+    from app.db.migrations import apply_migrations
+    from app.metrics import registry
+    from app.worker.routing import DEFAULT_QUEUE, EVALUATION_QUEUE
+    from app.worker.tasks import celery_app
+
+    async def go():
+        await apply_migrations(database.db)
+        await run(args, app, database.db)
+
+    print(f"mongo: {args.mongo_url or 'in memory stand-in'}, celery: memory:// with an in-process worker")
+    # one worker on both queues, in prod evaluation gets its own pool (see app/worker/routing.py)
+    with start_worker(celery_app, pool="solo", perform_ping_check=False, shutdown_timeout=30,
+                      queues=[DEFAULT_QUEUE, EVALUATION_QUEUE]):
+        asyncio.run(go())
+    print(f"\nevent loop lag max {registry.loop_lag_max * 1000:.1f}ms over {registry.loop_lag.count} samples")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+'''
+api cold start budget, import of app.api.main + lifespan startup in fresh interpreters
+
+what a new api pod pays before it can take traffic, each run is a new python process (no warm module cache
+in sys.modules, the os file cache is warm after the first run, as on a node that already pulled the image)
+also fails when a module the api must not import shows up (celery, kombu, app.worker task modules),
+those belong to the worker, the api enqueues by name (app/api/utils/task_producer.py)
+
+prints the median / max over --runs and the packages that dominate import time (self time, -X importtime)
+exits 1 when the median is over --budget-ms or a forbidden module was imported, usable as a ci gate
+tests/test_import_budget.py runs the same check in the test suite
+
+usage:
+    python -m benchmarks.import_budget --runs 7 --budget-ms 1000
+'''
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+# app.worker.routing (names + queues only) is allowed, anything that builds the worker is not
+FORBIDDEN = ("celery", "kombu", "app.worker.worker", "app.worker.tasks")
+
+CHILD = '''
+import asyncio, json, sys, time
+start = time.perf_counter()
+import app.api.main
+imported = time.perf_counter()
+
+async def startup():
+    async with app.api.main.app.router.lifespan_context(app.api.main.app):
+        return time.perf_counter()
+
+started = asyncio.run(startup())
+print(json.dumps({
+    "import_seconds": imported - start,
+    "startup_seconds": started - imported,
+    "modules": sorted(sys.modules),
+}))
+'''
+
+
+def child_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("SECRET_KEY", "benchmark-only-secret-key-not-for-prod")
+    # startup must not need a reachable mongo or broker, the schema check is the only startup read
+    env.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+    env["MIGRATIONS_CHECK"] = "off"
+    return env
+
+
+def run_once(env: dict) -> dict:
+    out = subprocess.run([sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def import_profile(env: dict, top: int):
+    '''self time per top level package, from -X importtime'''
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.api.main"],
+                         env=env, capture_output=True, text=True, check=True)
+    per_package = defaultdict(int)
+    for line in out.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        self_us, _, module = line[len("import time:"):].split("|", 2)
+        try:
+            self_us = int(self_us)
+        except ValueError:
+            continue  # header line
+        name = module.strip()
+        package = ".".join(name.split(".")[:2]) if name.startswith("app.") else name.split(".")[0]
+        per_package[package] += self_us
+    return sorted(per_package.items(), key=lambda kv: kv[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=1000)
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args()
+
+    env = child_env()
+    runs = [run_once(env) for _ in range(args.runs)]
+    totals = [(r["import_seconds"] + r["startup_seconds"]) * 1000 for r in runs]
+    imports = [r["import_seconds"] * 1000 for r in runs]
+    startups = [r["startup_seconds"] * 1000 for r in runs]
+
+    print(f"{args.runs} fresh interpreters, python {sys.version.split()[0]}")
+    print(f"  import   median {statistics.median(imports):7.1f}ms  max {max(imports):7.1f}ms")
+    print(f"  startup  median {statistics.median(startups):7.1f}ms  max {max(startups):7.1f}ms")
+    print(f"  total    median {statistics.median(totals):7.1f}ms  max {max(totals):7.1f}ms  budget {args.budget_ms:.0f}ms")
+
+    print("\nimport self time by package")
+    for package, self_us in import_profile(env, args.top):
+        print(f"  {package:<32} {self_us / 1000:7.1f}ms")
+
+    failed = False
+    forbidden = sorted({m for m in runs[0]["modules"] if m.startswith(FORBIDDEN)})
+    if forbidden:
+        failed = True
+        print(f"\nFAIL: api imports worker side modules: {', '.join(forbidden[:10])}")
+    if statistics.median(totals) > args.budget_ms:
+        failed = True
+        print(f"\nFAIL: median cold start {statistics.median(totals):.1f}ms is over the {args.budget_ms:.0f}ms budget")
+    if not failed:
+        print("\nok")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+'''
+login throughput and event loop lag, bcrypt inline vs on the hashing pool
+
+simulates a login storm against verify_and_update_password, no mongo needed
+a probe coroutine sleeps 10ms in a loop on the same event loop, lag = how late it wakes up,
+which is what every other request on the worker (autosaves etc.) experiences during the storm
+
+usage:
+    python -m benchmarks.login_bench --logins 200 --concurrency 50 --rounds 12
+'''
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark-only-secret-key-not-for-prod")
+
+
+PROBE_INTERVAL = 0.01
+
+
+async def lag_probe(samples: list, stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        samples.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def storm(mode: str, logins: int, concurrency: int, stored_hash: str):
+    from fastapi import HTTPException
+    from app.api.utils.auth_utils import pwd_context, verify_and_update_password
+
+    semaphore = asyncio.Semaphore(concurrency)
+    rejected = 0
+
+    async def one_login():
+        nonlocal rejected
+        async with semaphore:
+            if mode == "inline":
+                # what the handlers did before, blocks the loop for the whole hash
+                pwd_context.verify_and_update("correct horse", stored_hash)
+            else:
+                try:
+                    await verify_and_update_password("correct horse", stored_hash)
+                except HTTPException:
+                    rejected += 1
+            # yield like a real handler would between db calls
+            await asyncio.sleep(0)
+
+    lag = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(lag_probe(lag, stop))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe
+    return elapsed, lag, rejected
+
+
+def report(mode: str, logins: int, elapsed: float, lag: list, rejected: int, workers: int):
+    ok = logins - rejected
+    per_sec = ok / elapsed
+    cores = workers if mode == "pool" else 1
+    print(f"{mode:>6}: {ok} logins in {elapsed:.2f}s -> {per_sec:.1f}/s, {per_sec / cores:.1f}/s per core "
+          f"({rejected} rejected with 429)")
+    print(f"        loop lag p50 {statistics.median(lag) * 1000 if lag else 0:.1f}ms  "
+          f"p99 {percentile(lag, 0.99) * 1000:.1f}ms  max {max(lag, default=0) * 1000:.1f}ms  "
+          f"({len(lag)} probe samples)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-pending", type=int, default=1000)
+    args = parser.parse_args()
+
+    # settings are read at import, so set them before touching app modules
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    os.environ["PASSWORD_HASH_MAX_PENDING"] = str(args.max_pending)
+
+    from app.api.utils.auth_utils import hash_password, password_pool
+
+    stored_hash = hash_password("correct horse")
+    print(f"bcrypt rounds={args.rounds} logins={args.logins} concurrency={args.concurrency} pool workers={args.workers}")
+
+    for mode in ("inline", "pool"):
+        elapsed, lag, rejected = asyncio.run(storm(mode, args.logins, args.concurrency, stored_hash))
+        report(mode, args.logins, elapsed, lag, rejected, args.workers)
+
+    password_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,814 @@
+'''
+in memory stand-in for the parts of the mongo api the app uses, for load tests without a mongod
+
+one MemoryStore is shared by an async facade (what the api's AsyncMongoClient databases return)
+and a sync facade (what worker_db returns in celery tasks), so an in-process worker sees the api's writes
+
+covers find / find_one / find_one_and_update / insert / update (upsert, $set $setOnInsert $inc $max $min $unset
+$push with $each / $slice) / replace / delete / count_documents / bulk_write + insert_many (errors as BulkWriteError),
+filters with equality, $in $nin $ne $exists $lt $lte $gt $gte $or $and, dotted paths through arrays of documents
+create_index builds a hash index over every prefix of its keys, equality lookups on a prefix skip the scan
+and unique indexes raise DuplicateKeyError, so upsert / insert races behave like they do against a server
+aggregate runs $match / $group / $sort / $limit, and updates can be pipelines of $set stages, with the expression
+operators the app's pipelines use (_EXPRESSIONS), enough for the risk aggregation and the tests
+
+not a database, no $elemMatch / positional updates, no text/geo, sorts are in python
+the store lock is held for a whole query, a worker scan stalls the api loop for its duration (shows as loop lag)
+'''
+import math
+import threading
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+_MISSING = object()
+
+
+class _Many(list):
+    '''values of a dotted path that went through an array, a filter matches if any of them does'''
+
+
+def _clone(value):
+    # documents handed out are copies, callers mutating them must not touch the store
+    if isinstance(value, dict):
+        return {k: _clone(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clone(v) for v in value]
+    return value
+
+
+def _hashable(value):
+    if isinstance(value, dict):
+        return tuple((k, _hashable(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(_hashable(v) for v in value)
+    return value
+
+
+def _get(doc: dict, path: str):
+    if "." not in path:
+        return doc.get(path, _MISSING)
+    value = doc
+    parts = path.split(".")
+    for i, part in enumerate(parts):
+        if isinstance(value, list):
+            rest = ".".join(parts[i:])
+            return _Many(v for item in value if isinstance(item, dict)
+                         for v in [_get(item, rest)] if v is not _MISSING)
+        if not isinstance(value, dict):
+            return _MISSING
+        value = value.get(part, _MISSING)
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _set(doc: dict, path: str, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _unset(doc: dict, path: str):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(last, None)
+
+
+def _compare(value, op: str, arg) -> bool:
+    if value is _MISSING or value is None:
+        return False
+    try:
+        if op == "$lt":
+            return value < arg
+        if op == "$lte":
+            return value <= arg
+        if op == "$gt":
+            return value > arg
+        return value >= arg
+    except TypeError:
+        return False
+
+
+def _match_value(value, condition) -> bool:
+    if isinstance(value, _Many):
+        if not value:
+            return _match_value(_MISSING, condition)
+        if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+            # negations hold for every element, the rest for any element
+            return all(
+                (all if op in ("$ne", "$nin") else any)(_match_value(v, {op: arg}) for v in value)
+                for op, arg in condition.items()
+            )
+        return any(_match_value(v, condition) for v in value)
+    if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+        for op, arg in condition.items():
+            if op == "$in":
+                if (None if value is _MISSING else value) not in arg:
+                    return False
+            elif op == "$nin":
+                if (None if value is _MISSING else value) in arg:
+                    return False
+            elif op == "$ne":
+                if (None if value is _MISSING else value) == arg:
+                    return False
+            elif op == "$exists":
+                if (value is not _MISSING) != bool(arg):
+                    return False
+            elif op in ("$lt", "$lte", "$gt", "$gte"):
+                if not _compare(value, op, arg):
+                    return False
+            else:
+                raise OperationFailure(f"memory mongo does not support {op}")
+        return True
+    if value is _MISSING:
+        return condition is None
+    return value == condition
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, q) for q in condition):
+                return False
+        else:
+            value = _get(doc, key)
+            if type(value) is list and value and not isinstance(condition, list):
+                # a condition on an array field applies to its elements
+                value = _Many(value)
+            if not _match_value(value, condition):
+                return False
+    return True
+
+
+def _project(doc: dict, projection) -> dict:
+    if not projection:
+        return _clone(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {k: 1 for k in projection}
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include:
+        out = {}
+        for path in include:
+            value = _get(doc, path)
+            if value is not _MISSING:
+                _set(out, path, _clone(value))
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+        return out
+    out = _clone(doc)
+    for path, keep in projection.items():
+        if not keep:
+            _unset(out, path)
+    return out
+
+
+def _sort_key(value):
+    # mongo orders missing/None before numbers before strings, enough for the app's sorts
+    if value is _MISSING or value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    return (2, value)
+
+
+def _sort(docs: List[dict], sort) -> List[dict]:
+    if isinstance(sort, str):
+        sort = [(sort, 1)]
+    for key, direction in reversed(list(sort)):
+        docs.sort(key=lambda d: _sort_key(_get(d, key)), reverse=direction < 0)
+    return docs
+
+
+def _upsert_seed(query: dict) -> dict:
+    # equality parts of the filter become fields of the inserted document, like the server does
+    doc = {}
+    for key, condition in query.items():
+        if key.startswith("$"):
+            continue
+        if isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+            continue
+        _set(doc, key, _clone(condition))
+    return doc
+
+
+def _value(doc: dict, path: str):
+    value = _get(doc, path)
+    return None if value is _MISSING else value
+
+
+def _max(values: list):
+    present = [v for v in values if v is not None]
+    return max(present) if present else None
+
+
+def _union(*arrays) -> list:
+    out = []
+    for array in arrays:
+        for v in array or []:
+            if v not in out:
+                out.append(v)
+    return out
+
+
+def _lt(a, b) -> bool:
+    # null sorts before everything, like the server's comparison order
+    if a is None or b is None:
+        return a is None and b is not None
+    return a < b
+
+
+# aggregation expression operators, each gets its evaluated arguments
+_EXPRESSIONS = {
+    "$add": lambda *args: sum(args),
+    "$subtract": lambda a, b: a - b,
+    "$multiply": lambda *args: math.prod(args),
+    "$eq": lambda a, b: a == b,
+    "$lt": _lt,
+    "$gt": lambda a, b: _lt(b, a),
+    "$size": lambda a: len(a),
+    "$ifNull": lambda *args: next((a for a in args if a is not None), None),
+    "$max": lambda *args: _max(args[0] if len(args) == 1 and isinstance(args[0], list) else list(args)),
+    "$setUnion": _union,
+}
+
+
+def _expr(doc: dict, expression):
+    if isinstance(expression, str) and expression.startswith("$"):
+        if expression == "$$NOW":
+            return datetime.utcnow()
+        return _value(doc, expression[1:])
+    if isinstance(expression, list):
+        return [_expr(doc, e) for e in expression]
+    if isinstance(expression, dict):
+        if len(expression) == 1:
+            op, args = next(iter(expression.items()))
+            if op == "$cond":
+                if isinstance(args, dict):
+                    args = [args["if"], args["then"], args["else"]]
+                return _expr(doc, args[1] if _expr(doc, args[0]) else args[2])
+            if op == "$literal":
+                return args
+            if op.startswith("$"):
+                if op not in _EXPRESSIONS:
+                    raise OperationFailure(f"memory mongo does not support {op}")
+                args = args if isinstance(args, list) else [args]
+                return _EXPRESSIONS[op](*(_expr(doc, a) for a in args))
+        return {k: _expr(doc, v) for k, v in expression.items()}
+    return expression
+
+
+def _apply_pipeline(doc: dict, stages: list) -> bool:
+    '''update pipeline, $set stages only, every field of a stage is computed from the document before it'''
+    before = _clone(doc)
+    for stage in stages:
+        (op, fields), = stage.items()
+        if op not in ("$set", "$addFields"):
+            raise OperationFailure(f"memory mongo does not support {op} in update pipelines")
+        values = {path: _expr(doc, e) for path, e in fields.items()}
+        for path, value in values.items():
+            _set(doc, path, value)
+    return doc != before
+
+
+def _group(docs: List[dict], spec: dict) -> List[dict]:
+    groups: Dict[Any, dict] = {}
+    accumulators = {k: v for k, v in spec.items() if k != "_id"}
+    for doc in docs:
+        key = _expr(doc, spec["_id"])
+        group = groups.get(_hashable(key))
+        if group is None:
+            group = groups[_hashable(key)] = {"_id": key, **{k: None for k in accumulators}}
+        for field, accumulator in accumulators.items():
+            (op, arg), = accumulator.items()
+            value = _expr(doc, arg)
+            if op == "$sum":
+                group[field] = (group[field] or 0) + (value if isinstance(value, (int, float)) else 0)
+            elif op == "$addToSet":
+                group[field] = _union(group[field], [value])
+            elif op in ("$max", "$min"):
+                current = group[field]
+                if value is not None and (current is None or (value > current if op == "$max" else value < current)):
+                    group[field] = value
+            else:
+                raise OperationFailure(f"memory mongo does not support {op} in $group")
+    return list(groups.values())
+
+
+def _apply_update(doc: dict, update, inserting: bool) -> bool:
+    '''applies update operators (or an update pipeline) in place, returns whether the document changed'''
+    if isinstance(update, list):
+        return _apply_pipeline(doc, update)
+    if not any(k.startswith("$") for k in update):
+        raise OperationFailure("memory mongo only supports operator updates")
+    before = _clone(doc)
+    for op, fields in update.items():
+        if op == "$set":
+            for path, value in fields.items():
+                _set(doc, path, _clone(value))
+        elif op == "$setOnInsert":
+            if inserting:
+                for path, value in fields.items():
+                    _set(doc, path, _clone(value))
+        elif op == "$inc":
+            for path, value in fields.items():
+                current = _get(doc, path)
+                _set(doc, path, (0 if current is _MISSING else current) + value)
+        elif op in ("$max", "$min"):
+            for path, value in fields.items():
+                current = _get(doc, path)
+                if current is _MISSING or current is None or (value > current if op == "$max" else value < current):
+                    _set(doc, path, _clone(value))
+        elif op == "$unset":
+            for path in fields:
+                _unset(doc, path)
+        elif op == "$push":
+            for path, value in fields.items():
+                current = _get(doc, path)
+                items = [] if current is _MISSING else list(current)
+                if isinstance(value, dict) and "$each" in value:
+                    items.extend(_clone(value["$each"]))
+                    if "$slice" in value:
+                        limit = value["$slice"]
+                        items = items[limit:] if limit < 0 else items[:limit]
+                else:
+                    items.append(_clone(value))
+                _set(doc, path, items)
+        else:
+            raise OperationFailure(f"memory mongo does not support {op}")
+    return doc != before
+
+
+class _Index:
+    '''hash index over every prefix of the keys, prefix lookups serve filters on the leading fields'''
+    def __init__(self, name: str, fields: Tuple[str, ...], unique: bool):
+        self.name = name
+        self.fields = fields
+        self.unique = unique
+        self.prefixes: List[Dict[tuple, set]] = [{} for _ in fields]
+
+    def key(self, doc: dict, length: int) -> tuple:
+        return tuple(_hashable(None if (v := _get(doc, f)) is _MISSING else v) for f in self.fields[:length])
+
+    def add(self, doc: dict):
+        for length, table in enumerate(self.prefixes, 1):
+            table.setdefault(self.key(doc, length), set()).add(doc["_id"])
+
+    def remove(self, doc: dict):
+        for length, table in enumerate(self.prefixes, 1):
+            key = self.key(doc, length)
+            ids = table.get(key)
+            if ids is not None:
+                ids.discard(doc["_id"])
+                if not ids:
+                    del table[key]
+
+    def conflicts(self, doc: dict) -> bool:
+        ids = self.prefixes[-1].get(self.key(doc, len(self.fields)))
+        return bool(ids) and (len(ids) > 1 or doc["_id"] not in ids)
+
+
+class _CollectionData:
+    def __init__(self, name: str, options: Optional[dict] = None):
+        self.name = name
+        self.options = options or {}
+        self.docs: Dict[Any, dict] = {}
+        self.indexes: Dict[str, _Index] = {}
+
+    def candidates(self, query: dict):
+        '''ids worth checking against the filter, the smallest index hit or every document'''
+        _id = query.get("_id", _MISSING)
+        if _id is not _MISSING and not isinstance(_id, dict):
+            return [_id] if _id in self.docs else []
+
+        equal = {k: v for k, v in query.items()
+                 if not k.startswith("$") and not (isinstance(v, dict) and any(x.startswith("$") for x in v))}
+        best = None
+        for index in self.indexes.values():
+            length = 0
+            while length < len(index.fields) and index.fields[length] in equal:
+                length += 1
+            if not length:
+                continue
+            key = tuple(_hashable(equal[f]) for f in index.fields[:length])
+            ids = index.prefixes[length - 1].get(key, ())
+            if best is None or len(ids) < len(best):
+                best = ids
+        return list(best) if best is not None else list(self.docs)
+
+    def find(self, query: dict) -> List[dict]:
+        docs = self.docs
+        return [docs[i] for i in self.candidates(query) if i in docs and matches(docs[i], query)]
+
+    def insert(self, doc: dict):
+        doc.setdefault("_id", ObjectId())
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_")
+        for index in self.indexes.values():
+            if index.unique and index.prefixes[-1].get(index.key(doc, len(index.fields))):
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {index.name}")
+        self.docs[doc["_id"]] = doc
+        for index in self.indexes.values():
+            index.add(doc)
+
+    def replace(self, old: dict, new: dict):
+        for index in self.indexes.values():
+            index.remove(old)
+        for index in self.indexes.values():
+            index.add(new)
+            if index.unique and index.conflicts(new):
+                for rollback in self.indexes.values():
+                    rollback.remove(new)
+                    rollback.add(old)
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {index.name}")
+        self.docs[new["_id"]] = new
+
+    def delete(self, doc: dict):
+        for index in self.indexes.values():
+            index.remove(doc)
+        del self.docs[doc["_id"]]
+
+
+class MemoryStore:
+    '''every collection of one database, one lock, the api loop and worker threads share it'''
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.collections: Dict[str, _CollectionData] = {}
+
+    def collection(self, name: str) -> _CollectionData:
+        data = self.collections.get(name)
+        if data is None:
+            data = self.collections[name] = _CollectionData(name)
+        return data
+
+
+class MemoryCursor:
+    '''runs the query on first iteration, sort / skip / limit chain like pymongo cursors'''
+    def __init__(self, collection: "MemoryCollection", query: dict, projection=None, sort=None,
+                 skip: int = 0, limit: int = 0):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort = sort
+        self._skip = skip
+        self._limit = limit
+        self._results: Optional[List[dict]] = None
+
+    def sort(self, key, direction=None):
+        self._sort = [(key, direction or 1)] if isinstance(key, str) else key
+        return self
+
+    def skip(self, n: int):
+        self._skip = n
+        return self
+
+    def limit(self, n: int):
+        self._limit = n
+        return self
+
+    def batch_size(self, n: int):
+        return self
+
+    def _run(self) -> List[dict]:
+        if self._results is None:
+            store = self._collection._store
+            with store.lock:
+                docs = store.collection(self._collection.name).find(self._query)
+                if self._sort:
+                    docs = _sort(docs, self._sort)
+                docs = docs[self._skip:]
+                if self._limit:
+                    docs = docs[:self._limit]
+                self._results = [_project(d, self._projection) for d in docs]
+        return self._results
+
+    def __iter__(self):
+        return iter(self._run())
+
+    def __aiter__(self):
+        self._iter = iter(self._run())
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        results = self._run()
+        return list(islice(results, length)) if length else list(results)
+
+
+class MemoryCollection:
+    '''blocking api, same method names and results as pymongo's Collection'''
+    def __init__(self, store: MemoryStore, name: str):
+        self._store = store
+        self.name = name
+
+    def with_options(self, **options):
+        return self
+
+    def create_index(self, keys, name: Optional[str] = None, unique: bool = False, **options) -> str:
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        fields = tuple(k for k, _ in keys)
+        name = name or "_".join(f"{k}_{d}" for k, d in keys)
+        with self._store.lock:
+            data = self._store.collection(self.name)
+            if name not in data.indexes:
+                index = data.indexes[name] = _Index(name, fields, unique)
+                for doc in data.docs.values():
+                    index.add(doc)
+        return name
+
+    def drop_index(self, name: str):
+        with self._store.lock:
+            if self._store.collection(self.name).indexes.pop(name, None) is None:
+                raise OperationFailure(f"index not found with name [{name}]", code=27)
+
+    def find(self, filter: Optional[dict] = None, projection=None, sort=None, skip: int = 0, limit: int = 0,
+             **options) -> MemoryCursor:
+        return MemoryCursor(self, filter or {}, projection, sort, skip, limit)
+
+    def find_one(self, filter: Optional[dict] = None, projection=None, sort=None, **options) -> Optional[dict]:
+        results = MemoryCursor(self, filter or {}, projection, sort, limit=1)._run()
+        return results[0] if results else None
+
+    def count_documents(self, filter: dict, **options) -> int:
+        with self._store.lock:
+            return len(self._store.collection(self.name).find(filter))
+
+    def aggregate(self, pipeline: list, **options) -> MemoryCursor:
+        with self._store.lock:
+            docs = [_clone(d) for d in self._store.collection(self.name).find(
+                pipeline[0]["$match"] if pipeline and "$match" in pipeline[0] else {})]
+        for i, stage in enumerate(pipeline):
+            (op, arg), = stage.items()
+            if op == "$match":
+                if i:
+                    docs = [d for d in docs if matches(d, arg)]
+            elif op == "$group":
+                docs = _group(docs, arg)
+            elif op == "$sort":
+                docs = _sort(docs, list(arg.items()))
+            elif op == "$limit":
+                docs = docs[:arg]
+            else:
+                raise OperationFailure(f"memory mongo does not support {op}")
+        cursor = MemoryCursor(self, {})
+        cursor._results = docs
+        return cursor
+
+    def insert_one(self, document: dict, **options) -> InsertOneResult:
+        with self._store.lock:
+            doc = _clone(document)
+            self._store.collection(self.name).insert(doc)
+        document.setdefault("_id", doc["_id"])
+        return InsertOneResult(doc["_id"], True)
+
+    def insert_many(self, documents: List[dict], ordered: bool = True, **options) -> InsertManyResult:
+        # like the driver, every document gets its _id before the write and failures come back as BulkWriteError
+        ids, errors = [], []
+        with self._store.lock:
+            data = self._store.collection(self.name)
+            for i, document in enumerate(documents):
+                document.setdefault("_id", ObjectId())
+                try:
+                    data.insert(_clone(document))
+                except DuplicateKeyError as e:
+                    errors.append({"index": i, "code": 11000, "errmsg": str(e), "op": document})
+                    if ordered:
+                        break
+                    continue
+                ids.append(document["_id"])
+        if errors:
+            raise BulkWriteError({"nInserted": len(ids), "nUpserted": 0, "nMatched": 0, "nModified": 0,
+                                  "nRemoved": 0, "upserted": [], "writeErrors": errors})
+        return InsertManyResult(ids, True)
+
+    def _update(self, filter: dict, update: dict, upsert: bool, multi: bool) -> Tuple[dict, Optional[dict], Optional[dict]]:
+        '''returns (raw result, document before, document after) of the first touched document'''
+        data = self._store.collection(self.name)
+        found = data.find(filter)
+        if not multi:
+            found = found[:1]
+        if not found:
+            if not upsert:
+                return {"n": 0, "nModified": 0}, None, None
+            doc = _upsert_seed(filter)
+            _apply_update(doc, update, inserting=True)
+            data.insert(doc)
+            return {"n": 1, "nModified": 0, "upserted": doc["_id"]}, None, doc
+        modified, first = 0, None
+        for old in found:
+            new = _clone(old)
+            if _apply_update(new, update, inserting=False):
+                data.replace(old, new)
+                modified += 1
+            first = first or (old, new)
+        return {"n": len(found), "nModified": modified}, first[0], first[1]
+
+    def _replace(self, filter: dict, replacement: dict, upsert: bool) -> dict:
+        data = self._store.collection(self.name)
+        found = data.find(filter)[:1]
+        if not found:
+            if not upsert:
+                return {"n": 0, "nModified": 0}
+            doc = {**_upsert_seed(filter), **_clone(replacement)}
+            data.insert(doc)
+            return {"n": 1, "nModified": 0, "upserted": doc["_id"]}
+        old = found[0]
+        new = {**_clone(replacement), "_id": old["_id"]}
+        data.replace(old, new)
+        return {"n": 1, "nModified": int(new != old)}
+
+    def replace_one(self, filter: dict, replacement: dict, upsert: bool = False, **options) -> UpdateResult:
+        with self._store.lock:
+            raw = self._replace(filter, replacement, upsert)
+        return UpdateResult(raw, True)
+
+    def update_one(self, filter: dict, update: dict, upsert: bool = False, **options) -> UpdateResult:
+        with self._store.lock:
+            raw, _, _ = self._update(filter, update, upsert, multi=False)
+        return UpdateResult(raw, True)
+
+    def update_many(self, filter: dict, update: dict, upsert: bool = False, **options) -> UpdateResult:
+        with self._store.lock:
+            raw, _, _ = self._update(filter, update, upsert, multi=True)
+        return UpdateResult(raw, True)
+
+    def find_one_and_update(self, filter: dict, update: dict, projection=None, sort=None, upsert: bool = False,
+                            return_document=ReturnDocument.BEFORE, **options) -> Optional[dict]:
+        with self._store.lock:
+            if sort:
+                found = _sort(self._store.collection(self.name).find(filter), sort)
+                if found:
+                    filter = {"_id": found[0]["_id"]}
+            _, before, after = self._update(filter, update, upsert, multi=False)
+            doc = after if return_document == ReturnDocument.AFTER else before
+            return _project(doc, projection) if doc is not None else None
+
+    def delete_one(self, filter: dict, **options) -> DeleteResult:
+        with self._store.lock:
+            data = self._store.collection(self.name)
+            found = data.find(filter)[:1]
+            for doc in found:
+                data.delete(doc)
+        return DeleteResult({"n": len(found)}, True)
+
+    def delete_many(self, filter: dict, **options) -> DeleteResult:
+        with self._store.lock:
+            data = self._store.collection(self.name)
+            found = data.find(filter)
+            for doc in found:
+                data.delete(doc)
+        return DeleteResult({"n": len(found)}, True)
+
+    def bulk_write(self, requests: list, ordered: bool = True, **options) -> BulkWriteResult:
+        # pymongo's operation objects keep their arguments in slots, read them the same way the driver does
+        result = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [],
+                  "writeErrors": []}
+        with self._store.lock:
+            for i, request in enumerate(requests):
+                try:
+                    self._bulk_one(i, request, result)
+                except DuplicateKeyError as e:
+                    # like the server, unordered keeps going, ordered stops at the first error
+                    result["writeErrors"].append({"index": i, "code": 11000, "errmsg": str(e), "op": request._doc})
+                    if ordered:
+                        break
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        del result["writeErrors"]
+        return BulkWriteResult(result, True)
+
+    def _bulk_one(self, i: int, request, result: dict):
+        kind = type(request).__name__
+        if kind == "InsertOne":
+            self.insert_one(request._doc)
+            result["nInserted"] += 1
+        elif kind in ("UpdateOne", "UpdateMany"):
+            raw, _, _ = self._update(request._filter, request._doc, request._upsert, multi=kind == "UpdateMany")
+            if "upserted" in raw:
+                result["nUpserted"] += 1
+                result["upserted"].append({"index": i, "_id": raw["upserted"]})
+            else:
+                result["nMatched"] += raw["n"]
+                result["nModified"] += raw["nModified"]
+        elif kind == "ReplaceOne":
+            raw = self._replace(request._filter, request._doc, request._upsert)
+            if "upserted" in raw:
+                result["nUpserted"] += 1
+                result["upserted"].append({"index": i, "_id": raw["upserted"]})
+            else:
+                result["nMatched"] += raw["n"]
+                result["nModified"] += raw["nModified"]
+        elif kind in ("DeleteOne", "DeleteMany"):
+            deleted = (self.delete_one if kind == "DeleteOne" else self.delete_many)(request._filter)
+            result["nRemoved"] += deleted.deleted_count
+        else:
+            raise OperationFailure(f"memory mongo does not support {kind}")
+
+
+class MemoryDatabase:
+    def __init__(self, store: MemoryStore, name: str = "memory"):
+        self._store = store
+        self.name = name
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        return MemoryCollection(self._store, name)
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def with_options(self, **options):
+        return self
+
+    def create_collection(self, name: str, **options) -> MemoryCollection:
+        with self._store.lock:
+            if name in self._store.collections:
+                raise CollectionInvalid(f"collection {name} already exists")
+            self._store.collections[name] = _CollectionData(name, options)
+        return self[name]
+
+    def list_collection_names(self) -> List[str]:
+        with self._store.lock:
+            return list(self._store.collections)
+
+
+def _awaitable(name: str):
+    def method(self, *args, **kwargs):
+        async def call():
+            return getattr(self._sync, name)(*args, **kwargs)
+        return call()
+    method.__name__ = name
+    return method
+
+
+class AsyncMemoryCollection:
+    '''async api over the same store, operations finish without yielding like a very fast server'''
+    def __init__(self, store: MemoryStore, name: str):
+        self._sync = MemoryCollection(store, name)
+        self.name = name
+
+    def with_options(self, **options):
+        return self
+
+    def find(self, *args, **kwargs) -> MemoryCursor:
+        # like AsyncCollection.find, returns the cursor without awaiting
+        return self._sync.find(*args, **kwargs)
+
+    create_index = _awaitable("create_index")
+    drop_index = _awaitable("drop_index")
+    find_one = _awaitable("find_one")
+    count_documents = _awaitable("count_documents")
+    aggregate = _awaitable("aggregate")
+    insert_one = _awaitable("insert_one")
+    insert_many = _awaitable("insert_many")
+    update_one = _awaitable("update_one")
+    update_many = _awaitable("update_many")
+    replace_one = _awaitable("replace_one")
+    find_one_and_update = _awaitable("find_one_and_update")
+    delete_one = _awaitable("delete_one")
+    delete_many = _awaitable("delete_many")
+    bulk_write = _awaitable("bulk_write")
+
+
+class AsyncMemoryDatabase:
+    def __init__(self, store: MemoryStore, name: str = "memory"):
+        self._store = store
+        self._sync = MemoryDatabase(store, name)
+        self.name = name
+
+    def __getitem__(self, name: str) -> AsyncMemoryCollection:
+        return AsyncMemoryCollection(self._store, name)
+
+    def __getattr__(self, name: str) -> AsyncMemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def with_options(self, **options):
+        return self
+
+    async def create_collection(self, name: str, **options) -> AsyncMemoryCollection:
+        self._sync.create_collection(name, **options)
+        return self[name]
+
+    async def list_collection_names(self) -> List[str]:
+        return self._sync.list_collection_names()
@@ -0,0 +1,173 @@
+'''
+Local cache of a worker deployment and its pods, fed by Kubernetes watch streams.
+
+Replaces read_namespaced_deployment / list_namespaced_pod calls on every scaling cycle: the cache
+lists once, then follows watch events, and only relists when the watch resource version expires (410 Gone).
+Watches run in daemon threads (the kubernetes client is blocking), readers take a lock and never do I/O.
+'''
+
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+
+class ClusterStateCache:
+    """Deployment spec and pods of one deployment, kept current by watch streams"""
+
+    def __init__(self, apps_v1, core_v1, namespace: str, deployment_name: str,
+                 logger: Optional[logging.Logger] = None, watch_timeout_seconds: int = 300):
+        self.apps_v1 = apps_v1
+        self.core_v1 = core_v1
+        self.namespace = namespace
+        self.deployment_name = deployment_name
+        self.logger = logger or logging.getLogger(__name__)
+        self.watch_timeout_seconds = watch_timeout_seconds
+
+        self._lock = threading.Lock()
+        self._deployment: Optional[Any] = None
+        self._pods: Dict[str, Any] = {}
+        self._deployment_synced = threading.Event()
+        self._pods_synced = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        """Start the deployment and pod watch threads"""
+        if self._threads:
+            return
+        for target, name in ((self._watch_deployment, 'deployment'), (self._watch_pods, 'pods')):
+            thread = threading.Thread(target=target, name=f"watch-{self.deployment_name}-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def wait_synced(self, timeout: float) -> bool:
+        """Block until the initial list of both deployment and pods is loaded"""
+        return self._deployment_synced.wait(timeout) and self._pods_synced.wait(timeout)
+
+    @property
+    def synced(self) -> bool:
+        return self._deployment_synced.is_set() and self._pods_synced.is_set()
+
+    # readers
+
+    def current_replicas(self) -> Optional[int]:
+        with self._lock:
+            return self._deployment.spec.replicas if self._deployment is not None else None
+
+    def running_pods(self) -> List[Any]:
+        with self._lock:
+            return [
+                pod for pod in self._pods.values()
+                if pod.status.phase == 'Running' and pod.metadata.deletion_timestamp is None
+            ]
+
+    def note_scaled(self, replicas: int) -> None:
+        """Apply our own scale patch locally until the watch event confirms it"""
+        with self._lock:
+            if self._deployment is not None:
+                self._deployment.spec.replicas = replicas
+
+    def note_pod_deleted(self, pod_name: str) -> None:
+        with self._lock:
+            self._pods.pop(pod_name, None)
+
+    # watch loops
+
+    def _label_selector(self) -> Optional[str]:
+        with self._lock:
+            deployment = self._deployment
+        if deployment is None or not deployment.spec.selector.match_labels:
+            return None
+        return ','.join(f"{k}={v}" for k, v in deployment.spec.selector.match_labels.items())
+
+    def _watch_deployment(self) -> None:
+        field_selector = f"metadata.name={self.deployment_name}"
+        resource_version = None
+        while not self._stop.is_set():
+            try:
+                if resource_version is None:
+                    listing = self.apps_v1.list_namespaced_deployment(self.namespace, field_selector=field_selector)
+                    with self._lock:
+                        self._deployment = listing.items[0] if listing.items else None
+                    resource_version = listing.metadata.resource_version
+                    self._deployment_synced.set()
+
+                stream = watch.Watch().stream(
+                    self.apps_v1.list_namespaced_deployment,
+                    self.namespace,
+                    field_selector=field_selector,
+                    resource_version=resource_version,
+                    timeout_seconds=self.watch_timeout_seconds
+                )
+                for event in stream:
+                    if self._stop.is_set():
+                        return
+                    obj = event['object']
+                    with self._lock:
+                        self._deployment = None if event['type'] == 'DELETED' else obj
+                    resource_version = obj.metadata.resource_version
+            except ApiException as e:
+                if e.status == 410:
+                    # history expired, relist
+                    resource_version = None
+                    continue
+                self.logger.error(f"Kubernetes API error watching deployment {self.deployment_name}: {e}")
+                self._stop.wait(5)
+            except Exception as e:
+                self.logger.error(f"Unexpected error watching deployment {self.deployment_name}: {e}")
+                resource_version = None
+                self._stop.wait(5)
+
+    def _watch_pods(self) -> None:
+        resource_version = None
+        while not self._stop.is_set():
+            # pods are found through the deployment's selector, wait for the first deployment list
+            if not self._deployment_synced.wait(1):
+                continue
+            label_selector = self._label_selector()
+            if label_selector is None:
+                self.logger.warning(f"No match labels found for deployment {self.deployment_name}")
+                self._stop.wait(5)
+                continue
+
+            try:
+                if resource_version is None:
+                    listing = self.core_v1.list_namespaced_pod(self.namespace, label_selector=label_selector)
+                    with self._lock:
+                        self._pods = {pod.metadata.name: pod for pod in listing.items}
+                    resource_version = listing.metadata.resource_version
+                    self._pods_synced.set()
+
+                stream = watch.Watch().stream(
+                    self.core_v1.list_namespaced_pod,
+                    self.namespace,
+                    label_selector=label_selector,
+                    resource_version=resource_version,
+                    timeout_seconds=self.watch_timeout_seconds
+                )
+                for event in stream:
+                    if self._stop.is_set():
+                        return
+                    pod = event['object']
+                    with self._lock:
+                        if event['type'] == 'DELETED':
+                            self._pods.pop(pod.metadata.name, None)
+                        else:
+                            self._pods[pod.metadata.name] = pod
+                    resource_version = pod.metadata.resource_version
+            except ApiException as e:
+                if e.status == 410:
+                    resource_version = None
+                    continue
+                self.logger.error(f"Kubernetes API error watching pods of {self.deployment_name}: {e}")
+                self._stop.wait(5)
+            except Exception as e:
+                self.logger.error(f"Unexpected error watching pods of {self.deployment_name}: {e}")
+                resource_version = None
+                self._stop.wait(5)
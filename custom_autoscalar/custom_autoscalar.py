@@ -5,13 +5,12 @@ Its one more tool in a group, aiding in scalability
 
 import os
 import time
-import json
+import asyncio
 import logging
 import signal
 import sys
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
-from dataclasses import dataclass
 
 import requests
 import kubernetes
@@ -20,61 +19,30 @@ from kubernetes.client.rest import ApiException
 from omf_backend.constants import config
 from omf_worker.worker import app
 
-
-@dataclass
-class ScalingConfig:
-    """Configuration for the scaler"""
-    threshold: int
-    min_replicas: int
-    max_replicas: int
-    check_interval: int
-    scale_up_cooldown: int
-    scale_down_cooldown: int
-    deployment_name: str
-    queue_name: str
-    scale_up_factor: float = 1.0
-    scale_down_factor: float = 1.0
-    grace_period_seconds: int = 30
-    
-    @classmethod
-    def from_env(cls) -> 'ScalingConfig':
-        """Load configuration from environment variables"""
-        try:
-            return cls(
-                threshold=int(os.getenv('THRESHOLD', 6)),
-                min_replicas=int(os.getenv('MIN_REPLICAS', 3)),
-                max_replicas=int(os.getenv('MAX_REPLICAS', 10)),
-                check_interval=int(os.getenv('CHECK_INTERVAL', 5)),
-                scale_up_cooldown=int(os.getenv('SCALE_UP_COOLDOWN', 5)),
-                scale_down_cooldown=int(os.getenv('SCALE_DOWN_COOLDOWN', 60)),
-                deployment_name=os.getenv('DEPLOYMENT_NAME'),
-                queue_name=os.getenv('QUEUE_NAME'),
-                scale_up_factor=float(os.getenv('SCALE_UP_FACTOR', 1.0)),
-                scale_down_factor=float(os.getenv('SCALE_DOWN_FACTOR', 1.0)),
-                grace_period_seconds=int(os.getenv('GRACE_PERIOD_SECONDS', 30))
-            )
-        except (ValueError, TypeError) as e:
-            raise RuntimeError(f"Invalid configuration: {e}")
-    
-    def validate(self) -> None:
-        """Validate configuration values"""
-        if not self.deployment_name:
-            raise ValueError("DEPLOYMENT_NAME is required")
-        if not self.queue_name:
-            raise ValueError("QUEUE_NAME is required")
-        if self.min_replicas < 1:
-            raise ValueError("MIN_REPLICAS must be at least 1")
-        if self.max_replicas < self.min_replicas:
-            raise ValueError("MAX_REPLICAS must be greater than or equal to MIN_REPLICAS")
-        if self.threshold < 1:
-            raise ValueError("THRESHOLD must be at least 1")
+from custom_autoscalar.policies import ScalingPolicy
+from custom_autoscalar.scaling_config import ScalingConfig, budget_from_env
+from custom_autoscalar.worker_activity import WorkerActivityTracker
+from custom_autoscalar.cluster_state import ClusterStateCache
+from custom_autoscalar.broker import BrokerClient
+from custom_autoscalar.pools import ScalingDecision, ScalingPool, ReplicaBudget, apply_budget
+from custom_autoscalar.schedule import TestSchedule
+from custom_autoscalar.telemetry import ScalerMetrics, TelemetryServer
 
 
 class CeleryScaler:
-    def __init__(self):
-        self.last_scale_up_time = 0
-        self.last_scale_down_time = 0
+    def __init__(self, scaling_config: Optional[ScalingConfig] = None, apps_v1=None, core_v1=None,
+                 namespace: Optional[str] = None, celery_app=None, install_signal_handlers: bool = True,
+                 pool_configs: Optional[List[ScalingConfig]] = None, budget: Optional[ReplicaBudget] = None):
+        """
+        Everything defaults to the in-cluster setup, pass the clients/config explicitly to run
+        against fake broker and API servers (eg. an ApiClient whose Configuration.host points at a stub)
+        
+        scaling_config manages a single pool, pool_configs several from one loop. Loop wide settings
+        (check interval, broker url, celery events, watch cache) are taken from the first pool.
+        """
         self.shutdown_requested = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop_event: Optional[asyncio.Event] = None
         
         # Setup logging
         logging.basicConfig(
@@ -84,29 +52,123 @@ class CeleryScaler:
         self.logger = logging.getLogger(__name__)
         
         # Initialize Kubernetes client
-        try:
-            kubernetes.config.load_incluster_config()
-            self.apps_v1 = kubernetes.client.AppsV1Api()
-            self.core_v1 = kubernetes.client.CoreV1Api()
-        except Exception as e:
-            self.logger.error(f"Failed to initialize Kubernetes client: {e}")
-            raise
+        if apps_v1 is None or core_v1 is None:
+            try:
+                kubernetes.config.load_incluster_config()
+                apps_v1 = apps_v1 or kubernetes.client.AppsV1Api()
+                core_v1 = core_v1 or kubernetes.client.CoreV1Api()
+            except Exception as e:
+                self.logger.error(f"Failed to initialize Kubernetes client: {e}")
+                raise
+        self.apps_v1 = apps_v1
+        self.core_v1 = core_v1
+        
+        self.namespace = namespace or self._get_current_namespace()
+        if scaling_config is not None:
+            pool_configs = [scaling_config]
+        elif pool_configs is None:
+            pool_configs = ScalingConfig.pools_from_env()
+        for pool_config in pool_configs:
+            pool_config.validate()
+        deployment_names = [c.deployment_name for c in pool_configs]
+        if len(set(deployment_names)) != len(deployment_names):
+            raise ValueError("Each pool must manage a different deployment")
+        
+        self.scaling_config = pool_configs[0]
+        self.budget = budget or budget_from_env()
+        # one schedule reader shared by every schedule aware pool
+        self.schedule: Optional[TestSchedule] = None
+        scheduled = [c for c in pool_configs if c.schedule_aware]
+        if scheduled:
+            self.schedule = TestSchedule(
+                scheduled[0].schedule_mongo_url,
+                scheduled[0].schedule_db_name,
+                lookbehind_seconds=max(c.prescale_max_hold_seconds for c in scheduled),
+                evaluation_delay_seconds=scheduled[0].evaluation_delay_seconds,
+                tasks_per_test=scheduled[0].tasks_per_test,
+                logger=self.logger
+            )
+            self.schedule.start()
+        
+        self.pools = [
+            ScalingPool(c, ClusterStateCache(self.apps_v1, self.core_v1, self.namespace, c.deployment_name, self.logger),
+                        schedule=self.schedule)
+            for c in pool_configs
+        ]
+        self._pools_by_deployment = {pool.name: pool for pool in self.pools}
+        
+        self.worker_activity = WorkerActivityTracker(celery_app or app, self.logger)
+        if self.scaling_config.use_celery_events:
+            self.worker_activity.start_event_consumer()
         
-        self.namespace = self._get_current_namespace()
-        self.scaling_config = ScalingConfig.from_env()
-        self.scaling_config.validate()
+        if self.scaling_config.use_watch_cache:
+            for pool in self.pools:
+                pool.cluster_state.start()
+        
+        # pooled connection for the sync loop, the async loop uses BrokerClient
+        self.http = requests.Session()
+        
+        self.metrics = ScalerMetrics(self.scaling_config.decision_history)
+        self.telemetry: Optional[TelemetryServer] = None
+        if self.scaling_config.metrics_port:
+            # unhealthy after a few missed cycles, a long graceful scale down fits in the margin
+            self.telemetry = TelemetryServer(
+                self.metrics, self.scaling_config.metrics_port,
+                max_cycle_age=max(60, 5 * self.scaling_config.check_interval), logger=self.logger
+            )
+            self.telemetry.start()
         
         # Setup signal handlers for graceful shutdown
-        signal.signal(signal.SIGTERM, self._signal_handler)
-        signal.signal(signal.SIGINT, self._signal_handler)
+        if install_signal_handlers:
+            signal.signal(signal.SIGTERM, self._signal_handler)
+            signal.signal(signal.SIGINT, self._signal_handler)
         
-        self.logger.info(f"Initialized scaler for deployment '{self.scaling_config.deployment_name}' "
-                        f"in namespace '{self.namespace}'")
+        for pool in self.pools:
+            self.logger.info(f"Initialized scaler for deployment '{pool.name}' (queues {pool.queues}) "
+                            f"in namespace '{self.namespace}' with '{pool.policy.name}' policy")
+    
+    # single pool view, kept for callers that drive one deployment
+    
+    @property
+    def policy(self) -> ScalingPolicy:
+        return self.pools[0].policy
+    
+    @property
+    def cluster_state(self) -> ClusterStateCache:
+        return self.pools[0].cluster_state
+    
+    @property
+    def last_scale_up_time(self) -> float:
+        return self.pools[0].last_scale_up_time
+    
+    @last_scale_up_time.setter
+    def last_scale_up_time(self, value: float) -> None:
+        self.pools[0].last_scale_up_time = value
+    
+    @property
+    def last_scale_down_time(self) -> float:
+        return self.pools[0].last_scale_down_time
+    
+    @last_scale_down_time.setter
+    def last_scale_down_time(self, value: float) -> None:
+        self.pools[0].last_scale_down_time = value
+    
+    def _pool(self, deployment_name: str) -> Optional[ScalingPool]:
+        return self._pools_by_deployment.get(deployment_name)
         
     def _signal_handler(self, signum, frame):
         """Handle shutdown signals"""
         self.logger.info(f"Received signal {signum}, initiating graceful shutdown...")
         self.shutdown_requested = True
+        self.worker_activity.stop()
+        for pool in self.pools:
+            pool.cluster_state.stop()
+        if self.schedule is not None:
+            self.schedule.stop()
+        if self.telemetry is not None:
+            self.telemetry.stop()
+        if self._loop is not None and self._stop_event is not None:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
         
     def _get_current_namespace(self) -> str:
         """Get the current Kubernetes namespace"""
@@ -122,11 +184,15 @@ class CeleryScaler:
     
     def get_celery_worker_pods(self, deployment_name: str) -> List[Any]:
         """Get all running pods for a Celery worker deployment"""
+        pool = self._pool(deployment_name)
+        if pool is not None and pool.cluster_state.synced:
+            return pool.cluster_state.running_pods()
         try:
-            deployment = self.apps_v1.read_namespaced_deployment(
-                name=deployment_name, 
-                namespace=self.namespace
-            )
+            with self.metrics.kubernetes('read_deployment'):
+                deployment = self.apps_v1.read_namespaced_deployment(
+                    name=deployment_name, 
+                    namespace=self.namespace
+                )
             
             if not deployment.spec.selector.match_labels:
                 self.logger.warning(f"No match labels found for deployment {deployment_name}")
@@ -136,10 +202,11 @@ class CeleryScaler:
                 f"{k}={v}" for k, v in deployment.spec.selector.match_labels.items()
             ])
             
-            pods = self.core_v1.list_namespaced_pod(
-                namespace=self.namespace,
-                label_selector=label_selector
-            )
+            with self.metrics.kubernetes('list_pods'):
+                pods = self.core_v1.list_namespaced_pod(
+                    namespace=self.namespace,
+                    label_selector=label_selector
+                )
             
             running_pods = [
                 pod for pod in pods.items 
@@ -158,42 +225,18 @@ class CeleryScaler:
             return []
     
     def is_pod_idle(self, pod: Any) -> bool:
-        """Check if a pod is idle (no active tasks)"""
-        try:
-            pod_name = pod.metadata.name
-            inspect = app.control.inspect()
-            
-            # Check if inspect is available
-            if not inspect:
-                self.logger.warning("Celery inspect not available")
-                return False
-            
-            # Get active tasks
-            active_tasks = inspect.active()
-            
-            if not active_tasks:
-                self.logger.debug(f"No active tasks data available for pod {pod_name}")
-                return False
-            
-            # Check for tasks on this specific worker
-            worker_name = f"celery@{pod_name}"
-            
-            if worker_name in active_tasks:
-                task_count = len(active_tasks[worker_name])
-                self.logger.debug(f"Pod {pod_name} has {task_count} active tasks")
-                return task_count == 0
-            else:
-                # Worker not found in active tasks - might be idle or disconnected
-                self.logger.debug(f"Worker {worker_name} not found in active tasks")
-                return True
-                
-        except Exception as e:
-            self.logger.error(f"Error checking tasks for pod {pod_name}: {e}")
-            # On error, assume pod is busy to be safe
-            return False
+        """Check if a pod is idle (no active tasks), in-memory lookup on the worker activity tracker"""
+        worker_name = f"celery@{pod.metadata.name}"
+        idle = self.worker_activity.is_idle(worker_name)
+        self.logger.debug(f"Pod {pod.metadata.name} idle: {idle}")
+        return idle
     
     def delete_idle_pods(self, deployment_name: str, target_replicas: int) -> int:
         """Delete idle pods to reach target replica count"""
+        with self.metrics.timer('celery_scaler_idle_scan_seconds', deployment=deployment_name):
+            return self._delete_idle_pods(deployment_name, target_replicas)
+    
+    def _delete_idle_pods(self, deployment_name: str, target_replicas: int) -> int:
         try:
             pods = self.get_celery_worker_pods(deployment_name)
             current_count = len(pods)
@@ -205,29 +248,40 @@ class CeleryScaler:
             pods_to_remove = current_count - target_replicas
             self.logger.info(f"Need to remove {pods_to_remove} pods to reach target of {target_replicas}")
             
-            # Sort by creation time (newest first) to remove newer pods first
-            pods.sort(key=lambda p: p.metadata.creation_timestamp, reverse=True)
+            pool = self._pool(deployment_name)
+            config = pool.config if pool is not None else self.scaling_config
             
-            removed_count = 0
+            # at most one inspect broadcast for the whole scan, none when celery events are flowing
+            self.worker_activity.refresh(max_age=self.scaling_config.check_interval)
+            
+            idle_pods = []
             for pod in pods:
-                if removed_count >= pods_to_remove:
-                    break
-                
                 if self.is_pod_idle(pod):
-                    try:
-                        self.logger.info(f"Removing idle pod: {pod.metadata.name}")
+                    idle_pods.append(pod)
+                else:
+                    self.logger.info(f"Pod {pod.metadata.name} is busy, skipping")
+            
+            # longest idle first, newest pod first among equally idle ones
+            idle_pods.sort(key=lambda p: p.metadata.creation_timestamp, reverse=True)
+            idle_pods.sort(key=lambda p: self.worker_activity.idle_seconds(f"celery@{p.metadata.name}"), reverse=True)
+            
+            removed_count = 0
+            for pod in idle_pods[:pods_to_remove]:
+                try:
+                    self.logger.info(f"Removing idle pod: {pod.metadata.name}")
+                    with self.metrics.kubernetes('delete_pod'):
                         self.core_v1.delete_namespaced_pod(
                             name=pod.metadata.name,
                             namespace=self.namespace,
-                            grace_period_seconds=self.scaling_config.grace_period_seconds
+                            grace_period_seconds=config.grace_period_seconds
                         )
-                        removed_count += 1
-                    except ApiException as e:
-                        self.logger.error(f"Kubernetes API error deleting pod {pod.metadata.name}: {e}")
-                    except Exception as e:
-                        self.logger.error(f"Unexpected error deleting pod {pod.metadata.name}: {e}")
-                else:
-                    self.logger.info(f"Pod {pod.metadata.name} is busy, skipping")
+                    if pool is not None:
+                        pool.cluster_state.note_pod_deleted(pod.metadata.name)
+                    removed_count += 1
+                except ApiException as e:
+                    self.logger.error(f"Kubernetes API error deleting pod {pod.metadata.name}: {e}")
+                except Exception as e:
+                    self.logger.error(f"Unexpected error deleting pod {pod.metadata.name}: {e}")
             
             final_count = current_count - removed_count
             self.logger.info(f"Removed {removed_count} pods, expected final count: {final_count}")
@@ -239,11 +293,15 @@ class CeleryScaler:
     
     def get_current_replicas(self, deployment_name: str) -> Optional[int]:
         """Get current replica count for deployment"""
+        pool = self._pool(deployment_name)
+        if pool is not None and pool.cluster_state.synced:
+            return pool.cluster_state.current_replicas()
         try:
-            deployment = self.apps_v1.read_namespaced_deployment(
-                name=deployment_name, 
-                namespace=self.namespace
-            )
+            with self.metrics.kubernetes('read_deployment'):
+                deployment = self.apps_v1.read_namespaced_deployment(
+                    name=deployment_name, 
+                    namespace=self.namespace
+                )
             return deployment.spec.replicas
         except ApiException as e:
             self.logger.error(f"Kubernetes API error getting current replicas: {e}")
@@ -252,14 +310,21 @@ class CeleryScaler:
             self.logger.error(f"Unexpected error getting current replicas: {e}")
             return None
     
+    def _note_scaled(self, deployment_name: str, replicas: int) -> None:
+        pool = self._pool(deployment_name)
+        if pool is not None:
+            pool.cluster_state.note_scaled(replicas)
+    
     def scale_up_deployment(self, deployment_name: str, replicas: int) -> bool:
         """Scale up deployment to specified replica count"""
         try:
-            self.apps_v1.patch_namespaced_deployment_scale(
-                name=deployment_name,
-                namespace=self.namespace,
-                body={'spec': {'replicas': replicas}}
-            )
+            with self.metrics.kubernetes('patch_scale'):
+                self.apps_v1.patch_namespaced_deployment_scale(
+                    name=deployment_name,
+                    namespace=self.namespace,
+                    body={'spec': {'replicas': replicas}}
+                )
+            self._note_scaled(deployment_name, replicas)
             self.logger.info(f"Scaled up {deployment_name} to {replicas} replicas")
             return True
         except ApiException as e:
@@ -275,11 +340,13 @@ class CeleryScaler:
         
         # Update deployment spec to match actual count
         try:
-            self.apps_v1.patch_namespaced_deployment_scale(
-                name=deployment_name,
-                namespace=self.namespace,
-                body={'spec': {'replicas': actual_count}}
-            )
+            with self.metrics.kubernetes('patch_scale'):
+                self.apps_v1.patch_namespaced_deployment_scale(
+                    name=deployment_name,
+                    namespace=self.namespace,
+                    body={'spec': {'replicas': actual_count}}
+                )
+            self._note_scaled(deployment_name, actual_count)
             self.logger.info(f"Updated deployment spec to {actual_count} replicas")
         except ApiException as e:
             self.logger.error(f"Kubernetes API error updating deployment spec: {e}")
@@ -288,101 +355,164 @@ class CeleryScaler:
         
         return actual_count
     
-    def get_queue_length(self, queue_name: str) -> int:
-        """Get the number of ready messages in the queue"""
+    def _broker_management_url(self) -> str:
+        return (self.scaling_config.broker_management_url or
+                f"http://{config.broker_configuration.host}:{config.broker_configuration.management_port}")
+    
+    def broker_client(self) -> BrokerClient:
+        """Async management API client, one pooled session for the lifetime of the loop"""
+        return BrokerClient(
+            self._broker_management_url(),
+            config.broker_configuration.user,
+            config.broker_configuration.password,
+            logger=self.logger
+        )
+    
+    def get_queue_stats(self, queue_name: str) -> Dict[str, float]:
+        """Get ready messages and ack (completion) rate for the queue"""
         try:
-            url = (f"http://{config.broker_configuration.host}:{config.broker_configuration.management_port}/api/queues/%2F/{queue_name}")
+            url = f"{self._broker_management_url()}/api/queues/%2F/{queue_name}"
             
-            response = requests.get(
+            response = self.http.get(
                 url,
                 auth=(config.broker_configuration.user, config.broker_configuration.password),
                 timeout=10
             )
             response.raise_for_status()
             
-            data = response.json()
-            
-            # Only care about ready messages (pending tasks)
-            ready_messages = data.get('messages_ready', 0)
+            # Only care about ready messages (pending tasks) and completions
+            stats = BrokerClient.parse_queue(response.json())
             
-            self.logger.debug(f"Queue {queue_name} has {ready_messages} ready messages")
-            return ready_messages
+            self.logger.debug(f"Queue {queue_name} has {stats['messages_ready']} ready messages, "
+                              f"ack rate {stats['ack_rate']:.2f}/s")
+            return stats
             
         except requests.RequestException as e:
             self.logger.error(f"Request error getting queue length: {e}")
-            return 0
         except (ValueError, KeyError) as e:
             self.logger.error(f"Error parsing queue data: {e}")
-            return 0
         except Exception as e:
             self.logger.error(f"Unexpected error getting queue length: {e}")
-            return 0
+        return {'messages_ready': 0, 'ack_rate': 0.0}
+    
+    def get_all_queue_stats(self) -> Optional[Dict[str, Dict[str, float]]]:
+        """Stats of every queue in one management API call, None when the broker can't be read"""
+        try:
+            with self.metrics.broker('list_queues'):
+                response = self.http.get(
+                    f"{self._broker_management_url()}/api/queues/%2F",
+                    params={'columns': BrokerClient.QUEUE_COLUMNS},
+                    auth=(config.broker_configuration.user, config.broker_configuration.password),
+                    timeout=10
+                )
+            response.raise_for_status()
+            return {q['name']: BrokerClient.parse_queue(q) for q in response.json()}
+        except requests.RequestException as e:
+            self.logger.error(f"Request error getting queue stats: {e}")
+        except (ValueError, KeyError) as e:
+            self.logger.error(f"Error parsing queue data: {e}")
+        except Exception as e:
+            self.logger.error(f"Unexpected error getting queue stats: {e}")
+        return None
+    
+    def get_queue_length(self, queue_name: str) -> int:
+        """Get the number of ready messages in the queue"""
+        return self.get_queue_stats(queue_name)['messages_ready']
+    
+    def calculate_target_replicas(self, queue_length: int, current_replicas: int,
+                                  ack_rate: float = 0.0, now: Optional[float] = None,
+                                  pool: Optional[ScalingPool] = None) -> Optional[int]:
+        """Calculate target replica count based on queue state, delegated to the pool's policy"""
+        pool = pool or self.pools[0]
+        return pool.calculate_target_replicas(
+            queue_length, current_replicas, ack_rate, time.time() if now is None else now
+        )
     
-    def calculate_target_replicas(self, queue_length: int, current_replicas: int) -> Optional[int]:
-        """Calculate target replica count based on queue length and current state"""
-        scale_up_threshold = self.scaling_config.threshold
-        scale_down_threshold = max(1, self.scaling_config.threshold // 2)
+    def decide(self, queue_stats: Dict[str, float], current_replicas: int, current_time: float,
+               pool: Optional[ScalingPool] = None) -> ScalingDecision:
+        """Run the policy and apply cooldowns, no Kubernetes calls"""
+        return (pool or self.pools[0]).decide(queue_stats, current_replicas, current_time)
+    
+    def decide_all(self, all_queues: Dict[str, Dict[str, float]],
+                   replicas: List[Optional[int]], current_time: float) -> List[Optional[ScalingDecision]]:
+        """Decisions for every pool from one broker read, trimmed to the global budget"""
+        decisions = []
+        for pool, current_replicas in zip(self.pools, replicas):
+            if current_replicas is None:
+                self.logger.warning(f"Could not get current replicas of {pool.name}, skipping it this cycle")
+                self.metrics.error('kubernetes')
+                decisions.append(None)
+                continue
+            decisions.append(pool.decide(pool.queue_stats(all_queues), current_replicas, current_time))
         
-        if queue_length > scale_up_threshold:
-            # Scale up logic
-            scale_factor = max(1, int(queue_length * self.scaling_config.scale_up_factor))
-            target = min(current_replicas + scale_factor, self.scaling_config.max_replicas)
-            return target if target > current_replicas else None
-            
-        elif queue_length < scale_down_threshold:
-        # elif queue_length < scale_down_threshold or queue_length < current_replicas * 0.25:
-            # Scale down logic
-            scale_factor = max(1, int(self.scaling_config.scale_down_factor))
-            target = max(current_replicas - scale_factor, self.scaling_config.min_replicas)
-            return target if target < current_replicas else None
+        known = [(p, d) for p, d in zip(self.pools, decisions) if d is not None]
+        requested = [d.target_replicas for _, d in known]
+        apply_budget(self.budget, [p for p, _ in known], [d for _, d in known])
         
-        return None
+        for (pool, decision), policy_target in zip(known, requested):
+            stats = pool.queue_stats(all_queues)
+            self.metrics.record_decision(decision, {
+                'queues': pool.queues,
+                'ack_rate': stats['ack_rate'],
+                'policy': pool.policy.name,
+                'policy_target': policy_target,
+                'policy_state': pool.policy.state(),
+                'min_replicas': pool.config.min_replicas,
+                'max_replicas': pool.config.max_replicas,
+                'last_scale_up_time': pool.last_scale_up_time,
+                'last_scale_down_time': pool.last_scale_down_time,
+            })
+        return decisions
+    
+    def apply_decision(self, decision: ScalingDecision, pool: Optional[ScalingPool] = None) -> None:
+        """Carry out a decision against the deployment and start the matching cooldown"""
+        pool = pool or self._pool(decision.deployment_name) or self.pools[0]
+        deployment_name = pool.name
+        
+        if decision.action == 'none':
+            self.logger.debug(f"No scaling needed for {deployment_name} - Queue: {decision.queue_length}, "
+                              f"Replicas: {decision.current_replicas}, Threshold: {pool.config.threshold}")
+        elif decision.action == 'scale_up':
+            self.logger.info(f"Scaling up {deployment_name} from {decision.current_replicas} to {decision.target_replicas} "
+                             f"(queue length: {decision.queue_length})")
+            if self.scale_up_deployment(deployment_name, decision.target_replicas):
+                pool.last_scale_up_time = decision.timestamp
+        elif decision.action == 'scale_down':
+            self.logger.info(f"Scaling down {deployment_name} from {decision.current_replicas} to {decision.target_replicas} "
+                             f"(queue length: {decision.queue_length})")
+            actual_replicas = self.graceful_scale_down(deployment_name, decision.target_replicas)
+            if actual_replicas < decision.current_replicas:
+                pool.last_scale_down_time = decision.timestamp
+        elif decision.action == 'up_cooldown':
+            self.logger.debug(f"Scale up of {deployment_name} on cooldown, {decision.remaining_cooldown:.1f}s remaining")
+        elif decision.action == 'down_cooldown':
+            self.logger.debug(f"Scale down of {deployment_name} on cooldown, {decision.remaining_cooldown:.1f}s remaining")
+        elif decision.action == 'budget_blocked':
+            self.logger.info(f"Scale up of {deployment_name} blocked by the global budget "
+                             f"(queue length: {decision.queue_length})")
     
     def run_scaling_loop(self):
         """Main scaling loop"""
         self.logger.info("Starting scaling loop...")
         
         while not self.shutdown_requested:
+            cycle_start = time.perf_counter()
             try:
-                # Get current state
-                queue_length = self.get_queue_length(self.scaling_config.queue_name)
-                current_replicas = self.get_current_replicas(self.scaling_config.deployment_name)
-                
-                if current_replicas is None:
-                    self.logger.warning("Could not get current replicas, skipping this cycle")
+                # Get current state, one broker call for all pools
+                all_queues = self.get_all_queue_stats()
+                if all_queues is None:
+                    self.logger.warning("Could not get queue stats, skipping this cycle")
+                    self.metrics.error('broker')
+                    self.metrics.cycle_completed(time.perf_counter() - cycle_start)
                     time.sleep(self.scaling_config.check_interval)
                     continue
+                replicas = [self.get_current_replicas(pool.name) for pool in self.pools]
                 
-                current_time = time.time()
-                
-                # Calculate target replicas
-                target_replicas = self.calculate_target_replicas(queue_length, current_replicas)
-                
-                if target_replicas is None:
-                    self.logger.debug(f"No scaling needed - Queue: {queue_length}, "
-                                    f"Replicas: {current_replicas}, Threshold: {self.scaling_config.threshold}")
-                elif target_replicas > current_replicas:
-                    # Scale up
-                    if current_time - self.last_scale_up_time >= self.scaling_config.scale_up_cooldown:
-                        self.logger.info(f"Scaling up from {current_replicas} to {target_replicas} "
-                                       f"(queue length: {queue_length})")
-                        if self.scale_up_deployment(self.scaling_config.deployment_name, target_replicas):
-                            self.last_scale_up_time = current_time
-                    else:
-                        remaining_cooldown = self.scaling_config.scale_up_cooldown - (current_time - self.last_scale_up_time)
-                        self.logger.debug(f"Scale up on cooldown, {remaining_cooldown:.1f}s remaining")
-                        
-                elif target_replicas < current_replicas:
-                    # Scale down
-                    if current_time - self.last_scale_down_time >= self.scaling_config.scale_down_cooldown:
-                        self.logger.info(f"Scaling down from {current_replicas} to {target_replicas} "
-                                       f"(queue length: {queue_length})")
-                        actual_replicas = self.graceful_scale_down(self.scaling_config.deployment_name, target_replicas)
-                        if actual_replicas < current_replicas:
-                            self.last_scale_down_time = current_time
-                    else:
-                        remaining_cooldown = self.scaling_config.scale_down_cooldown - (current_time - self.last_scale_down_time)
-                        self.logger.debug(f"Scale down on cooldown, {remaining_cooldown:.1f}s remaining")
+                decisions = self.decide_all(all_queues, replicas, time.time())
+                for pool, decision in zip(self.pools, decisions):
+                    if decision is not None:
+                        self.apply_decision(decision, pool)
+                self.metrics.cycle_completed(time.perf_counter() - cycle_start)
                 
             except Exception as e:
                 self.logger.error(f"Error in scaling loop: {e}")
@@ -392,12 +522,86 @@ class CeleryScaler:
             time.sleep(self.scaling_config.check_interval)
         
         self.logger.info("Scaling loop stopped gracefully")
+    
+    async def _all_queue_stats_async(self, broker: BrokerClient) -> Optional[Dict[str, Dict[str, float]]]:
+        with self.metrics.broker('list_queues'):
+            return await broker.get_all_queue_stats()
+    
+    async def _current_replicas_async(self, pool: ScalingPool) -> Optional[int]:
+        if pool.cluster_state.synced:
+            return pool.cluster_state.current_replicas()
+        # watch cache not loaded yet (or disabled), read the deployment off the event loop
+        return await asyncio.to_thread(self.get_current_replicas, pool.name)
+    
+    async def _sleep_until(self, deadline: float) -> None:
+        """Sleep until loop time deadline, returns early on shutdown"""
+        delay = max(0.0, deadline - self._loop.time())
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+    
+    async def run_async_scaling_loop(self):
+        """
+        Main scaling loop on asyncio.
+        
+        One bulk broker read covers every pool and runs concurrently with the deployment reads,
+        deployment and pods come from the watch cache once it is synced, and cycles run at a fixed
+        rate (check_interval from the start of the previous cycle) so slow API calls don't make the
+        loop drift. Kubernetes mutations run in worker threads, pools are scaled concurrently.
+        """
+        self.logger.info("Starting async scaling loop...")
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        interval = self.scaling_config.check_interval
+        
+        async with self.broker_client() as broker:
+            next_cycle = self._loop.time()
+            while not self.shutdown_requested:
+                next_cycle += interval
+                cycle_start = time.perf_counter()
+                try:
+                    all_queues, *replicas = await asyncio.gather(
+                        self._all_queue_stats_async(broker),
+                        *(self._current_replicas_async(pool) for pool in self.pools)
+                    )
+                    
+                    if all_queues is None:
+                        self.logger.warning("Could not get queue stats, skipping this cycle")
+                        self.metrics.error('broker')
+                    else:
+                        decisions = self.decide_all(all_queues, replicas, time.time())
+                        actions = []
+                        for pool, decision in zip(self.pools, decisions):
+                            if decision is None:
+                                continue
+                            if decision.action in ('scale_up', 'scale_down'):
+                                actions.append(asyncio.to_thread(self.apply_decision, decision, pool))
+                            else:
+                                self.apply_decision(decision, pool)
+                        await asyncio.gather(*actions)
+                    # skipped cycles count too, /healthz is about the loop being alive
+                    self.metrics.cycle_completed(time.perf_counter() - cycle_start)
+                
+                except Exception as e:
+                    self.logger.error(f"Error in scaling loop: {e}")
+                    next_cycle = self._loop.time() + min(60, interval * 2)
+                
+                # fell more than a cycle behind, skip the missed ticks instead of bursting through them
+                if next_cycle < self._loop.time():
+                    next_cycle = self._loop.time()
+                await self._sleep_until(next_cycle)
+        
+        self.logger.info("Scaling loop stopped gracefully")
 
 
 def main():
     try:
         scaler = CeleryScaler()
-        scaler.run_scaling_loop()
+        if os.getenv('SCALER_LOOP', 'async') == 'sync':
+            scaler.run_scaling_loop()
+        else:
+            asyncio.run(scaler.run_async_scaling_loop())
     except KeyboardInterrupt:
         print("\nShutdown requested by user")
         sys.exit(0)
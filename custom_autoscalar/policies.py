@@ -0,0 +1,194 @@
+'''
+Scaling policies for the Celery autoscaler.
+
+A policy only decides how many replicas a pool should have, given a snapshot of its queue.
+Cooldowns, idle pod selection and the Kubernetes calls stay in CeleryScaler.
+'''
+
+import math
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class QueueSample:
+    """Broker and deployment state observed in one scaling cycle"""
+    timestamp: float
+    queue_length: int
+    current_replicas: int
+    # messages acked per second as reported by the broker, ie. task completion rate of the whole pool
+    ack_rate: float = 0.0
+
+
+class ScalingPolicy(ABC):
+    """Decides the target replica count, returns None when no change is needed"""
+    name = "base"
+
+    @abstractmethod
+    def calculate_target_replicas(self, sample: QueueSample) -> Optional[int]:
+        ...
+
+    def state(self) -> dict:
+        """Internal estimates behind the last target, recorded with each decision"""
+        return {}
+
+
+class ThresholdPolicy(ScalingPolicy):
+    """Original queue length threshold logic, kept as the default policy"""
+    name = "threshold"
+
+    def __init__(self, threshold: int, min_replicas: int, max_replicas: int,
+                 scale_up_factor: float = 1.0, scale_down_factor: float = 1.0):
+        self.threshold = threshold
+        self.min_replicas = min_replicas
+        self.max_replicas = max_replicas
+        self.scale_up_factor = scale_up_factor
+        self.scale_down_factor = scale_down_factor
+
+    def calculate_target_replicas(self, sample: QueueSample) -> Optional[int]:
+        queue_length = sample.queue_length
+        current_replicas = sample.current_replicas
+        scale_up_threshold = self.threshold
+        scale_down_threshold = max(1, self.threshold // 2)
+
+        if queue_length > scale_up_threshold:
+            # Scale up logic
+            scale_factor = max(1, int(queue_length * self.scale_up_factor))
+            target = min(current_replicas + scale_factor, self.max_replicas)
+            return target if target > current_replicas else None
+
+        elif queue_length < scale_down_threshold:
+            # Scale down logic
+            scale_factor = max(1, int(self.scale_down_factor))
+            target = max(current_replicas - scale_factor, self.min_replicas)
+            return target if target < current_replicas else None
+
+        return None
+
+
+class RateBasedPolicy(ScalingPolicy):
+    """
+    Sizes the pool from arrival and drain rates instead of the raw queue length.
+
+    Keeps EWMAs of queue growth (messages/s) and per worker completion rate (mu, tasks/s).
+    Arrival rate is lambda = growth + completions. By Little's law the pool needs enough
+    workers to serve lambda and also clear the current backlog within target_drain_seconds:
+
+        replicas = ceil((lambda + queue_length / target_drain_seconds) / mu)
+
+    A short burst only moves the EWMAs part of the way, so it no longer jumps straight to
+    max_replicas, while a sustained ramp shows up in the growth rate before the backlog gets large.
+    Scale down only happens once the computed target is below current * (1 - hysteresis),
+    so the pool does not flap around the boundary.
+    """
+    name = "rate"
+
+    def __init__(self, min_replicas: int, max_replicas: int, target_drain_seconds: float = 60.0,
+                 alpha: float = 0.3, hysteresis: float = 0.2, default_worker_rate: float = 1.0):
+        self.min_replicas = min_replicas
+        self.max_replicas = max_replicas
+        self.target_drain_seconds = target_drain_seconds
+        self.alpha = alpha
+        self.hysteresis = hysteresis
+        self.default_worker_rate = default_worker_rate
+
+        self.growth_rate: Optional[float] = None
+        self.completion_rate: Optional[float] = None
+        self.worker_rate: Optional[float] = None
+        self._last: Optional[QueueSample] = None
+
+    def _ewma(self, previous: Optional[float], value: float) -> float:
+        if previous is None:
+            return value
+        return self.alpha * value + (1 - self.alpha) * previous
+
+    def observe(self, sample: QueueSample) -> None:
+        """Update the rate estimates with a new sample"""
+        last = self._last
+        self._last = sample
+        self.completion_rate = self._ewma(self.completion_rate, max(0.0, sample.ack_rate))
+
+        # only learn mu while there is a backlog, idle workers would drag the estimate down
+        if sample.current_replicas > 0 and sample.ack_rate > 0 and (sample.queue_length > 0 or (last and last.queue_length > 0)):
+            self.worker_rate = self._ewma(self.worker_rate, sample.ack_rate / sample.current_replicas)
+
+        if last is None:
+            return
+        elapsed = sample.timestamp - last.timestamp
+        if elapsed <= 0:
+            return
+        self.growth_rate = self._ewma(self.growth_rate, (sample.queue_length - last.queue_length) / elapsed)
+
+    def desired_replicas(self, sample: QueueSample) -> int:
+        """Replica count needed for the current sample, clamped to min/max"""
+        arrival_rate = max(0.0, (self.growth_rate or 0.0) + (self.completion_rate or 0.0))
+        worker_rate = self.worker_rate or self.default_worker_rate
+        required_rate = arrival_rate + sample.queue_length / self.target_drain_seconds
+        desired = math.ceil(required_rate / worker_rate) if required_rate > 0 else 0
+        return max(self.min_replicas, min(self.max_replicas, desired))
+
+    def state(self) -> dict:
+        return {
+            'growth_rate': self.growth_rate,
+            'completion_rate': self.completion_rate,
+            'worker_rate': self.worker_rate,
+        }
+
+    def calculate_target_replicas(self, sample: QueueSample) -> Optional[int]:
+        self.observe(sample)
+        desired = self.desired_replicas(sample)
+        current = sample.current_replicas
+
+        if desired > current:
+            return desired
+        if desired < current and desired <= math.floor(current * (1 - self.hysteresis)):
+            return desired
+        if current < self.min_replicas:
+            return self.min_replicas
+        return None
+
+
+POLICIES = {
+    ThresholdPolicy.name: ThresholdPolicy,
+    RateBasedPolicy.name: RateBasedPolicy,
+}
+
+
+def build_policy(config, schedule=None) -> ScalingPolicy:
+    """Build the policy named in a ScalingConfig, wrapped in the schedule floor when it is schedule aware"""
+    policy = _build_reactive_policy(config)
+    if schedule is None or not getattr(config, 'schedule_aware', False):
+        return policy
+
+    from custom_autoscalar.schedule import ScheduledPolicy
+    return ScheduledPolicy(
+        policy,
+        schedule,
+        min_replicas=config.min_replicas,
+        max_replicas=config.max_replicas,
+        lead_seconds=config.prescale_lead_seconds,
+        max_hold_seconds=config.prescale_max_hold_seconds,
+        tasks_per_replica=config.worker_concurrency,
+    )
+
+
+def _build_reactive_policy(config) -> ScalingPolicy:
+    if config.policy == RateBasedPolicy.name:
+        return RateBasedPolicy(
+            min_replicas=config.min_replicas,
+            max_replicas=config.max_replicas,
+            target_drain_seconds=config.target_drain_seconds,
+            alpha=config.ewma_alpha,
+            hysteresis=config.scale_down_hysteresis,
+            default_worker_rate=config.default_worker_rate,
+        )
+    if config.policy == ThresholdPolicy.name:
+        return ThresholdPolicy(
+            threshold=config.threshold,
+            min_replicas=config.min_replicas,
+            max_replicas=config.max_replicas,
+            scale_up_factor=config.scale_up_factor,
+            scale_down_factor=config.scale_down_factor,
+        )
+    raise ValueError(f"Unknown scaling policy '{config.policy}', expected one of {sorted(POLICIES)}")
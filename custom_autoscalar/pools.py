@@ -0,0 +1,140 @@
+'''
+Worker pools managed by one scaler process, and the global replica / CPU budget shared between them.
+
+A pool is one deployment, the queue(s) its workers consume, its own policy, limits and cooldowns.
+All pools are evaluated in the same cycle from one bulk broker read, then scale ups are trimmed
+to fit the global budget so eg. evaluation and i/o pools can't each take the whole cluster.
+'''
+
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from custom_autoscalar.policies import QueueSample, build_policy
+
+
+@dataclass
+class ScalingDecision:
+    """Outcome of one scaling evaluation, before any Kubernetes call is made"""
+    timestamp: float
+    queue_length: int
+    current_replicas: int
+    target_replicas: Optional[int]
+    # none, scale_up, scale_down, up_cooldown, down_cooldown, budget_blocked
+    action: str
+    remaining_cooldown: float = 0.0
+    deployment_name: str = ''
+
+
+@dataclass
+class ReplicaBudget:
+    """Limits shared by all pools, None means unlimited"""
+    max_total_replicas: Optional[int] = None
+    max_total_cpu: Optional[float] = None
+
+
+class ScalingPool:
+    """One deployment with its queue(s), policy and cooldown state"""
+
+    def __init__(self, config, cluster_state=None, schedule=None):
+        self.config = config
+        self.policy = build_policy(config, schedule)
+        self.cluster_state = cluster_state
+        self.last_scale_up_time = 0
+        self.last_scale_down_time = 0
+
+    @property
+    def name(self) -> str:
+        return self.config.deployment_name
+
+    @property
+    def queues(self) -> List[str]:
+        return self.config.queues
+
+    def queue_stats(self, all_queues: Dict[str, Dict[str, float]]) -> Dict[str, float]:
+        """Combined stats of this pool's queues out of a bulk broker read"""
+        ready, ack_rate = 0, 0.0
+        for queue in self.queues:
+            stats = all_queues.get(queue)
+            if stats:
+                ready += stats['messages_ready']
+                ack_rate += stats['ack_rate']
+        return {'messages_ready': ready, 'ack_rate': ack_rate}
+
+    def calculate_target_replicas(self, queue_length: int, current_replicas: int,
+                                  ack_rate: float, now: float) -> Optional[int]:
+        sample = QueueSample(timestamp=now, queue_length=queue_length,
+                             current_replicas=current_replicas, ack_rate=ack_rate)
+        return self.policy.calculate_target_replicas(sample)
+
+    def decide(self, queue_stats: Dict[str, float], current_replicas: int, current_time: float) -> ScalingDecision:
+        """Run the policy and apply cooldowns, no Kubernetes calls"""
+        queue_length = queue_stats['messages_ready']
+        target_replicas = self.calculate_target_replicas(
+            queue_length, current_replicas, queue_stats.get('ack_rate', 0.0), current_time
+        )
+        decision = ScalingDecision(current_time, queue_length, current_replicas, target_replicas, 'none',
+                                   deployment_name=self.name)
+
+        if target_replicas is None or target_replicas == current_replicas:
+            return decision
+
+        if target_replicas > current_replicas:
+            elapsed = current_time - self.last_scale_up_time
+            if elapsed >= self.config.scale_up_cooldown:
+                decision.action = 'scale_up'
+            else:
+                decision.action = 'up_cooldown'
+                decision.remaining_cooldown = self.config.scale_up_cooldown - elapsed
+        else:
+            elapsed = current_time - self.last_scale_down_time
+            if elapsed >= self.config.scale_down_cooldown:
+                decision.action = 'scale_down'
+            else:
+                decision.action = 'down_cooldown'
+                decision.remaining_cooldown = self.config.scale_down_cooldown - elapsed
+        return decision
+
+
+def apply_budget(budget: ReplicaBudget, pools: List[ScalingPool], decisions: List[ScalingDecision]) -> None:
+    """
+    Trim scale up decisions in place so the sum over all pools stays within the budget.
+
+    Headroom is what is left after every pool's current replicas (scale downs are not counted as
+    released, busy pods may keep them alive). Pools with a higher priority are served first, pools of
+    equal priority share the headroom in proportion to what they asked for. A pool that gets nothing
+    is marked budget_blocked.
+    """
+    if budget.max_total_replicas is None and budget.max_total_cpu is None:
+        return
+
+    replicas_left = math.inf
+    if budget.max_total_replicas is not None:
+        replicas_left = budget.max_total_replicas - sum(d.current_replicas for d in decisions)
+    cpu_left = math.inf
+    if budget.max_total_cpu is not None:
+        cpu_left = budget.max_total_cpu - sum(
+            d.current_replicas * p.config.cpu_per_replica for p, d in zip(pools, decisions)
+        )
+
+    requests = [(p, d) for p, d in zip(pools, decisions) if d.action == 'scale_up']
+    for priority in sorted({p.config.priority for p, _ in requests}, reverse=True):
+        group = [(p, d) for p, d in requests if p.config.priority == priority]
+        asked = sum(d.target_replicas - d.current_replicas for _, d in group)
+        share_pool = min(asked, max(0, replicas_left))
+
+        for pool, decision in group:
+            wanted = decision.target_replicas - decision.current_replicas
+            granted = wanted if share_pool >= asked else math.floor(share_pool * wanted / asked)
+            cpu = pool.config.cpu_per_replica
+            if cpu > 0:
+                granted = min(granted, max(0, math.floor(cpu_left / cpu)))
+            granted = max(0, int(granted))
+
+            replicas_left -= granted
+            cpu_left -= granted * cpu
+            if granted == 0:
+                decision.action = 'budget_blocked'
+                decision.target_replicas = decision.current_replicas
+            else:
+                decision.target_replicas = decision.current_replicas + granted
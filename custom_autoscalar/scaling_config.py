@@ -0,0 +1,189 @@
+'''
+Scaler configuration, one ScalingConfig per worker pool.
+
+Kept apart from the scaler itself so it can be loaded without the Kubernetes client or the
+worker app, eg. by the offline simulator.
+'''
+
+import os
+import json
+from dataclasses import dataclass, field, fields, replace
+from typing import List, Optional
+
+from custom_autoscalar.policies import POLICIES
+from custom_autoscalar.pools import ReplicaBudget
+
+
+@dataclass
+class ScalingConfig:
+    """Configuration for the scaler"""
+    threshold: int
+    min_replicas: int
+    max_replicas: int
+    check_interval: int
+    scale_up_cooldown: int
+    scale_down_cooldown: int
+    deployment_name: str
+    queue_name: str
+    scale_up_factor: float = 1.0
+    scale_down_factor: float = 1.0
+    grace_period_seconds: int = 30
+    # threshold (default, original behaviour) or rate
+    policy: str = 'threshold'
+    target_drain_seconds: float = 60.0
+    ewma_alpha: float = 0.3
+    scale_down_hysteresis: float = 0.2
+    default_worker_rate: float = 1.0
+    # keep worker activity current from celery events, falls back to one inspect snapshot per cycle
+    use_celery_events: bool = True
+    # follow deployment/pods with watch streams instead of reading them every cycle
+    use_watch_cache: bool = True
+    # management api base url, eg. http://rabbitmq:15672, defaults to the broker configuration
+    broker_management_url: Optional[str] = None
+    # extra queues consumed by the same deployment, queue_name is used when empty
+    queue_names: List[str] = field(default_factory=list)
+    # share of the global budget, higher priority pools are served first
+    priority: int = 0
+    cpu_per_replica: float = 0.0
+    # pre-scale ahead of test closes read from the tests collection
+    schedule_aware: bool = False
+    schedule_mongo_url: Optional[str] = None
+    schedule_db_name: str = 'exam_platform'
+    prescale_lead_seconds: float = 300.0
+    prescale_max_hold_seconds: float = 3600.0
+    # the app's EVALUATION_DELAY_SECONDS, evaluations are enqueued that long after a test's ends_at
+    evaluation_delay_seconds: float = 600.0
+    # evaluation tasks one test close enqueues (one evaluate_test_after_close per test)
+    tasks_per_test: int = 1
+    # tasks a pod runs at once, its celery concurrency
+    worker_concurrency: int = 1
+    # /metrics, /healthz and /decisions, 0 disables the endpoint
+    metrics_port: int = 9090
+    decision_history: int = 500
+    
+    @property
+    def queues(self) -> List[str]:
+        return self.queue_names or [self.queue_name]
+    
+    @classmethod
+    def from_env(cls) -> 'ScalingConfig':
+        """Load configuration from environment variables"""
+        try:
+            return cls(
+                threshold=int(os.getenv('THRESHOLD', 6)),
+                min_replicas=int(os.getenv('MIN_REPLICAS', 3)),
+                max_replicas=int(os.getenv('MAX_REPLICAS', 10)),
+                check_interval=int(os.getenv('CHECK_INTERVAL', 5)),
+                scale_up_cooldown=int(os.getenv('SCALE_UP_COOLDOWN', 5)),
+                scale_down_cooldown=int(os.getenv('SCALE_DOWN_COOLDOWN', 60)),
+                deployment_name=os.getenv('DEPLOYMENT_NAME'),
+                queue_name=os.getenv('QUEUE_NAME'),
+                scale_up_factor=float(os.getenv('SCALE_UP_FACTOR', 1.0)),
+                scale_down_factor=float(os.getenv('SCALE_DOWN_FACTOR', 1.0)),
+                grace_period_seconds=int(os.getenv('GRACE_PERIOD_SECONDS', 30)),
+                policy=os.getenv('SCALING_POLICY', 'threshold'),
+                target_drain_seconds=float(os.getenv('TARGET_DRAIN_SECONDS', 60.0)),
+                ewma_alpha=float(os.getenv('EWMA_ALPHA', 0.3)),
+                scale_down_hysteresis=float(os.getenv('SCALE_DOWN_HYSTERESIS', 0.2)),
+                default_worker_rate=float(os.getenv('DEFAULT_WORKER_RATE', 1.0)),
+                use_celery_events=os.getenv('USE_CELERY_EVENTS', 'true').lower() in ('1', 'true', 'yes'),
+                use_watch_cache=os.getenv('USE_WATCH_CACHE', 'true').lower() in ('1', 'true', 'yes'),
+                broker_management_url=os.getenv('BROKER_MANAGEMENT_URL'),
+                priority=int(os.getenv('PRIORITY', 0)),
+                cpu_per_replica=float(os.getenv('CPU_PER_REPLICA', 0.0)),
+                schedule_aware=os.getenv('SCHEDULE_AWARE', 'false').lower() in ('1', 'true', 'yes'),
+                schedule_mongo_url=os.getenv('SCHEDULE_MONGO_URL') or os.getenv('DATABASE_URL'),
+                schedule_db_name=os.getenv('SCHEDULE_DB_NAME', 'exam_platform'),
+                prescale_lead_seconds=float(os.getenv('PRESCALE_LEAD_SECONDS', 300.0)),
+                prescale_max_hold_seconds=float(os.getenv('PRESCALE_MAX_HOLD_SECONDS', 3600.0)),
+                evaluation_delay_seconds=float(os.getenv('EVALUATION_DELAY_SECONDS', 600.0)),
+                tasks_per_test=int(os.getenv('TASKS_PER_TEST', 1)),
+                worker_concurrency=int(os.getenv('WORKER_CONCURRENCY', 1)),
+                metrics_port=int(os.getenv('METRICS_PORT', 9090)),
+                decision_history=int(os.getenv('DECISION_HISTORY', 500))
+            )
+        except (ValueError, TypeError) as e:
+            raise RuntimeError(f"Invalid configuration: {e}")
+    
+    @classmethod
+    def pools_from_env(cls) -> List['ScalingConfig']:
+        """
+        Load one config per worker pool.
+        
+        SCALER_POOLS (json) or SCALER_POOLS_FILE (path to json) holds a list of pool entries, each entry
+        overrides the env defaults, eg.
+            [{"deployment_name": "eval-workers", "queues": ["evaluation"], "policy": "rate", "max_replicas": 40},
+             {"deployment_name": "io-workers", "queue_name": "celery", "priority": 1}]
+        Without either, the single DEPLOYMENT_NAME/QUEUE_NAME pair is used as before.
+        """
+        base = cls.from_env()
+        raw = os.getenv('SCALER_POOLS')
+        pools_file = os.getenv('SCALER_POOLS_FILE')
+        if pools_file:
+            with open(pools_file, 'r') as f:
+                raw = f.read()
+        if not raw:
+            return [base]
+        
+        known = {f.name for f in fields(cls)}
+        configs = []
+        try:
+            for entry in json.loads(raw):
+                entry = dict(entry)
+                if 'queues' in entry:
+                    entry['queue_names'] = list(entry.pop('queues'))
+                unknown = set(entry) - known
+                if unknown:
+                    raise ValueError(f"unknown pool settings {sorted(unknown)}")
+                configs.append(replace(base, **entry))
+        except (ValueError, TypeError) as e:
+            raise RuntimeError(f"Invalid pool configuration: {e}")
+        return configs
+    
+    def validate(self) -> None:
+        """Validate configuration values"""
+        if not self.deployment_name:
+            raise ValueError("DEPLOYMENT_NAME is required")
+        if not self.queue_name and not self.queue_names:
+            raise ValueError("QUEUE_NAME is required")
+        if self.min_replicas < 1:
+            raise ValueError("MIN_REPLICAS must be at least 1")
+        if self.max_replicas < self.min_replicas:
+            raise ValueError("MAX_REPLICAS must be greater than or equal to MIN_REPLICAS")
+        if self.threshold < 1:
+            raise ValueError("THRESHOLD must be at least 1")
+        if self.policy not in POLICIES:
+            raise ValueError(f"SCALING_POLICY must be one of {sorted(POLICIES)}")
+        if self.target_drain_seconds <= 0:
+            raise ValueError("TARGET_DRAIN_SECONDS must be positive")
+        if not 0 < self.ewma_alpha <= 1:
+            raise ValueError("EWMA_ALPHA must be in (0, 1]")
+        if not 0 <= self.scale_down_hysteresis < 1:
+            raise ValueError("SCALE_DOWN_HYSTERESIS must be in [0, 1)")
+        if self.default_worker_rate <= 0:
+            raise ValueError("DEFAULT_WORKER_RATE must be positive")
+        if self.cpu_per_replica < 0:
+            raise ValueError("CPU_PER_REPLICA must not be negative")
+        if self.schedule_aware and not self.schedule_mongo_url:
+            raise ValueError("SCHEDULE_MONGO_URL (or DATABASE_URL) is required when SCHEDULE_AWARE is set")
+        if self.prescale_lead_seconds < 0 or self.prescale_max_hold_seconds <= 0:
+            raise ValueError("PRESCALE_LEAD_SECONDS must not be negative and PRESCALE_MAX_HOLD_SECONDS must be positive")
+        if self.evaluation_delay_seconds < 0:
+            raise ValueError("EVALUATION_DELAY_SECONDS must not be negative")
+        if self.tasks_per_test < 1 or self.worker_concurrency < 1:
+            raise ValueError("TASKS_PER_TEST and WORKER_CONCURRENCY must be at least 1")
+        if self.decision_history < 1:
+            raise ValueError("DECISION_HISTORY must be at least 1")
+
+
+def budget_from_env() -> ReplicaBudget:
+    """Global replica / CPU budget shared by all pools"""
+    max_total_replicas = os.getenv('MAX_TOTAL_REPLICAS')
+    max_total_cpu = os.getenv('MAX_TOTAL_CPU')
+    try:
+        return ReplicaBudget(
+            max_total_replicas=int(max_total_replicas) if max_total_replicas else None,
+            max_total_cpu=float(max_total_cpu) if max_total_cpu else None
+        )
+    except ValueError as e:
+        raise RuntimeError(f"Invalid budget configuration: {e}")
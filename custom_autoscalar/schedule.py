@@ -0,0 +1,204 @@
+'''
+Schedule-aware pre-scaling.
+
+Evaluation bursts follow a test's close time, which the `tests` collection already knows. Instead of
+waiting for messages to pile up (and then for scale up cooldowns and pod startup), the pool is raised
+to the capacity the burst needs shortly before it, held there until the tests are evaluated,
+and then left to the reactive policy again.
+
+What a close enqueues: the beat scheduler (app/worker/tasks.py, schedule_due_evaluations) sends one
+evaluate_test_after_close per test, EVALUATION_DELAY_SECONDS after its ends_at, and that task scores every
+candidate of the test in one pass. So the burst is tests, not candidates: the floor is one worker slot per
+test evaluating at the same time (TASKS_PER_TEST for a per-test fan-out, WORKER_CONCURRENCY slots per pod),
+the candidate count only changes how long each evaluation runs. A queue that is empty again says nothing
+(it empties as soon as a worker takes the task), a close is held until its test is evaluated and drops out
+of the schedule, or for PRESCALE_MAX_HOLD_SECONDS.
+
+TestSchedule reads upcoming closes from mongo in a background thread (pymongo is blocking, same as the
+watch caches), ScheduledPolicy wraps any other policy and only ever adds a floor to its target.
+'''
+
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from custom_autoscalar.policies import QueueSample, ScalingPolicy
+
+
+@dataclass
+class UpcomingClose:
+    """One test whose evaluation is due soon and the tasks it will enqueue"""
+    test_id: str
+    # when the evaluation is enqueued, the test's close + the evaluation delay
+    evaluates_at: float
+    tasks: int = 1
+
+
+def _epoch(value) -> Optional[float]:
+    if isinstance(value, datetime):
+        # the api stores naive utc datetimes (datetime.utcnow)
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    return None
+
+
+class StaticSchedule:
+    """Fixed list of closes, for the simulator or a manual override"""
+
+    def __init__(self, closes: List[UpcomingClose]):
+        self._closes = list(closes)
+
+    def upcoming(self) -> List[UpcomingClose]:
+        return list(self._closes)
+
+    def complete(self, test_id: str) -> None:
+        """The test was evaluated, what TestSchedule sees as the test leaving the tests query"""
+        self._closes = [c for c in self._closes if c.test_id != test_id]
+
+
+class TestSchedule:
+    """Tests not evaluated yet from the `tests` collection, refreshed every refresh_seconds"""
+
+    def __init__(self, mongo_url: str, db_name: str = 'exam_platform', lookahead_seconds: float = 3600,
+                 lookbehind_seconds: float = 3600, refresh_seconds: float = 60,
+                 evaluation_delay_seconds: float = 600, tasks_per_test: int = 1,
+                 close_field: str = 'ends_at', logger: Optional[logging.Logger] = None):
+        self.mongo_url = mongo_url
+        self.db_name = db_name
+        self.lookahead_seconds = lookahead_seconds
+        # evaluations already enqueued are still needed, they hold the floor until the test is evaluated
+        self.lookbehind_seconds = lookbehind_seconds
+        self.refresh_seconds = refresh_seconds
+        # same setting as the app's EVALUATION_DELAY_SECONDS, the scheduler enqueues that long after ends_at
+        self.evaluation_delay_seconds = evaluation_delay_seconds
+        self.tasks_per_test = tasks_per_test
+        self.close_field = close_field
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._closes: List[UpcomingClose] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._refresh_loop, name="test-schedule", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def upcoming(self) -> List[UpcomingClose]:
+        with self._lock:
+            return list(self._closes)
+
+    def _refresh_loop(self) -> None:
+        # imported here so pymongo is only needed when schedule aware scaling is enabled
+        from pymongo import MongoClient
+
+        client = MongoClient(self.mongo_url, serverSelectionTimeoutMS=5000)
+        try:
+            while not self._stop.is_set():
+                try:
+                    closes = self.load(client[self.db_name].tests, time.time())
+                    with self._lock:
+                        self._closes = closes
+                except Exception as e:
+                    # keep the last known schedule, pre-scaling is best effort
+                    self.logger.error(f"Error reading test schedule: {e}")
+                self._stop.wait(self.refresh_seconds)
+        finally:
+            client.close()
+
+    def load(self, tests, now: float) -> List[UpcomingClose]:
+        """Tests not evaluated (or given up on) whose evaluation is due within the window, one range on close_schedule"""
+        delay = self.evaluation_delay_seconds
+        window = {
+            '$gte': datetime.fromtimestamp(now - self.lookbehind_seconds - delay, timezone.utc).replace(tzinfo=None),
+            '$lte': datetime.fromtimestamp(now + self.lookahead_seconds - delay, timezone.utc).replace(tzinfo=None),
+        }
+        cursor = tests.find(
+            {self.close_field: window, 'evaluated': {'$ne': True}, 'evaluation_failed': {'$ne': True}},
+            projection={'_id': 0, 'test_id': 1, self.close_field: 1}
+        )
+        closes = []
+        for test in cursor:
+            closes_at = _epoch(test.get(self.close_field))
+            if closes_at is None:
+                continue
+            closes.append(UpcomingClose(test['test_id'], closes_at + delay, self.tasks_per_test))
+        return closes
+
+
+class ScheduledPolicy(ScalingPolicy):
+    """
+    Adds a capacity floor around evaluation bursts to another policy.
+
+    The floor is one worker slot per task of every close in its pre-scale / hold window:
+
+        replicas = ceil(sum(close.tasks) / tasks_per_replica)
+
+    It applies from lead_seconds before a close's evaluation is enqueued until the close leaves the schedule
+    (its test is evaluated), max_hold_seconds caps the hold for a test that never gets there. The wrapped
+    policy is still fed every sample so its rate estimates stay current when control is handed back.
+    """
+    name = "scheduled"
+
+    def __init__(self, inner: ScalingPolicy, schedule, min_replicas: int, max_replicas: int,
+                 lead_seconds: float = 300, max_hold_seconds: float = 3600, tasks_per_replica: int = 1):
+        self.inner = inner
+        self.name = f"{inner.name}+schedule"
+        self.schedule = schedule
+        self.min_replicas = min_replicas
+        self.max_replicas = max_replicas
+        self.lead_seconds = lead_seconds
+        self.max_hold_seconds = max_hold_seconds
+        self.tasks_per_replica = tasks_per_replica
+        # test_id -> evaluates_at, closes held for max_hold_seconds without being evaluated
+        self._released: Dict[str, float] = {}
+        self.last_floor = 0
+
+    def capacity_for(self, tasks: int) -> int:
+        replicas = math.ceil(tasks / self.tasks_per_replica)
+        return max(self.min_replicas, min(self.max_replicas, replicas))
+
+    def floor(self, sample: QueueSample) -> int:
+        """Replicas required by closes in their pre-scale / hold window, 0 when none is"""
+        now = sample.timestamp
+        tasks = 0
+        for close in self.schedule.upcoming():
+            if self._released.get(close.test_id) == close.evaluates_at:
+                continue
+            if now < close.evaluates_at - self.lead_seconds:
+                continue
+            if now >= close.evaluates_at + self.max_hold_seconds:
+                # remembered with the due time, a rescheduled test gets a new window
+                self._released[close.test_id] = close.evaluates_at
+                continue
+            tasks += close.tasks
+
+        # forget releases old enough to have left the schedule window
+        for test_id, evaluates_at in list(self._released.items()):
+            if evaluates_at < now - 2 * self.max_hold_seconds:
+                del self._released[test_id]
+        return self.capacity_for(tasks) if tasks else 0
+
+    def state(self) -> dict:
+        return dict(self.inner.state(), schedule_floor=self.last_floor)
+
+    def calculate_target_replicas(self, sample: QueueSample) -> Optional[int]:
+        target = self.inner.calculate_target_replicas(sample)
+        floor = self.last_floor = self.floor(sample)
+        if floor == 0:
+            return target
+
+        desired = max(target if target is not None else sample.current_replicas, floor)
+        return desired if desired != sample.current_replicas else None
@@ -0,0 +1,363 @@
+'''
+Offline simulator for the autoscaler, to tune thresholds, cooldowns and policies without exam day traffic.
+
+Replays an arrival trace (recorded or synthetic) through a fake broker queue and a fake deployment
+whose pods take a while to start, on simulated time. Every check_interval the same ScalingPool.decide
+the scaler uses (policy + cooldowns) is run against the fake queue, scale downs only remove idle
+running pods like graceful_scale_down does.
+
+Reports queue wait percentiles, replica-seconds (what the pool cost) and the scale events.
+
+usage:
+    python -m custom_autoscalar.simulator --trace burst --duration 1800 --rate 2 --burst 3000
+    python -m custom_autoscalar.simulator --trace-file arrivals.csv --policy threshold,rate
+'''
+
+import argparse
+import csv
+import heapq
+import random
+from collections import deque
+from dataclasses import dataclass, field, replace
+from typing import Deque, Dict, List, Optional, Tuple
+
+from custom_autoscalar.pools import ScalingPool
+from custom_autoscalar.scaling_config import ScalingConfig
+from custom_autoscalar.schedule import StaticSchedule, UpcomingClose
+
+
+@dataclass
+class Task:
+    enqueued_at: float
+    service_seconds: float
+    started_at: Optional[float] = None
+
+
+@dataclass
+class SimPod:
+    name: str
+    ready_at: float
+    free_at: float = 0.0
+
+    def idle(self, now: float) -> bool:
+        return self.ready_at <= now and self.free_at <= now
+
+
+@dataclass
+class ScaleEvent:
+    timestamp: float
+    action: str
+    from_replicas: int
+    to_replicas: int
+    queue_length: int
+
+
+@dataclass
+class SimulationResult:
+    policy: str
+    waits: List[float] = field(default_factory=list)
+    replica_seconds: float = 0.0
+    duration: float = 0.0
+    events: List[ScaleEvent] = field(default_factory=list)
+    unfinished: int = 0
+    max_replicas_seen: int = 0
+
+    def percentile(self, pct: float) -> float:
+        if not self.waits:
+            return 0.0
+        ordered = sorted(self.waits)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'tasks': len(self.waits),
+            'unfinished': self.unfinished,
+            'wait_p50': self.percentile(0.50),
+            'wait_p90': self.percentile(0.90),
+            'wait_p99': self.percentile(0.99),
+            'wait_max': max(self.waits, default=0.0),
+            'replica_seconds': self.replica_seconds,
+            'max_replicas': self.max_replicas_seen,
+            'scale_ups': sum(1 for e in self.events if e.action == 'scale_up'),
+            'scale_downs': sum(1 for e in self.events if e.action == 'scale_down'),
+        }
+
+
+class FakeBroker:
+    """FIFO queue with the two numbers the scaler reads from the management API"""
+
+    def __init__(self, ack_window: float):
+        self.ready: Deque[Task] = deque()
+        self.ack_window = ack_window
+        # completion times, heap since tasks finish out of order
+        self._acks: List[float] = []
+
+    def publish(self, task: Task) -> None:
+        self.ready.append(task)
+
+    def ack(self, timestamp: float) -> None:
+        heapq.heappush(self._acks, timestamp)
+
+    def stats(self, now: float) -> Dict[str, float]:
+        while self._acks and self._acks[0] <= now - self.ack_window:
+            heapq.heappop(self._acks)
+        # acks are recorded at completion time, which can be ahead of now for tasks still running
+        acked = sum(1 for t in self._acks if t <= now)
+        return {'messages_ready': len(self.ready), 'ack_rate': acked / self.ack_window}
+
+
+class FakeDeployment:
+    """Replica count and pods, new pods only take work after the startup latency"""
+
+    def __init__(self, replicas: int, startup_latency: Tuple[float, float], rng: random.Random):
+        self.startup_latency = startup_latency
+        self.rng = rng
+        self.pods: List[SimPod] = []
+        self._next_id = 0
+        self.scale_to(replicas, now=0.0, ready_now=True)
+
+    @property
+    def replicas(self) -> int:
+        return len(self.pods)
+
+    def _startup(self) -> float:
+        low, high = self.startup_latency
+        return low if high <= low else self.rng.uniform(low, high)
+
+    def scale_to(self, replicas: int, now: float, ready_now: bool = False) -> None:
+        while len(self.pods) < replicas:
+            ready_at = now if ready_now else now + self._startup()
+            self.pods.append(SimPod(name=f"worker-{self._next_id}", ready_at=ready_at, free_at=ready_at))
+            self._next_id += 1
+
+    def remove_idle(self, target_replicas: int, now: float) -> int:
+        """graceful_scale_down, only running pods with no task are deleted, longest idle first"""
+        to_remove = len(self.pods) - target_replicas
+        idle = sorted((p for p in self.pods if p.idle(now)), key=lambda p: p.free_at)
+        for pod in idle[:max(0, to_remove)]:
+            self.pods.remove(pod)
+        return len(self.pods)
+
+
+def synthetic_trace(kind: str, duration: float, rate: float, burst: int = 0, burst_at: Optional[float] = None,
+                    burst_seconds: float = 60.0, service_seconds: float = 1.0, seed: int = 0) -> List[Task]:
+    """
+    Arrival traces for the shapes we see:
+        constant - poisson arrivals at rate/s
+        ramp     - rate grows linearly from 0 to 2 * rate over the duration
+        burst    - constant background plus `burst` tasks within burst_seconds (exam close submissions)
+    Service times are exponential around service_seconds.
+    """
+    rng = random.Random(seed)
+    tasks = []
+
+    def add(at: float) -> None:
+        tasks.append(Task(enqueued_at=at, service_seconds=rng.expovariate(1.0 / service_seconds)))
+
+    # ramp by thinning, candidates at the peak rate kept with probability current / peak
+    peak = 2 * rate if kind == 'ramp' else rate
+    t = 0.0
+    while peak > 0:
+        t += rng.expovariate(peak)
+        if t >= duration:
+            break
+        if kind != 'ramp' or rng.random() < t / duration:
+            add(t)
+
+    if kind == 'burst' and burst:
+        start = duration / 2 if burst_at is None else burst_at
+        for _ in range(burst):
+            add(start + rng.uniform(0, burst_seconds))
+    elif kind not in ('constant', 'ramp', 'burst'):
+        raise ValueError(f"Unknown trace kind '{kind}'")
+
+    tasks.sort(key=lambda task: task.enqueued_at)
+    return tasks
+
+
+def load_trace(path: str, service_seconds: float = 1.0) -> List[Task]:
+    """
+    Recorded trace, csv of `enqueued_at[,service_seconds]` per task (eg. exported from task events).
+    Timestamps can be epoch seconds, they are shifted to start at 0.
+    """
+    rows = []
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith('#'):
+                continue
+            try:
+                enqueued_at = float(row[0])
+            except ValueError:
+                # header line
+                continue
+            rows.append((enqueued_at, float(row[1]) if len(row) > 1 and row[1] else service_seconds))
+    if not rows:
+        return []
+    start = min(r[0] for r in rows)
+    return sorted((Task(enqueued_at=t - start, service_seconds=s) for t, s in rows), key=lambda task: task.enqueued_at)
+
+
+class Simulator:
+    """Runs one pool config over a trace on simulated time"""
+
+    def __init__(self, config: ScalingConfig, startup_latency: Tuple[float, float] = (30.0, 60.0),
+                 initial_replicas: Optional[int] = None, seed: int = 0, max_drain_seconds: float = 3600.0,
+                 schedule=None):
+        self.config = config
+        self.pool = ScalingPool(config, schedule=schedule)
+        self.schedule = schedule
+        self.rng = random.Random(seed)
+        self.broker = FakeBroker(ack_window=config.check_interval)
+        self.deployment = FakeDeployment(
+            initial_replicas if initial_replicas is not None else config.min_replicas, startup_latency, self.rng
+        )
+        self.max_drain_seconds = max_drain_seconds
+
+    def _work(self, until: float, result: SimulationResult) -> None:
+        """Hand queued tasks to pods as they become free, up to `until`"""
+        ready = [(max(p.free_at, p.ready_at), i, p) for i, p in enumerate(self.deployment.pods)]
+        heapq.heapify(ready)
+        queue = self.broker.ready
+        while ready and queue:
+            free_at, i, pod = heapq.heappop(ready)
+            task = queue[0]
+            start = max(free_at, task.enqueued_at)
+            if start >= until:
+                # this pod (and every later one) is busy or the head task hasn't arrived yet
+                if free_at >= until:
+                    continue
+                break
+            queue.popleft()
+            task.started_at = start
+            pod.free_at = start + task.service_seconds
+            result.waits.append(start - task.enqueued_at)
+            self.broker.ack(pod.free_at)
+            heapq.heappush(ready, (pod.free_at, i, pod))
+
+    def run(self, trace: List[Task]) -> SimulationResult:
+        result = SimulationResult(policy=self.pool.policy.name)
+        interval = self.config.check_interval
+        pending = deque(trace)
+        end = (trace[-1].enqueued_at if trace else 0.0) + self.max_drain_seconds
+        now = 0.0
+
+        while now < end:
+            until = now + interval
+            while pending and pending[0].enqueued_at < until:
+                self.broker.publish(pending.popleft())
+            self._work(until, result)
+            # every pod costs from creation, starting ones included
+            result.replica_seconds += self.deployment.replicas * interval
+            now = until
+
+            stats = self.broker.stats(now)
+            current = self.deployment.replicas
+            result.max_replicas_seen = max(result.max_replicas_seen, current)
+            decision = self.pool.decide(stats, current, now)
+            self._apply(decision, now, result)
+
+            if self.schedule is not None:
+                self._complete_closes(now)
+
+            drained = not pending and not self.broker.ready
+            if drained and all(p.free_at <= now for p in self.deployment.pods) and current <= self.config.min_replicas:
+                break
+
+        result.duration = now
+        result.unfinished = len(pending) + len(self.broker.ready)
+        return result
+
+    def _complete_closes(self, now: float) -> None:
+        """A due close counts as evaluated once nothing is queued or running, the test leaving the schedule"""
+        if self.broker.ready or any(p.free_at > now for p in self.deployment.pods):
+            return
+        for close in self.schedule.upcoming():
+            if close.evaluates_at <= now:
+                self.schedule.complete(close.test_id)
+
+    def _apply(self, decision, now: float, result: SimulationResult) -> None:
+        if decision.action == 'scale_up':
+            self.deployment.scale_to(decision.target_replicas, now)
+            self.pool.last_scale_up_time = now
+            result.events.append(ScaleEvent(now, 'scale_up', decision.current_replicas,
+                                            decision.target_replicas, decision.queue_length))
+        elif decision.action == 'scale_down':
+            actual = self.deployment.remove_idle(decision.target_replicas, now)
+            if actual < decision.current_replicas:
+                self.pool.last_scale_down_time = now
+                result.events.append(ScaleEvent(now, 'scale_down', decision.current_replicas,
+                                                actual, decision.queue_length))
+
+
+def simulate(config: ScalingConfig, trace: List[Task], **kwargs) -> SimulationResult:
+    """Run one config over a copy of the trace, so the same trace can be replayed for several configs"""
+    tasks = [Task(t.enqueued_at, t.service_seconds) for t in trace]
+    return Simulator(config, **kwargs).run(tasks)
+
+
+def format_result(result: SimulationResult) -> str:
+    s = result.summary()
+    return (
+        f"{result.policy:<10} tasks {s['tasks']:>7}  unfinished {s['unfinished']:>5}  "
+        f"wait p50 {s['wait_p50']:7.1f}s  p90 {s['wait_p90']:7.1f}s  p99 {s['wait_p99']:7.1f}s  max {s['wait_max']:7.1f}s  "
+        f"replica-s {s['replica_seconds']:>9.0f}  peak {s['max_replicas']:>3}  "
+        f"ups {s['scale_ups']:>3}  downs {s['scale_downs']:>3}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trace', choices=('constant', 'ramp', 'burst'), default='burst')
+    parser.add_argument('--trace-file', help="csv of enqueued_at[,service_seconds], overrides --trace")
+    parser.add_argument('--duration', type=float, default=1800)
+    parser.add_argument('--rate', type=float, default=1.0, help="background arrivals per second")
+    parser.add_argument('--burst', type=int, default=2000, help="tasks in the burst")
+    parser.add_argument('--burst-at', type=float, default=None)
+    parser.add_argument('--burst-seconds', type=float, default=60)
+    parser.add_argument('--service-seconds', type=float, default=2.0, help="mean task duration")
+    parser.add_argument('--startup', type=float, nargs=2, default=(30.0, 60.0), metavar=('MIN', 'MAX'),
+                        help="pod startup latency range in seconds")
+    parser.add_argument('--policy', default=None, help="comma separated policies to compare, default SCALING_POLICY")
+    parser.add_argument('--closes-at', type=float, default=None,
+                        help="when the simulated close's evaluation is enqueued (default: the burst start)")
+    parser.add_argument('--scheduled-tasks', type=int, default=0,
+                        help="tasks the simulated close enqueues, enables schedule aware pre-scaling "
+                             "(1 per test for evaluate_test_after_close, the burst size for a per candidate fan-out)")
+    parser.add_argument('--events', action='store_true', help="print every scale event")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # THRESHOLD, cooldowns, factors etc. come from the same env vars as the scaler
+    base = ScalingConfig.from_env()
+    base = replace(base, deployment_name=base.deployment_name or 'simulated', queue_name=base.queue_name or 'simulated')
+
+    if args.trace_file:
+        trace = load_trace(args.trace_file, args.service_seconds)
+    else:
+        trace = synthetic_trace(args.trace, args.duration, args.rate, args.burst, args.burst_at,
+                                args.burst_seconds, args.service_seconds, args.seed)
+    print(f"trace: {len(trace)} tasks over {trace[-1].enqueued_at if trace else 0:.0f}s, "
+          f"startup {args.startup[0]:.0f}-{args.startup[1]:.0f}s, check interval {base.check_interval}s")
+
+    closes = []
+    if args.scheduled_tasks:
+        evaluates_at = args.closes_at if args.closes_at is not None else (
+            args.burst_at if args.burst_at is not None else args.duration / 2)
+        closes = [UpcomingClose('simulated', evaluates_at, args.scheduled_tasks)]
+        base = replace(base, schedule_aware=True, schedule_mongo_url=base.schedule_mongo_url or 'simulated')
+
+    for policy in (args.policy or base.policy).split(','):
+        config = replace(base, policy=policy.strip())
+        config.validate()
+        # a fresh schedule per run, the simulator completes its closes
+        schedule = StaticSchedule(closes) if closes else None
+        result = simulate(config, trace, startup_latency=tuple(args.startup), seed=args.seed, schedule=schedule)
+        print(format_result(result))
+        if args.events:
+            for e in result.events:
+                print(f"    {e.timestamp:>8.0f}s  {e.action:<10} {e.from_replicas:>3} -> {e.to_replicas:<3} "
+                      f"queue {e.queue_length}")
+
+
+if __name__ == "__main__":
+    main()
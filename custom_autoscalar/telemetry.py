@@ -0,0 +1,250 @@
+'''
+Metrics, decision trace and the scaler's HTTP endpoints.
+
+    /metrics    prometheus text format, queue length, target vs actual replicas, decisions by action
+                (cooldown and budget blocks included), kubernetes / broker api latency, idle pod scan duration
+    /healthz    200 while scaling cycles complete, 503 once the loop has stalled
+    /decisions  last N decisions with their inputs as json, ?deployment= to filter
+
+Kept dependency free (no prometheus_client) and served from a daemon thread, so it works the same
+for the sync and the async loop. Recording and rendering share one lock, a scrape holds it for a
+few hundred lines of formatting at most.
+'''
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+# seconds, api calls are usually 5-50ms, a slow apiserver or broker shows up in the top buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.series: Dict[Labels, List[float]] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            # one slot per bucket, +Inf, then sum
+            series = self.series[labels] = [0.0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += 1
+        series[-1] += value
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class ScalerMetrics:
+    """Gauges, counters and histograms of one scaler process"""
+
+    GAUGES = {
+        'celery_scaler_queue_length': "Ready messages in the pool's queues",
+        'celery_scaler_ack_rate': "Broker ack rate of the pool's queues, tasks per second",
+        'celery_scaler_current_replicas': "Replicas of the deployment seen by the last cycle",
+        'celery_scaler_target_replicas': "Replicas asked for by the last decision",
+        'celery_scaler_cooldown_remaining_seconds': "Cooldown left when the last decision was blocked",
+    }
+    HISTOGRAMS = {
+        'celery_scaler_kubernetes_request_seconds': "Kubernetes API call latency",
+        'celery_scaler_broker_request_seconds': "Broker management API call latency",
+        'celery_scaler_idle_scan_seconds': "Time to pick idle pods and delete them during scale down",
+        'celery_scaler_cycle_seconds': "Duration of one scaling cycle",
+    }
+
+    def __init__(self, decision_history: int = 500):
+        self._lock = threading.Lock()
+        self._gauges: Dict[str, Dict[Labels, float]] = {name: {} for name in self.GAUGES}
+        self._histograms: Dict[str, Histogram] = {name: Histogram() for name in self.HISTOGRAMS}
+        self._decisions_total: Dict[Labels, int] = {}
+        self._errors_total: Dict[Labels, int] = {}
+        self._decisions: Deque[Dict[str, Any]] = deque(maxlen=decision_history)
+        self.started_at = time.time()
+        self.last_cycle_at: Optional[float] = None
+        self.cycles_total = 0
+
+    # recording
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        with self._lock:
+            self._histograms[name].observe(tuple(sorted(labels.items())), value)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def kubernetes(self, operation: str):
+        return self.timer('celery_scaler_kubernetes_request_seconds', operation=operation)
+
+    def broker(self, operation: str):
+        return self.timer('celery_scaler_broker_request_seconds', operation=operation)
+
+    def error(self, source: str) -> None:
+        with self._lock:
+            key = (('source', source),)
+            self._errors_total[key] = self._errors_total.get(key, 0) + 1
+
+    def cycle_completed(self, duration: float) -> None:
+        with self._lock:
+            self._histograms['celery_scaler_cycle_seconds'].observe((), duration)
+            self.last_cycle_at = time.time()
+            self.cycles_total += 1
+
+    def record_decision(self, decision, inputs: Dict[str, Any]) -> None:
+        """Update the per deployment gauges and keep the decision with what it was based on"""
+        labels = (('deployment', decision.deployment_name),)
+        entry = asdict(decision)
+        entry.update(inputs)
+        with self._lock:
+            self._gauges['celery_scaler_queue_length'][labels] = decision.queue_length
+            self._gauges['celery_scaler_ack_rate'][labels] = inputs.get('ack_rate', 0.0)
+            self._gauges['celery_scaler_current_replicas'][labels] = decision.current_replicas
+            self._gauges['celery_scaler_target_replicas'][labels] = (
+                decision.target_replicas if decision.target_replicas is not None else decision.current_replicas
+            )
+            self._gauges['celery_scaler_cooldown_remaining_seconds'][labels] = decision.remaining_cooldown
+            key = labels + (('action', decision.action),)
+            self._decisions_total[key] = self._decisions_total.get(key, 0) + 1
+            self._decisions.append(entry)
+
+    # reading
+
+    def decisions(self, deployment: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = [d for d in self._decisions if deployment is None or d['deployment_name'] == deployment]
+        return entries[-limit:] if limit else entries
+
+    def healthy(self, max_cycle_age: float) -> bool:
+        """A cycle completed recently, or the loop is still within its first max_cycle_age"""
+        reference = self.last_cycle_at or self.started_at
+        return time.time() - reference <= max_cycle_age
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, help_text in self.GAUGES.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in self._gauges[name].items():
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+
+            for name, help_text, series in (
+                ('celery_scaler_decisions_total', "Scaling decisions by action", self._decisions_total),
+                ('celery_scaler_errors_total', "Failed broker / kubernetes reads that skipped work", self._errors_total),
+            ):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in series.items():
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+
+            for name, help_text in self.HISTOGRAMS.items():
+                histogram = self._histograms[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, series in histogram.series.items():
+                    for bound, count in zip(histogram.buckets, series):
+                        lines.append(f"{name}_bucket{_format_labels(labels, (('le', repr(bound)),))} {count:g}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {series[-2]:g}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {series[-2]:g}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {series[-1]}")
+
+            lines.append("# HELP celery_scaler_cycles_total Completed scaling cycles")
+            lines.append("# TYPE celery_scaler_cycles_total counter")
+            lines.append(f"celery_scaler_cycles_total {self.cycles_total}")
+            lines.append("# HELP celery_scaler_last_cycle_timestamp_seconds Unix time of the last completed cycle")
+            lines.append("# TYPE celery_scaler_last_cycle_timestamp_seconds gauge")
+            lines.append(f"celery_scaler_last_cycle_timestamp_seconds {self.last_cycle_at or 0}")
+        return '\n'.join(lines) + '\n'
+
+
+class TelemetryServer:
+    """Serves /metrics, /healthz and /decisions from a daemon thread"""
+
+    def __init__(self, metrics: ScalerMetrics, port: int, max_cycle_age: float,
+                 host: str = '0.0.0.0', logger: Optional[logging.Logger] = None):
+        self.metrics = metrics
+        self.max_cycle_age = max_cycle_age
+        self.logger = logger or logging.getLogger(__name__)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == '/metrics':
+                    self._send(200, server.metrics.render(), 'text/plain; version=0.0.4; charset=utf-8')
+                elif url.path == '/healthz':
+                    if server.metrics.healthy(server.max_cycle_age):
+                        self._send(200, 'ok\n', 'text/plain')
+                    else:
+                        self._send(503, 'scaling loop stalled\n', 'text/plain')
+                elif url.path == '/decisions':
+                    query = parse_qs(url.query)
+                    deployment = query.get('deployment', [None])[0]
+                    try:
+                        limit = int(query.get('limit', [0])[0]) or None
+                    except ValueError:
+                        limit = None
+                    body = json.dumps(server.metrics.decisions(deployment, limit), default=str)
+                    self._send(200, body, 'application/json')
+                else:
+                    self._send(404, 'not found\n', 'text/plain')
+
+            def _send(self, status: int, body: str, content_type: str):
+                data = body.encode()
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                # scrapes every few seconds would drown the scaling logs
+                pass
+
+        return Handler
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._server.serve_forever, name="telemetry", daemon=True)
+        self._thread.start()
+        self.logger.info(f"Serving /metrics, /healthz and /decisions on port {self.port}")
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            # shutdown blocks until serve_forever returns, keep it off the signal handler
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
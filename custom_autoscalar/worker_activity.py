@@ -0,0 +1,181 @@
+'''
+In-memory view of which Celery workers are busy, so idle checks during scale down are dict lookups
+instead of one app.control.inspect().active() broadcast per candidate pod.
+
+Two ways of keeping it current:
+- events consumer (preferred), a background thread listening to task-started/succeeded/failed and
+  worker-heartbeat events. Needs workers running with task events enabled (-E or worker_send_task_events=True)
+- snapshot, at most one inspect().active() broadcast per scaling cycle, used when events are not enabled
+  or the consumer has not heard from the workers recently
+'''
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Set
+
+
+@dataclass
+class WorkerState:
+    """Activity of one worker (celery@<pod name>)"""
+    active: Set[str] = field(default_factory=set)
+    reported_active: int = 0  # the worker's own count from its last heartbeat, covers tasks started before we listened
+    idle_since: Optional[float] = None
+    last_seen: float = 0.0
+
+    @property
+    def busy(self) -> bool:
+        return bool(self.active) or self.reported_active > 0
+
+
+class WorkerActivityTracker:
+    DONE_EVENTS = ('task-succeeded', 'task-failed', 'task-rejected', 'task-revoked')
+
+    def __init__(self, celery_app, logger: Optional[logging.Logger] = None, clock=time.time):
+        self.app = celery_app
+        self.logger = logger or logging.getLogger(__name__)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._workers: Dict[str, WorkerState] = {}
+        self._task_worker: Dict[str, str] = {}  # task uuid -> worker, done events for revoked tasks have no hostname
+        self._last_event_time = 0.0
+        self._last_snapshot_time = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # events consumer
+
+    def start_event_consumer(self) -> None:
+        """Start the background events consumer"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._consume_events, name="celery-events", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _consume_events(self) -> None:
+        handlers = {
+            'task-started': self._on_task_started,
+            'worker-heartbeat': self._on_worker_heartbeat,
+            'worker-offline': self._on_worker_offline,
+        }
+        for event_type in self.DONE_EVENTS:
+            handlers[event_type] = self._on_task_done
+
+        while not self._stop.is_set():
+            try:
+                with self.app.connection() as connection:
+                    receiver = self.app.events.Receiver(connection, handlers=handlers)
+                    self.logger.info("Celery events consumer connected")
+                    # timeout so the stop flag is checked even when the cluster is quiet
+                    for _ in receiver.itercapture(limit=None, timeout=5, wakeup=True):
+                        if self._stop.is_set():
+                            break
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                self.logger.warning(f"Celery events consumer error, reconnecting: {e}")
+                self._stop.wait(5)
+
+    def _worker(self, hostname: str, now: float) -> WorkerState:
+        state = self._workers.get(hostname)
+        if state is None:
+            state = self._workers[hostname] = WorkerState(idle_since=now)
+        state.last_seen = now
+        return state
+
+    def _on_task_started(self, event: dict) -> None:
+        now = self.clock()
+        with self._lock:
+            self._last_event_time = now
+            state = self._worker(event['hostname'], now)
+            state.active.add(event['uuid'])
+            state.idle_since = None
+            self._task_worker[event['uuid']] = event['hostname']
+
+    def _on_task_done(self, event: dict) -> None:
+        now = self.clock()
+        with self._lock:
+            self._last_event_time = now
+            hostname = self._task_worker.pop(event.get('uuid'), None) or event.get('hostname')
+            state = self._workers.get(hostname)
+            if state is None:
+                return
+            state.active.discard(event.get('uuid'))
+            if not state.busy and state.idle_since is None:
+                state.idle_since = now
+
+    def _on_worker_heartbeat(self, event: dict) -> None:
+        now = self.clock()
+        with self._lock:
+            self._last_event_time = now
+            state = self._worker(event['hostname'], now)
+            # heartbeat carries the worker's own active count, corrects any missed task events
+            # either way, eg. a scaler restarted mid evaluation never saw that task-started
+            active = event.get('active', 0)
+            state.reported_active = active
+            if active > 0:
+                state.idle_since = None
+            elif state.active or state.idle_since is None:
+                for task_id in state.active:
+                    self._task_worker.pop(task_id, None)
+                state.active.clear()
+                state.idle_since = now
+
+    def _on_worker_offline(self, event: dict) -> None:
+        with self._lock:
+            self._workers.pop(event['hostname'], None)
+
+    # snapshot fallback
+
+    def events_fresh(self, max_age: float) -> bool:
+        """True when the events consumer has heard from the cluster within max_age seconds"""
+        return self._thread is not None and self.clock() - self._last_event_time <= max_age
+
+    def refresh(self, max_age: float) -> None:
+        """Take an inspect snapshot unless events or a snapshot are newer than max_age"""
+        now = self.clock()
+        if self.events_fresh(max_age) or now - self._last_snapshot_time < max_age:
+            return
+        self._last_snapshot_time = now
+        try:
+            inspect = self.app.control.inspect()
+            active_tasks = inspect.active() if inspect else None
+        except Exception as e:
+            self.logger.error(f"Error taking Celery inspect snapshot: {e}")
+            active_tasks = None
+
+        with self._lock:
+            if not active_tasks:
+                self.logger.debug("No active tasks data available from inspect")
+                return
+            for hostname, tasks in active_tasks.items():
+                state = self._worker(hostname, now)
+                previous = state.busy
+                state.active = {t.get('id') for t in tasks}
+                state.reported_active = 0  # the snapshot lists the tasks themselves
+                if state.active:
+                    state.idle_since = None
+                elif previous or state.idle_since is None:
+                    state.idle_since = now
+
+    # lookups
+
+    def is_idle(self, worker_name: str) -> bool:
+        """Idle check without any broker round trip, unknown state counts as busy to be safe"""
+        with self._lock:
+            state = self._workers.get(worker_name)
+            # never described by a snapshot or an event (consumer just started, snapshot failed), might be
+            # mid evaluation, never picked for deletion on a guess
+            return state is not None and not state.busy
+
+    def idle_seconds(self, worker_name: str) -> float:
+        """How long the worker has been idle, 0 for busy or unknown workers"""
+        with self._lock:
+            state = self._workers.get(worker_name)
+            if state is None or state.busy or state.idle_since is None:
+                return 0.0
+            return self.clock() - state.idle_since
@@ -0,0 +1,33 @@
+'''
+shared fixtures, mongo is the in memory stand-in from benchmarks/memory_mongo.py (sync facade, what worker_db returns)
+settings are read at import, so the env the app needs is set before any app module is imported
+'''
+import os
+
+os.environ.setdefault("SECRET_KEY", "test-only-secret-key-not-for-prod-000000")
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+
+import pytest
+
+from benchmarks.memory_mongo import MemoryDatabase, MemoryStore
+
+
+@pytest.fixture
+def db():
+    return MemoryDatabase(MemoryStore())
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
@@ -0,0 +1,46 @@
+from app.worker.compaction import archive_id, compact_drafts, unpack_answers
+
+QUESTIONS = ("q1", "q2", "q3")
+
+
+def seed(db, test_id, user_id, submitted=True, result=True):
+    db.draft_submissions.insert_many([{
+        "user_id": user_id, "test_id": test_id, "question_id": q, "selected_option": i if i else None,
+        "marked_for_review": False, "visited": True, "time_spent_seconds": 10, "marks_correct_snapshot": 4,
+        "marks_wrong_snapshot": -1, "subject_snapshot": "Physics", "final_submit": submitted, "duration_seconds": 600,
+    } for i, q in enumerate(QUESTIONS)])
+    if result:
+        db.test_results.insert_one({"test_id": test_id, "user_id": user_id, "rank": 1})
+
+
+def test_archives_every_candidate_and_deletes_only_that_tests_rows(db):
+    for user_id in ("u1", "u2", "u3"):
+        seed(db, "t1", user_id)
+    # started but never submitted, no result row
+    seed(db, "t1", "u4", submitted=False, result=False)
+    seed(db, "t2", "u1")
+
+    stats = compact_drafts(db, "t1", batch_users=2, pause_seconds=0)
+
+    assert stats == {"candidates": 4, "deleted": 12}
+    assert db.draft_submissions.count_documents({"test_id": "t1"}) == 0
+    assert db.draft_submissions.count_documents({"test_id": "t2"}) == 3
+
+    archive = db.draft_archives.find_one({"_id": archive_id("t1", "u1")})
+    assert archive["question_count"] == 3 and archive["attempted"] == 2 and archive["final_submit"] is True
+    assert sorted(a["question_id"] for a in unpack_answers(archive["answers"])) == list(QUESTIONS)
+    assert db.draft_archives.find_one({"_id": archive_id("t1", "u4")})["final_submit"] is False
+
+
+def test_rerun_keeps_the_first_archive(db):
+    seed(db, "t1", "u1")
+    compact_drafts(db, "t1", pause_seconds=0)
+    first = db.draft_archives.find_one({"_id": archive_id("t1", "u1")})
+
+    # a run interrupted between archive and delete leaves rows behind, the rerun must not overwrite the archive
+    db.draft_submissions.insert_one({"user_id": "u1", "test_id": "t1", "question_id": "q1", "final_submit": True})
+    stats = compact_drafts(db, "t1", pause_seconds=0)
+
+    assert stats == {"candidates": 1, "deleted": 1}
+    assert db.draft_archives.find_one({"_id": archive_id("t1", "u1")})["answers"] == first["answers"]
+    assert compact_drafts(db, "t1", pause_seconds=0) == {"candidates": 0, "deleted": 0}
@@ -0,0 +1,105 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.worker.evaluation_lease import (
+    ATTEMPTS_FIELD, FAILED_FIELD, LEASE_FIELD, EvaluationLease, LeaseLost, claim, claimable, exhausted, release
+)
+
+LEASE_SECONDS = 600
+
+
+@pytest.fixture
+def tests(db):
+    db.tests.insert_one({"test_id": "t1", "evaluated": False})
+    return db.tests
+
+
+def lease_of(tests):
+    return tests.find_one({"test_id": "t1"}).get(LEASE_FIELD)
+
+
+def expire(tests):
+    tests.update_one({"test_id": "t1"}, {"$set": {f"{LEASE_FIELD}.expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+
+def test_claim_is_exclusive_until_the_lease_expires(tests):
+    assert claim(tests, "t1", "a", LEASE_SECONDS, max_attempts=3)
+    assert not claim(tests, "t1", "b", LEASE_SECONDS, max_attempts=3)
+    assert lease_of(tests)["owner"] == "a"
+
+    expire(tests)
+    assert claim(tests, "t1", "b", LEASE_SECONDS, max_attempts=3)
+    assert lease_of(tests)["owner"] == "b"
+    assert tests.find_one({"test_id": "t1"})[ATTEMPTS_FIELD] == 2
+
+
+def test_owner_takes_over_its_own_claim_without_counting_an_attempt(tests):
+    assert claim(tests, "t1", "a", LEASE_SECONDS, max_attempts=3)
+    # the task sent with the enqueuer's id
+    assert claim(tests, "t1", "a", LEASE_SECONDS)
+    assert tests.find_one({"test_id": "t1"})[ATTEMPTS_FIELD] == 1
+
+
+def test_evaluated_and_failed_tests_are_not_claimable(tests):
+    now = datetime.utcnow()
+    assert tests.count_documents({"test_id": "t1", **claimable(now)}) == 1
+
+    tests.update_one({"test_id": "t1"}, {"$set": {"evaluated": True}})
+    assert tests.count_documents({"test_id": "t1", **claimable(now)}) == 0
+
+    tests.update_one({"test_id": "t1"}, {"$set": {"evaluated": False, FAILED_FIELD: True}})
+    assert not claim(tests, "t1", "a", LEASE_SECONDS)
+
+
+def test_attempts_run_out_and_the_test_reads_as_exhausted(tests):
+    for owner in ("a", "b", "c"):
+        assert claim(tests, "t1", owner, LEASE_SECONDS, max_attempts=3)
+        expire(tests)
+    assert not claim(tests, "t1", "d", LEASE_SECONDS, max_attempts=3)
+
+    now = datetime.utcnow()
+    assert tests.count_documents({"test_id": "t1", **exhausted(now, 3)}) == 1
+    # a live lease is still running, not exhausted yet
+    tests.update_one({"test_id": "t1"}, {"$set": {f"{LEASE_FIELD}.expires_at": now + timedelta(seconds=60)}})
+    assert tests.count_documents({"test_id": "t1", **exhausted(now, 3)}) == 0
+
+
+def test_release_only_drops_our_own_lease(tests):
+    assert claim(tests, "t1", "a", LEASE_SECONDS, max_attempts=3)
+    assert release(tests, "t1", "b", evaluated=True).matched_count == 0
+    assert lease_of(tests)["owner"] == "a"
+
+    assert release(tests, "t1", "a", evaluated=True).matched_count == 1
+    doc = tests.find_one({"test_id": "t1"})
+    assert LEASE_FIELD not in doc and doc["evaluated"] is True
+
+
+def test_held_lease_extends_and_notices_a_takeover(tests):
+    assert claim(tests, "t1", "a", LEASE_SECONDS, max_attempts=3)
+    before = lease_of(tests)["expires_at"]
+    # renewed every lease_seconds / 3
+    lease = EvaluationLease(tests, "t1", "a", 0.06)
+    assert lease.acquire()
+    try:
+        assert lease.extend(extra_seconds=LEASE_SECONDS).matched_count == 1
+        assert lease_of(tests)["expires_at"] > before
+        lease.check()
+
+        # someone else claimed it after an expiry, the renewer finds no lease of ours and marks it lost
+        tests.update_one({"test_id": "t1"}, {"$set": {f"{LEASE_FIELD}.owner": "b"}})
+        deadline = time.monotonic() + 2
+        while not lease.lost and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with pytest.raises(LeaseLost):
+            lease.check()
+        assert not lease.release(evaluated=True)
+    finally:
+        lease.stop()
+
+
+def test_second_task_with_another_id_skips(tests):
+    assert claim(tests, "t1", "a", LEASE_SECONDS, max_attempts=3)
+    stale = EvaluationLease(tests, "t1", "b", LEASE_SECONDS)
+    assert not stale.acquire()
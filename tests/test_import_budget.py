@@ -0,0 +1,22 @@
+'''
+api cold start, what benchmarks/import_budget.py measures, as a gate
+fresh interpreters, no worker side modules, median under the budget (IMPORT_BUDGET_MS, default 1000)
+'''
+import os
+import statistics
+
+from benchmarks.import_budget import FORBIDDEN, child_env, run_once
+
+RUNS = 3
+
+
+def test_api_imports_no_worker_modules_and_starts_within_budget():
+    env = child_env()
+    runs = [run_once(env) for _ in range(RUNS)]
+
+    forbidden = sorted(m for m in runs[0]["modules"] if m.startswith(FORBIDDEN))
+    assert forbidden == []
+
+    budget_ms = float(os.environ.get("IMPORT_BUDGET_MS", 1000))
+    median_ms = statistics.median((r["import_seconds"] + r["startup_seconds"]) * 1000 for r in runs)
+    assert median_ms < budget_ms
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from app.api.schemas.result_schemas import PerformanceProgress
+from app.api.services.performance_progress import summarize
+from app.worker.performance_history import HISTORY_LIMIT, record_results
+
+
+def result(test_id, score, percentile=90.0):
+    return {
+        "user_id": "u1", "test_id": test_id, "total_score": score, "rank": 1, "percentile": percentile,
+        "attempted": 3, "correct": 2, "evaluated_at": datetime(2026, 1, 1),
+        # free text subjects, a dot or leading $ must not end up in an update path
+        "subject_scores": {"Gen. Science": score, "$misc": 1},
+        "subject_percentiles": {"Gen. Science": 80.0, "$misc": 50.0},
+    }
+
+
+def test_progress_sums_subjects_with_dots_and_dollars(db):
+    assert record_results(db, [result("t1", 10)]) == 1
+    assert record_results(db, [result("t2", 20, percentile=70.0)]) == 1
+
+    progress = PerformanceProgress(**summarize(db.user_performance.find_one({"_id": "u1"}), "u1"))
+
+    assert progress.tests_taken == 2 and progress.avg_score == 15.0
+    assert progress.subjects["Gen. Science"].tests == 2 and progress.subjects["Gen. Science"].avg_score == 15.0
+    assert progress.subjects["$misc"].avg_percentile == 50.0
+    assert progress.best_subjects == ["Gen. Science", "$misc"]
+    assert progress.mocks[-1].subject_scores == {"Gen. Science": 20, "$misc": 1}
+    assert progress.rolling.percentile_change == -20.0
+
+
+def test_rerun_of_a_test_past_the_mocks_window_is_not_counted_again(db):
+    for i in range(HISTORY_LIMIT + 1):
+        record_results(db, [result(f"t{i}", 10)])
+    # t0 has dropped out of mocks, counted_tests still guards it
+    assert record_results(db, [result("t0", 10)]) == 0
+    assert db.user_performance.find_one({"_id": "u1"})["tests_taken"] == HISTORY_LIMIT + 1
+
+
+def test_no_history_yet_is_an_empty_progress():
+    progress = PerformanceProgress(**summarize(None, "u1"))
+    assert progress.tests_taken == 0 and progress.mocks == [] and progress.avg_score is None
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+from app.worker.proctoring import CHECKPOINT_COLLECTION, CHECKPOINT_ID, DISTINCT_IP_WEIGHT, RISK_WEIGHTS, aggregate_risk
+
+T0 = datetime(2026, 1, 1, 10, 0, 0)
+
+
+def event(user_id, kind, inserted_at, ip="10.0.0.1", ts=None):
+    return {"meta": {"test_id": "t1", "user_id": user_id}, "kind": kind, "ip": ip,
+            "ts": ts or inserted_at, "inserted_at": inserted_at}
+
+
+def risk(db, user_id):
+    return db.proctor_risk.find_one({"_id": f"t1:{user_id}"})
+
+
+def test_folds_events_by_insertion_time_into_per_candidate_risk(db):
+    db.proctor_events.insert_many([
+        event("u1", "tab_switch", T0 + timedelta(seconds=1)),
+        event("u1", "paste", T0 + timedelta(seconds=2), ip="10.0.0.2"),
+        # received long before, inserted late (buffered through a flush stall), still in this window
+        event("u2", "copy", T0 + timedelta(seconds=3), ts=T0 - timedelta(hours=2)),
+    ])
+    db[CHECKPOINT_COLLECTION].insert_one({"_id": CHECKPOINT_ID, "until": T0})
+
+    assert aggregate_risk(db, T0 + timedelta(seconds=10)) == {"candidates": 2, "events": 3}
+
+    u1 = risk(db, "u1")
+    assert u1["events"] == 2 and u1["counts"] == {"tab_switch": 1, "paste": 1}
+    assert u1["risk_score"] == RISK_WEIGHTS["tab_switch"] + RISK_WEIGHTS["paste"] + DISTINCT_IP_WEIGHT
+    assert risk(db, "u2")["counts"] == {"copy": 1}
+    assert db[CHECKPOINT_COLLECTION].find_one({"_id": CHECKPOINT_ID})["until"] == T0 + timedelta(seconds=10)
+
+
+def test_next_run_continues_from_the_checkpoint(db):
+    db[CHECKPOINT_COLLECTION].insert_one({"_id": CHECKPOINT_ID, "until": T0})
+    db.proctor_events.insert_one(event("u1", "tab_switch", T0 + timedelta(seconds=1)))
+    aggregate_risk(db, T0 + timedelta(seconds=10))
+    db.proctor_events.insert_one(event("u1", "tab_switch", T0 + timedelta(seconds=11)))
+
+    assert aggregate_risk(db, T0 + timedelta(seconds=20)) == {"candidates": 1, "events": 1}
+    assert risk(db, "u1")["counts"]["tab_switch"] == 2
+    # nothing new, nothing added
+    assert aggregate_risk(db, T0 + timedelta(seconds=30)) == {"candidates": 0, "events": 0}
+    assert risk(db, "u1")["events"] == 2
+
+
+def test_rerun_after_a_run_died_before_its_checkpoint_does_not_double_count(db):
+    db[CHECKPOINT_COLLECTION].insert_one({"_id": CHECKPOINT_ID, "until": T0})
+    db.proctor_events.insert_many([
+        event("u1", "tab_switch", T0 + timedelta(seconds=1)),
+        event("u2", "paste", T0 + timedelta(seconds=2)),
+    ])
+    aggregate_risk(db, T0 + timedelta(seconds=10))
+    # as if the run died after writing proctor_risk: the checkpoint still has the old until and the pending window
+    db[CHECKPOINT_COLLECTION].replace_one({"_id": CHECKPOINT_ID}, {
+        "until": T0, "pending": {"since": T0, "until": T0 + timedelta(seconds=10)}
+    })
+    db.proctor_events.insert_one(event("u1", "tab_switch", T0 + timedelta(seconds=15)))
+
+    # the next beat run has a later until, it first finishes the pending window
+    aggregate_risk(db, T0 + timedelta(seconds=20))
+    assert risk(db, "u1")["counts"]["tab_switch"] == 1
+    assert risk(db, "u2")["counts"]["paste"] == 1
+    checkpoint = db[CHECKPOINT_COLLECTION].find_one({"_id": CHECKPOINT_ID})
+    assert checkpoint["until"] == T0 + timedelta(seconds=10) and "pending" not in checkpoint
+
+    # and the one after picks up what landed since
+    aggregate_risk(db, T0 + timedelta(seconds=20))
+    assert risk(db, "u1")["counts"]["tab_switch"] == 2
+    assert risk(db, "u2")["counts"]["paste"] == 1
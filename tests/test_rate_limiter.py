@@ -0,0 +1,101 @@
+import asyncio
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.api.middleware.rate_limit_middleware import RateLimitMiddleware, RatePolicy
+from app.api.middleware.rate_limiter import BucketStore, InMemoryGCRABackend, RedisGCRABackend
+from app.api.utils.auth_utils import create_token
+
+
+def hits(backend, key, n, emission_interval=1.0, tolerance=3.0):
+    async def run():
+        return [await backend.hit(key, emission_interval, tolerance) for _ in range(n)]
+    return asyncio.run(run())
+
+
+def test_gcra_allows_a_burst_then_one_per_emission_interval(clock):
+    backend = InMemoryGCRABackend(capacity=100, clock=clock)
+    # 3 per 3 seconds, a quiet key gets the full burst
+    results = hits(backend, "k", 4)
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert results[-1][1] == 1.0
+
+    clock.advance(1.0)
+    assert [allowed for allowed, _ in hits(backend, "k", 2)] == [True, False]
+    # keys are independent
+    assert hits(backend, "other", 1)[0][0]
+
+
+def test_bucket_store_is_bounded_and_drops_expired_entries_first():
+    store = BucketStore(capacity=3)
+    store.set("a", 5.0, now=0.0)
+    store.set("b", 50.0, now=0.0)
+    store.set("c", 50.0, now=0.0)
+    # a's tat has passed, it goes before the least recently used live key
+    store.set("d", 50.0, now=10.0)
+    assert len(store) == 3 and store.get("a") is None and store.get("b") == 50.0
+
+    store.set("e", 50.0, now=10.0)
+    assert len(store) == 3 and store.get("b") is None
+
+
+class _Script:
+    def __init__(self, result=None, error=None):
+        self.result, self.error, self.calls = result, error, 0
+
+    async def __call__(self, keys, args):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.result
+
+
+def redis_backend(script, clock):
+    # the script is what talks to redis, replaced here so no server (or redis package) is needed
+    backend = RedisGCRABackend.__new__(RedisGCRABackend)
+    backend._script = script
+    backend.fallback = InMemoryGCRABackend(capacity=100, clock=clock)
+    return backend
+
+
+def test_redis_backend_is_one_script_call_per_check(clock):
+    script = _Script(result=[0, "1.5"])
+    assert hits(redis_backend(script, clock), "k", 1) == [(False, 1.5)]
+    assert script.calls == 1
+
+
+def test_redis_backend_falls_back_to_in_process_limits_when_down(clock):
+    backend = redis_backend(_Script(error=ConnectionError("down")), clock)
+    assert [allowed for allowed, _ in hits(backend, "k", 4)] == [True, True, True, False]
+
+
+def limited_app(max_requests: int = 3):
+    async def whoami(request):
+        user = getattr(request.state, "user", None)
+        return PlainTextResponse(user["user_id"] if user else "anonymous")
+
+    app = Starlette(routes=[Route("/limited", whoami)])
+    return RateLimitMiddleware(app, [RatePolicy("GET", "/limited", max_requests, 60, "limited")],
+                               InMemoryGCRABackend(capacity=100))
+
+
+def test_middleware_charges_unverified_tokens_to_the_client_ip():
+    client = TestClient(limited_app())
+    assert [client.get("/limited").status_code for _ in range(4)] == [200, 200, 200, 429]
+    # made up tokens don't get fresh buckets
+    statuses = [client.get("/limited", headers={"Authorization": f"Bearer {i}"}).status_code for i in range(5)]
+    assert statuses == [429] * 5
+
+
+def test_middleware_keys_verified_tokens_by_user_and_hands_the_payload_on():
+    client = TestClient(limited_app())
+    token = create_token("u1", "u1@example.com")
+    responses = [client.get("/limited", headers={"Authorization": f"Bearer {token}"}) for _ in range(4)]
+    assert [r.status_code for r in responses] == [200, 200, 200, 429]
+    assert responses[0].text == "u1"
+    # another user still has its own bucket
+    other = create_token("u2", "u2@example.com")
+    assert client.get("/limited", headers={"Authorization": f"Bearer {other}"}).status_code == 200